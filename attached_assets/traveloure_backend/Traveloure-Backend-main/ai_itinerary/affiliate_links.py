@@ -0,0 +1,160 @@
+import logging
+import re
+import threading
+import time
+from string import Formatter
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+
+from django.core.cache import cache
+from django.db import transaction
+
+from ai_itinerary.models import AffiliatePlatform
+
+logger = logging.getLogger('travelDNA')
+
+# Placeholders an AffiliatePlatform.base_url may use
+TEMPLATE_FIELDS = ('url', 'name', 'destination', 'id')
+# Where a selection or affiliate item keeps the link to rewrite, first found wins
+URL_KEYS = ('website_url', 'url', 'link', 'booking_url')
+ID_KEYS = ('place_id', 'hotel_id', 'service_id', 'flight_id', 'id')
+LINK_KEY = 'affiliate_link'
+VERSION_KEY = 'affiliate-platforms:version'
+# How long a process trusts its compiled templates before checking whether another one changed them
+VERSION_CHECK_SECONDS = 5
+# Scheme, host and the rest of an absolute URL; cheaper than urlsplit on every link of a batch
+URL_PARTS = re.compile(r'^([a-z][a-z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]*)[^?#]*)(?:\?([^#]*))?(#.*)?$', re.I)
+
+
+def _site(host):
+    host = (host or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class AffiliateLinks:
+    """
+    The AffiliatePlatform templates compiled for rewriting links. A base_url with placeholders
+    ({url}, {name}, {destination}, {id}) is a formatter for every link of its platform's kind
+    (the oldest platform of a kind wins). One without placeholders is the partner site's own URL:
+    links to that site get its query parameters (the affiliate id) added.
+    """
+
+    def __init__(self, platforms):
+        self.formatters = {}
+        self.sites = {}
+        for platform in sorted(platforms, key=lambda p: p.created_at):
+            try:
+                fields = [field for _, field, _, _ in Formatter().parse(platform.base_url) if field is not None]
+            except ValueError:
+                fields = None
+            if fields is None or any(field not in TEMPLATE_FIELDS for field in fields):
+                logger.warning(f"Affiliate platform {platform.title} has an unusable base_url template, skipped")
+                continue
+            if fields:
+                self.formatters.setdefault(platform.platform, platform.base_url.format)
+                continue
+            parts = urlsplit(platform.base_url)
+            params = parse_qsl(parts.query, keep_blank_values=True)
+            if parts.hostname and params:
+                self.sites.setdefault(_site(parts.hostname), (dict(params), urlencode(params)))
+
+    def _site_params(self, host):
+        # Subdomains of a partner (m.booking.com, secure.booking.com) are the partner too
+        while host:
+            params = self.sites.get(host)
+            if params is not None:
+                return params
+            _, _, host = host.partition('.')
+        return None
+
+    def rewrite(self, links):
+        """
+        Affiliate links for (kind, url, name, destination, id) tuples, in order; None where no
+        platform applies. Each distinct host is looked up once per batch.
+        """
+        hosts = {}
+        rewritten = []
+        for kind, url, name, destination, item_id in links:
+            match = URL_PARTS.match(url) if url else None
+            if match is None:
+                rewritten.append(None)
+                continue
+            base, host, query, fragment = match.groups()
+            if host not in hosts:
+                hosts[host] = self._site_params(_site(host))
+            site = hosts[host]
+            if site is not None:
+                params, encoded = site
+                if query:
+                    # The platform's parameters replace any the link already had under those names
+                    kept = [(key, value) for key, value in parse_qsl(query, keep_blank_values=True) if key not in params]
+                    encoded = f"{urlencode(kept)}&{encoded}" if kept else encoded
+                rewritten.append(f"{base}?{encoded}{fragment or ''}")
+                continue
+            formatter = self.formatters.get(kind)
+            rewritten.append(formatter(
+                url=quote(url, safe=''), name=quote(name or '', safe=''),
+                destination=quote(destination or '', safe=''), id=quote(str(item_id or ''), safe=''),
+            ) if formatter else None)
+        return rewritten
+
+    def rewrite_items(self, kind, items, destination=''):
+        """The affiliate items, those a platform applies to copied with an affiliate_link beside their own link."""
+        if not isinstance(items, list):
+            return items
+        links = []
+        for item in items:
+            item = item if isinstance(item, dict) else {}
+            url = next((item[key] for key in URL_KEYS if isinstance(item.get(key), str) and item[key]), None)
+            item_id = next((item[key] for key in ID_KEYS if item.get(key) not in (None, '')), None)
+            links.append((kind, url, item.get('name'), destination, item_id))
+        rewritten = self.rewrite(links)
+        return [
+            {**item, LINK_KEY: link} if link else item
+            for item, link in zip(items, rewritten)
+        ]
+
+    def rewrite_selections(self, kind, rows, provider_field, destination=''):
+        """Set affiliate_link on TripSelected* rows, from their website_url."""
+        links = self.rewrite([
+            (kind, row.website_url, row.name, destination, getattr(row, provider_field)) for row in rows
+        ])
+        for row, link in zip(rows, links):
+            row.affiliate_link = link
+        return rows
+
+
+_engine = None
+_engine_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def engine():
+    """This process's compiled AffiliateLinks, rebuilt after any process changed a platform."""
+    global _engine, _engine_version, _checked_at
+    now = time.monotonic()
+    if _engine is not None and now - _checked_at < VERSION_CHECK_SECONDS:
+        return _engine
+    version = cache.get(VERSION_KEY, 0)
+    with _lock:
+        if _engine is None or version != _engine_version:
+            _engine = AffiliateLinks(list(AffiliatePlatform.objects.all()))
+            _engine_version = version
+        _checked_at = now
+        return _engine
+
+
+def _bump_version():
+    global _engine
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        cache.incr(VERSION_KEY)
+    # This process sees its own change at once, the others within VERSION_CHECK_SECONDS
+    with _lock:
+        _engine = None
+
+
+def platforms_changed(sender, **kwargs):
+    transaction.on_commit(_bump_version)
@@ -0,0 +1,42 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_save
+
+
+class AiItineraryConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'ai_itinerary'
+
+    def ready(self):
+        from serviceproviderapp.models import AllService
+        from .map_clusters import point_deleted, point_saved, preference_changed, remember_point
+        from .models import TouristPlaceResults, TouristPreferences
+
+        for model in (TouristPlaceResults, AllService):
+            pre_save.connect(remember_point, sender=model, dispatch_uid=f'map-clusters-{model.__name__}-pre-save')
+            post_save.connect(point_saved, sender=model, dispatch_uid=f'map-clusters-{model.__name__}-save')
+            post_delete.connect(point_deleted, sender=model, dispatch_uid=f'map-clusters-{model.__name__}-delete')
+        post_save.connect(preference_changed, sender=TouristPreferences, dispatch_uid='map-clusters-preference-save')
+        post_delete.connect(preference_changed, sender=TouristPreferences, dispatch_uid='map-clusters-preference-delete')
+
+        from django.contrib.auth import get_user_model
+        from . import share_snapshots
+        from .models import GeneratedItinerary, Trip, TripSelectedHotel, TripSelectedPlace, TripSelectedService
+
+        post_save.connect(share_snapshots.itinerary_changed, sender=GeneratedItinerary, dispatch_uid='share-itinerary-save')
+        post_delete.connect(share_snapshots.itinerary_deleted, sender=GeneratedItinerary, dispatch_uid='share-itinerary-delete')
+        post_save.connect(share_snapshots.trip_changed, sender=Trip, dispatch_uid='share-trip-save')
+        post_save.connect(share_snapshots.user_changed, sender=get_user_model(), dispatch_uid='share-user-save')
+        for model in (TripSelectedPlace, TripSelectedHotel, TripSelectedService):
+            post_save.connect(share_snapshots.selection_changed, sender=model, dispatch_uid=f'share-{model.__name__}-save')
+            post_delete.connect(share_snapshots.selection_changed, sender=model, dispatch_uid=f'share-{model.__name__}-delete')
+
+        from . import catalog
+        from .models import AffiliateTrip
+
+        pre_save.connect(catalog.affiliate_trip_saving, sender=AffiliateTrip, dispatch_uid='catalog-AffiliateTrip-pre-save')
+
+        from . import affiliate_links
+        from .models import AffiliatePlatform
+
+        post_save.connect(affiliate_links.platforms_changed, sender=AffiliatePlatform, dispatch_uid='affiliate-platform-save')
+        post_delete.connect(affiliate_links.platforms_changed, sender=AffiliatePlatform, dispatch_uid='affiliate-platform-delete')
@@ -0,0 +1,176 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from ai_itinerary.models import CatalogEntry
+
+REF_KEY = 'catalog_ref'
+# Keys the catalog entry has but the stored item did not
+OMIT_KEY = 'catalog_omit'
+AFFILIATE_FIELDS = {'place_data': 'place', 'hotel_data': 'hotel', 'service_data': 'service'}
+PROVIDER_KEYS = {
+    'place': ('place_id', 'id'),
+    'hotel': ('hotel_id', 'id'),
+    'service': ('service_id', 'id'),
+}
+
+
+def _canonical(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+
+
+def content_hash(data):
+    return hashlib.sha256(_canonical(data).encode()).hexdigest()
+
+
+def ensure_entries(kind, items):
+    """
+    {provider_id: CatalogEntry} for the provider ids of {provider_id: data}, upserted in bulk: missing
+    entries are created from data in one statement, existing ones keep the content they were created
+    with. Rows differing from an entry store the difference, so an entry never has to change.
+    """
+    entries = {entry.provider_id: entry for entry in CatalogEntry.objects.filter(kind=kind, provider_id__in=list(items))}
+    missing = [
+        CatalogEntry(kind=kind, provider_id=provider_id, content_hash=content_hash(data), data=data)
+        for provider_id, data in items.items()
+        if provider_id not in entries
+    ]
+    if missing:
+        CatalogEntry.objects.bulk_create(missing, ignore_conflicts=True)
+        created = CatalogEntry.objects.filter(kind=kind, provider_id__in=[entry.provider_id for entry in missing])
+        entries.update({entry.provider_id: entry for entry in created})
+    return entries
+
+
+def compact_selections(rows):
+    """
+    Point trip selections (all of one CatalogBacked model) at their catalog entries and leave NULL
+    the values the entry already holds, listed in catalog_inherited; what is left on the row is its
+    per-trip override. A row whose content hash matches its entry's inherits everything without a
+    field by field comparison. Does not save.
+    """
+    rows = [row for row in rows if getattr(row, row.provider_field)]
+    if not rows:
+        return rows
+    items, contents = {}, []
+    for row in rows:
+        # As read, so values inherited from the current entry count as the row's own for now
+        data = {'name': row.name}
+        data.update({field: getattr(row, field) for field in row.catalog_fields if getattr(row, field) is not None})
+        contents.append(data)
+        items.setdefault(str(getattr(row, row.provider_field))[:255], data)
+
+    entries = ensure_entries(rows[0].catalog_kind, items)
+    for row, data in zip(rows, contents):
+        entry = entries[str(getattr(row, row.provider_field))[:255]]
+        unchanged = content_hash(data) == entry.content_hash
+        inherited = [
+            field for field in row.catalog_fields
+            if field in data and field in entry.data
+            and (unchanged or _canonical(data[field]) == _canonical(entry.data[field]))
+        ]
+        row.catalog = entry
+        with row.stored_values([row]):
+            for field in row.catalog_fields:
+                setattr(row, field, None if field in inherited else data.get(field))
+        row.catalog_inherited = inherited
+    return rows
+
+
+def _provider_id(kind, item):
+    for key in PROVIDER_KEYS[kind]:
+        value = item.get(key)
+        if value not in (None, ''):
+            return str(value)[:255]
+    return None
+
+
+def compact_items(kind, items):
+    """
+    Affiliate items as references to their catalog entries, keeping whatever differs from the entry
+    (and the entry keys the item lacked), so expand_items gives back exactly what was stored.
+    """
+    if not isinstance(items, list):
+        return items
+    contents = {}
+    for item in items:
+        if isinstance(item, dict) and REF_KEY not in item:
+            provider_id = _provider_id(kind, item)
+            if provider_id:
+                contents.setdefault(provider_id, item)
+    if not contents:
+        return items
+    entries = ensure_entries(kind, contents)
+
+    compacted = []
+    for item in items:
+        provider_id = isinstance(item, dict) and REF_KEY not in item and _provider_id(kind, item)
+        if not provider_id:
+            compacted.append(item)
+            continue
+        entry = entries[provider_id]
+        ref = {REF_KEY: provider_id}
+        if content_hash(item) != entry.content_hash:
+            data = entry.data
+            ref.update({key: value for key, value in item.items() if key not in data or _canonical(value) != _canonical(data[key])})
+            omitted = [key for key in data if key not in item]
+            if omitted:
+                ref[OMIT_KEY] = omitted
+        compacted.append(ref)
+    return compacted
+
+
+def affiliate_trip_saving(sender, instance, **kwargs):
+    for field, kind in AFFILIATE_FIELDS.items():
+        setattr(instance, field, compact_items(kind, getattr(instance, field)))
+    # Expanded from the lists as they were before this save
+    instance.__dict__.pop('expanded_data', None)
+
+
+def expand_items(kind, items, entries):
+    if not isinstance(items, list):
+        return items
+    expanded = []
+    for item in items:
+        data = entries.get((kind, item.get(REF_KEY))) if isinstance(item, dict) and REF_KEY in item else None
+        if data is None:
+            expanded.append(item)
+            continue
+        omitted = item.get(OMIT_KEY, ())
+        merged = {key: value for key, value in data.items() if key not in omitted}
+        merged.update({key: value for key, value in item.items() if key not in (REF_KEY, OMIT_KEY)})
+        expanded.append(merged)
+    return expanded
+
+
+def attach(affiliate_trips):
+    """Expand the items of all the AffiliateTrips with one catalog query, stored on each as expanded_data."""
+    refs = set()
+    for affiliate in affiliate_trips:
+        for field, kind in AFFILIATE_FIELDS.items():
+            items = getattr(affiliate, field)
+            if isinstance(items, list):
+                refs.update((kind, item[REF_KEY]) for item in items if isinstance(item, dict) and REF_KEY in item)
+
+    entries = {}
+    if refs:
+        lookup = Q()
+        for kind in {kind for kind, _ in refs}:
+            lookup |= Q(kind=kind, provider_id__in=[provider_id for k, provider_id in refs if k == kind])
+        entries = {
+            (kind, provider_id): data
+            for kind, provider_id, data in CatalogEntry.objects.filter(lookup).values_list('kind', 'provider_id', 'data')
+        }
+    for affiliate in affiliate_trips:
+        affiliate.expanded_data = {
+            field: expand_items(kind, getattr(affiliate, field), entries) for field, kind in AFFILIATE_FIELDS.items()
+        }
+
+
+def expanded(affiliate, field):
+    """An AffiliateTrip list with its catalog references resolved."""
+    if not hasattr(affiliate, 'expanded_data'):
+        attach([affiliate])
+    return affiliate.expanded_data[field]
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.day_planner import trip_plan
+from ai_itinerary.generation import COMPLETED, IN_FLIGHT
+from ai_itinerary.itinerary_versions import commit_document
+from ai_itinerary.models import GeneratedItinerary, Trip
+from ai_itinerary.route_api import selected_places
+
+
+class TripDayPlanAPIView(APIView):
+    """
+    GET packs the trip's selected places and services into its days, between its flights, within
+    opening hours and ?max_activity_minutes= a day. POST does the same and saves the plan as the
+    trip's itinerary (a new version of it when one exists).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _plan(self, request, trip):
+        value = request.query_params.get('max_activity_minutes')
+        max_activity_minutes = None
+        if value is not None:
+            try:
+                max_activity_minutes = int(value)
+            except ValueError:
+                max_activity_minutes = 0
+            if not 30 <= max_activity_minutes <= 24 * 60:
+                raise ValidationError({"max_activity_minutes": "Must be an integer between 30 and 1440."})
+        return trip_plan(trip, max_activity_minutes)
+
+    def _trip(self, request, trip_id):
+        return get_object_or_404(
+            Trip.objects.prefetch_related(selected_places(), 'trip_selected_services', 'trip_selected_flights'),
+            id=trip_id, user=request.user,
+        )
+
+    def get(self, request, trip_id):
+        plan = self._plan(request, self._trip(request, trip_id))
+        return Response({"message": "Fetched Successfully", "data": plan, "status": True}, status=200)
+
+    def post(self, request, trip_id):
+        trip = self._trip(request, trip_id)
+        plan = self._plan(request, trip)
+        unscheduled = plan.pop('unscheduled')
+        with transaction.atomic():
+            itinerary, _ = GeneratedItinerary.objects.select_for_update().get_or_create(
+                trip=trip, defaults={'status': COMPLETED}
+            )
+            if itinerary.status in IN_FLIGHT:
+                return Response({
+                    "message": "An itinerary is being generated for this trip",
+                    "data": {"id": str(itinerary.id), "status": itinerary.status},
+                    "status": False,
+                }, status=409)
+            GeneratedItinerary.objects.filter(id=itinerary.id).update(status=COMPLETED, error_message='')
+            itinerary = commit_document(GeneratedItinerary, itinerary.id, plan, user=request.user)
+        return Response({
+            "message": "Itinerary saved",
+            "data": {"id": str(itinerary.id), "version": itinerary.version, "itinerary_data": plan, "unscheduled": unscheduled},
+            "status": True,
+        }, status=200)
@@ -0,0 +1,372 @@
+import re
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+from ai_itinerary.geo import haversine_matrix
+from ai_itinerary.route_api import metadata_coordinates, trip_points
+
+PlanItem = namedtuple('PlanItem', 'kind id name description location duration windows dates latitude longitude')
+PlanDay = namedtuple('PlanDay', 'date start end budget')
+
+DAY_START = 9 * 60
+DAY_END = 21 * 60
+# On the day the outbound flight lands and the day the return flight leaves
+ARRIVAL_DAY_START = 15 * 60
+DEPARTURE_DAY_END = 12 * 60
+DEFAULT_DURATION = {'place': 90, 'service': 120}
+# Between two stops with coordinates: city travel at CITY_SPEED_KMH plus getting in and out
+CITY_SPEED_KMH = 20.0
+TRANSFER_MINUTES = 10
+UNKNOWN_TRAVEL_MINUTES = 30
+LOCAL_SEARCH_MS = 300
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+_TIME_RE = re.compile(r'^\s*(\d{1,2})(?:[:.h](\d{2})?)?\s*([ap]\.?m\.?)?\s*$', re.IGNORECASE)
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(h|hr|hrs|hours?|m|min|mins|minutes?)\b', re.IGNORECASE)
+
+
+def parse_time(value):
+    """Minutes after midnight from '09:00', '9.30', '7pm' or '14h'; None when unreadable."""
+    match = _TIME_RE.match(str(value)) if value is not None else None
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2) or 0)
+    suffix = (match.group(3) or '').lower().replace('.', '')
+    if suffix:
+        if not 1 <= hours <= 12:
+            return None
+        hours = hours % 12 + (12 if suffix == 'pm' else 0)
+    if hours > 24 or minutes > 59 or hours * 60 + minutes > 24 * 60:
+        return None
+    return hours * 60 + minutes
+
+
+def parse_duration(value, default):
+    """Minutes from 90, '90', '2h', '1h 30m' or '1.5 hours'."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value) if value > 0 else default
+    if isinstance(value, str):
+        if value.strip().isdigit():
+            return int(value.strip()) or default
+        total = 0.0
+        for amount, unit in _DURATION_RE.findall(value):
+            total += float(amount) * (60 if unit.lower().startswith('h') else 1)
+        if total > 0:
+            return int(total)
+    return default
+
+
+def _windows(value):
+    """[(open, close), ...] from '09:00-17:00', 'closed', {'open':, 'close':} or a list of those."""
+    if isinstance(value, list):
+        return [window for part in value for window in _windows(part)]
+    if isinstance(value, dict):
+        opens, closes = parse_time(value.get('open')), parse_time(value.get('close'))
+        pairs = [(opens, closes)]
+    elif isinstance(value, str):
+        if value.strip().lower() == 'closed':
+            return []
+        if '24' in value and 'hour' in value.lower():
+            return [(0, 24 * 60)]
+        pairs = []
+        for part in value.split(','):
+            start, _, end = part.replace('–', '-').partition('-')
+            pairs.append((parse_time(start), parse_time(end)))
+    else:
+        return []
+    windows = []
+    for opens, closes in pairs:
+        if opens is None or closes is None:
+            continue
+        # Open past midnight: the part after midnight belongs to the next morning, not this day
+        windows.append((opens, closes if closes > opens else 24 * 60))
+    return windows
+
+
+def parse_opening_hours(value):
+    """
+    Opening windows per weekday (0 = Monday) from metadata opening_hours. Accepts one schedule for
+    every day or a dict keyed by weekday ('mon', 'Monday', 0-6). None when there is nothing usable,
+    meaning the item can be scheduled at any time of the day.
+    """
+    if value in (None, '', [], {}):
+        return None
+    if isinstance(value, dict) and 'open' not in value:
+        hours = {}
+        for key, schedule in value.items():
+            key = str(key).strip().lower()
+            day = int(key) if key.isdigit() and int(key) < 7 else next(
+                (n for n, name in enumerate(WEEKDAYS) if key.startswith(name)), None
+            )
+            if day is not None:
+                hours[day] = _windows(schedule)
+        if not hours:
+            return None
+        # Days the schedule leaves out are taken as closed
+        return {day: hours.get(day, []) for day in range(7)}
+    windows = _windows(value)
+    if not windows and not (isinstance(value, str) and value.strip().lower() == 'closed'):
+        return None
+    return {day: windows for day in range(7)}
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def make_item(kind, selection, coordinates=None):
+    metadata = selection.metadata if isinstance(selection.metadata, dict) else {}
+    duration = parse_duration(metadata.get('duration_minutes', metadata.get('duration')), DEFAULT_DURATION[kind])
+    windows = parse_opening_hours(metadata.get('opening_hours'))
+    fixed_time = parse_time(metadata.get('service_time') or metadata.get('time'))
+    if fixed_time is not None:
+        # Booked for a set time: the item has to start exactly then
+        windows = {day: [(fixed_time, fixed_time + duration)] for day in range(7)}
+    fixed_date = _parse_date(metadata.get('service_date') or metadata.get('date') or '')
+    latitude, longitude = coordinates or metadata_coordinates(metadata) or (None, None)
+    return PlanItem(
+        kind, str(selection.id), selection.name, selection.description or '',
+        getattr(selection, 'address', None) or metadata.get('address') or '',
+        duration, windows, {fixed_date} if fixed_date else None, latitude, longitude,
+    )
+
+
+def trip_days(trip, flights=(), max_activity_minutes=None, day_start=DAY_START, day_end=DAY_END):
+    """
+    The trip's days that can hold activities. Days before the outbound flight's departure or after
+    the return flight are dropped; the landing day starts late and the return day ends early.
+    """
+    first, last = trip.start_date, trip.end_date
+    arrival = departure = None
+    departures = [f.departure_date for f in flights if f.departure_date and first <= f.departure_date <= last]
+    returns = [f.return_date for f in flights if f.return_date and first <= f.return_date <= last]
+    if departures:
+        first = arrival = min(departures)
+    if returns:
+        last = departure = max(returns)
+
+    days = []
+    for n in range((last - first).days + 1):
+        day = first + timedelta(days=n)
+        start = max(day_start, ARRIVAL_DAY_START) if day == arrival else day_start
+        end = min(day_end, DEPARTURE_DAY_END) if day == departure else day_end
+        if end > start:
+            budget = end - start if max_activity_minutes is None else min(end - start, max_activity_minutes)
+            days.append(PlanDay(day, start, end, budget))
+    return days
+
+
+def travel_minutes(items):
+    """Travel time between every pair of items, as an n x n array of minutes."""
+    n = len(items)
+    minutes = np.full((n, n), float(UNKNOWN_TRAVEL_MINUTES))
+    located = np.array([item.latitude is not None and item.longitude is not None for item in items], dtype=bool)
+    if located.any():
+        index = np.flatnonzero(located)
+        km = haversine_matrix(
+            np.array([items[i].latitude for i in index], dtype=float),
+            np.array([items[i].longitude for i in index], dtype=float),
+        )
+        minutes[np.ix_(index, index)] = km / CITY_SPEED_KMH * 60 + TRANSFER_MINUTES
+    np.fill_diagonal(minutes, 0.0)
+    return minutes
+
+
+class DayPacker:
+    """
+    Fits items into days: each day is a sequence of items timed from the day's start, every item
+    starting inside one of its opening windows and finishing before the day ends, with the day's
+    activity minutes under its budget. Items are placed greedily, most constrained first, at the
+    cheapest feasible position (added travel and waiting); local search then moves items between
+    positions and days while that lowers the total, retrying the ones left out.
+    """
+
+    def __init__(self, items, days):
+        self.items = items
+        self.days = days
+        self.travel = travel_minutes(items).tolist()
+        self.sequences = [[] for _ in days]
+        self.costs = [0.0 for _ in days]
+        self.busy = [0 for _ in days]
+        self.unscheduled = []
+
+    def _allowed(self, i, d):
+        item, day = self.items[i], self.days[d]
+        if item.dates is not None and day.date not in item.dates:
+            return False
+        return item.windows is None or bool(item.windows[day.date.weekday()])
+
+    def timeline(self, d, sequence):
+        """(cost, start times) of the sequence on day d, or None when it does not fit."""
+        day = self.days[d]
+        weekday = day.date.weekday()
+        clock, cost, busy, previous, starts = day.start, 0.0, 0, None, []
+        for i in sequence:
+            item = self.items[i]
+            busy += item.duration
+            if busy > day.budget:
+                return None
+            if previous is not None:
+                clock += self.travel[previous][i]
+                cost += self.travel[previous][i]
+            windows = [(day.start, day.end)] if item.windows is None else item.windows[weekday]
+            start = None
+            for opens, closes in windows:
+                candidate = max(clock, opens)
+                if candidate + item.duration <= min(closes, day.end):
+                    start = candidate
+                    break
+            if start is None:
+                return None
+            cost += start - clock
+            starts.append(start)
+            clock = start + item.duration
+            previous = i
+        return cost, starts
+
+    def best_insertion(self, i):
+        """(added cost, day, position) of the cheapest place for item i, or None."""
+        best = None
+        for d in range(len(self.days)):
+            if not self._allowed(i, d):
+                continue
+            if self.busy[d] + self.items[i].duration > self.days[d].budget:
+                continue
+            sequence = self.sequences[d]
+            for position in range(len(sequence) + 1):
+                result = self.timeline(d, sequence[:position] + [i] + sequence[position:])
+                if result is None:
+                    continue
+                # Ties go to the emptier day, so items spread over the trip
+                added = (result[0] - self.costs[d], len(sequence))
+                if best is None or added < best[0]:
+                    best = (added, d, position)
+        return best and (best[0][0], best[1], best[2])
+
+    def insert(self, i, d, position):
+        self.sequences[d].insert(position, i)
+        self.costs[d] = self.timeline(d, self.sequences[d])[0]
+        self.busy[d] += self.items[i].duration
+
+    def remove(self, d, position):
+        """
+        Take the item at position out of day d and return it. Unknown travel times do not obey the
+        triangle inequality, so the rest of the day may no longer fit without it: then nothing
+        changes and None is returned.
+        """
+        sequence = self.sequences[d][:position] + self.sequences[d][position + 1:]
+        result = self.timeline(d, sequence)
+        if result is None:
+            return None
+        i = self.sequences[d][position]
+        self.sequences[d] = sequence
+        self.costs[d] = result[0]
+        self.busy[d] -= self.items[i].duration
+        return i
+
+    def _flexibility(self, i):
+        item = self.items[i]
+        days = sum(1 for d in range(len(self.days)) if self._allowed(i, d))
+        if item.windows is None:
+            window = DAY_END - DAY_START
+        else:
+            window = max((sum(c - o for o, c in w) for w in item.windows.values()), default=0)
+        return days, window - item.duration, -item.duration
+
+    def pack(self, deadline=None):
+        for i in sorted(range(len(self.items)), key=self._flexibility):
+            best = self.best_insertion(i)
+            if best is None:
+                self.unscheduled.append(i)
+            else:
+                self.insert(i, best[1], best[2])
+        self.improve(deadline)
+        return self
+
+    def improve(self, deadline=None):
+        improved = True
+        while improved and (deadline is None or time.perf_counter() < deadline):
+            improved = False
+            for d in range(len(self.days)):
+                position = 0
+                while position < len(self.sequences[d]):
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        return
+                    before = self.costs[d]
+                    i = self.remove(d, position)
+                    if i is None:
+                        position += 1
+                        continue
+                    saved = before - self.costs[d]
+                    best = self.best_insertion(i)
+                    if best is not None and best[0] < saved - 1e-6:
+                        self.insert(i, best[1], best[2])
+                        improved = True
+                    else:
+                        self.insert(i, d, position)
+                        position += 1
+            # Room freed by the moves may now take items that did not fit before
+            for i in list(self.unscheduled):
+                best = self.best_insertion(i)
+                if best is not None:
+                    self.insert(i, best[1], best[2])
+                    self.unscheduled.remove(i)
+                    improved = True
+
+
+def _clock(minutes):
+    return f"{int(minutes) // 60:02d}:{int(minutes) % 60:02d}"
+
+
+def build_plan(items, days, title='', time_budget_ms=LOCAL_SEARCH_MS):
+    """
+    Pack the items into the days. The result has the shape of GeneratedItinerary.itinerary_data,
+    plus the items that did not fit under "unscheduled".
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    packer = DayPacker(items, days).pack(deadline)
+    plan = []
+    for n, (day, sequence) in enumerate(zip(days, packer.sequences)):
+        _, starts = packer.timeline(n, sequence)
+        plan.append({
+            'day': n + 1,
+            'date': day.date.isoformat(),
+            'title': ', '.join(packer.items[i].name for i in sequence[:2]) or 'Free day',
+            'activities': [
+                {
+                    'time': _clock(start),
+                    'end_time': _clock(start + packer.items[i].duration),
+                    'name': packer.items[i].name,
+                    'description': packer.items[i].description,
+                    'location': packer.items[i].location,
+                    'kind': packer.items[i].kind,
+                    'selection_id': packer.items[i].id,
+                }
+                for i, start in zip(sequence, starts)
+            ],
+        })
+    return {
+        'title': title,
+        'days': plan,
+        'unscheduled': [
+            {'kind': packer.items[i].kind, 'selection_id': packer.items[i].id, 'name': packer.items[i].name}
+            for i in sorted(packer.unscheduled)
+        ],
+    }
+
+
+def trip_plan(trip, max_activity_minutes=None, time_budget_ms=LOCAL_SEARCH_MS):
+    """Day plan for the trip's selected places and services, around its selected flights."""
+    places, points, _ = trip_points(trip)
+    located = {point.id: (point.latitude, point.longitude) for point in points}
+    items = [make_item('place', place, located.get(place.id)) for place in places]
+    items += [make_item('service', service) for service in trip.trip_selected_services.all()]
+    days = trip_days(trip, list(trip.trip_selected_flights.all()), max_activity_minutes)
+    title = f"{trip.destination} ({trip.start_date} to {trip.end_date})"
+    return build_plan(items, days, title, time_budget_ms)
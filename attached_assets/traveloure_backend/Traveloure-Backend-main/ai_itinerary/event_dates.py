@@ -0,0 +1,156 @@
+import calendar
+import hashlib
+import re
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from ai_itinerary.generation_cache import normalize_text
+
+# Longer runs are cut here, which bounds how far back a trip-window query has to look
+MAX_EVENT_DAYS = 31
+# A date without a year is taken as the next one, unless it was at most this long ago
+PAST_YEAR_DAYS = 60
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTHS['sept'] = 9
+
+_ISO_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2}))?')
+_DATE_RE = re.compile(
+    r'\b(?:(?P<month>[a-z]{3,9})\.?\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?'
+    r'|(?P<day2>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<month2>[a-z]{3,9})\.?)\b'
+    r'(?:,?\s+(?P<year>\d{4})\b)?',
+    re.I,
+)
+# "Jun 14 – 16": an end day after a range dash, in the start's month
+_DAY_RANGE_RE = re.compile(r'^\s*(?:–|—|-|to|until)\s*(\d{1,2})\b(?!\s*:|\s*[ap]\.?m\b)(?:,?\s+(\d{4})\b)?', re.I)
+_TIME_RE = re.compile(r'\b(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\.?\b|\b(\d{1,2}):(\d{2})\b', re.I)
+_TIME_RANGE_RE = re.compile(
+    r'\b(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?\s*(?:–|—|-|to)\s*(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\.?\b',
+    re.I,
+)
+
+
+def _clock(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def _dates(text, reference):
+    """(start, end) dates named in text, end None for single days; years default around reference."""
+    iso = _ISO_RE.findall(text)
+    if iso:
+        try:
+            dates = [date(int(y), int(m), int(d)) for y, m, d, _, _ in iso[:2]]
+        except ValueError:
+            return None, None
+        return dates[0], dates[1] if len(dates) > 1 and dates[1] >= dates[0] else None
+
+    found = []
+    for match in _DATE_RE.finditer(text):
+        month = MONTHS.get((match.group('month') or match.group('month2')).lower())
+        if month is None:
+            continue
+        day = int(match.group('day') or match.group('day2'))
+        found.append((month, day, match.group('year') and int(match.group('year')), match.end()))
+        if len(found) == 2:
+            break
+    if not found:
+        return None, None
+
+    month, day, year, end = found[0]
+    if len(found) == 1:
+        day_range = _DAY_RANGE_RE.match(text[end:])
+        if day_range:
+            # "Jun 14 – 16, 2026": a year after the range is the start's too
+            year = year or (day_range.group(2) and int(day_range.group(2)))
+            found.append((month, int(day_range.group(1)), year, None))
+
+    start = None
+    for candidate in (year,) if year else (reference.year, reference.year + 1):
+        try:
+            start = date(candidate, month, day)
+        except ValueError:
+            continue
+        if year or start >= reference - timedelta(days=PAST_YEAR_DAYS):
+            break
+    if start is None:
+        return None, None
+    if len(found) == 1:
+        return start, None
+
+    month, day, year, end = found[1]
+    try:
+        if end is None:
+            # A day range: "Aug 31 – 2" runs into the next month
+            finish = date(start.year, month, day)
+            if finish < start:
+                finish = date(start.year + month // 12, month % 12 + 1, day)
+        else:
+            finish = date(year or start.year, month, day)
+            # "Dec 30 – Jan 2" crosses into the next year
+            if finish < start and not year:
+                finish = date(start.year + 1, month, day)
+    except ValueError:
+        return start, None
+    return start, finish if finish >= start else None
+
+
+def _times(text):
+    """(start, end) times of day named in text, either None."""
+    text = _ISO_RE.sub(lambda m: f" {m.group(4)}:{m.group(5)} " if m.group(4) else ' ', text)
+    text = _DATE_RE.sub(' ', text)
+    match = _TIME_RANGE_RE.search(text)
+    if match:
+        h1, m1, p1, h2, m2, p2 = match.groups()
+        # "8 – 11 PM": the start shares the end's half of the day
+        return _clock(h1, m1, p1 or p2), _clock(h2, m2, p2)
+    times = [
+        _clock(h12, m12, meridiem) if h12 else _clock(h24, m24, None)
+        for h12, m12, meridiem, h24, m24 in _TIME_RE.findall(text)[:2]
+    ] + [None, None]
+    return times[0], times[1]
+
+
+def parse_event_dates(text, reference=None):
+    """
+    (starts_at, ends_at) for the free-text date of an event ('Sat, Jun 14', 'Jun 14 – 16',
+    'Fri, Jun 13, 8 – 11 PM', '2025-06-14T19:00'), as aware datetimes in the current time zone.
+    Dates without a year are placed around reference (a date, default today). An event without an
+    end time lasts to the end of its last day. (None, None) when no date is found.
+    """
+    if not text:
+        return None, None
+    reference = reference or timezone.localdate()
+    start_date, end_date = _dates(str(text), reference)
+    if start_date is None:
+        return None, None
+    start_time, end_time = _times(str(text))
+
+    tz = timezone.get_current_timezone()
+    starts_at = timezone.make_aware(datetime.combine(start_date, start_time or time()), tz)
+    if end_time is not None:
+        ends_at = timezone.make_aware(datetime.combine(end_date or start_date, end_time), tz)
+        if ends_at <= starts_at:
+            # "10 PM – 2 AM" ends the next day
+            ends_at += timedelta(days=1)
+    else:
+        ends_at = timezone.make_aware(datetime.combine((end_date or start_date) + timedelta(days=1), time()), tz)
+    return starts_at, min(ends_at, starts_at + timedelta(days=MAX_EVENT_DAYS))
+
+
+def event_key(title, starts_at, start_date, city, address):
+    """
+    Identity of an event across searches: its title, day, the city searched and its address. Events
+    whose date did not parse fall back to the date text as given.
+    """
+    day = starts_at.date().isoformat() if starts_at else normalize_text(start_date or '')
+    raw = '|'.join((normalize_text(title or ''), day, normalize_text(city or ''), normalize_text(address or '')))
+    return hashlib.sha256(raw.encode()).hexdigest()
@@ -0,0 +1,236 @@
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from openai import OpenAI
+
+from ai_itinerary import generation_cache
+from ai_itinerary.generation_stream import ChunkLog, ItineraryStreamParser
+from ai_itinerary.itinerary_versions import commit_document
+from ai_itinerary.models import GeneratedItinerary
+
+logger = logging.getLogger('travelDNA')
+
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+IN_FLIGHT = (PENDING, RUNNING)
+
+# Serializes job claims across worker processes, so the concurrency limits hold globally
+CLAIM_LOCK_ID = 0x17E7A11
+# Pending rows looked at per claim when picking the least busy user
+CLAIM_WINDOW = 200
+# How often a running job bumps its updated_at while the reply streams; well under the stale cutoff
+HEARTBEAT_SECONDS = 15
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = OpenAI(
+            # A local stand-in needs no key, but the client refuses to start without one
+            api_key=settings.OPENAI_API_KEY or ('unused' if settings.OPENAI_BASE_URL else None),
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+            max_retries=1,
+        )
+    return _client
+
+
+def enqueue_generation(trip):
+    """
+    Queue an itinerary generation for the trip and return its GeneratedItinerary.
+    A request for a trip whose generation is still pending or running returns that job.
+    """
+    with transaction.atomic():
+        itinerary, created = GeneratedItinerary.objects.select_for_update().get_or_create(
+            trip=trip, defaults={'status': PENDING}
+        )
+        if not created and itinerary.status not in IN_FLIGHT:
+            itinerary.status = PENDING
+            itinerary.error_message = ''
+            itinerary.save(update_fields=['status', 'error_message', 'updated_at'])
+    return itinerary
+
+
+class LeaseLost(Exception):
+    """The job stopped heartbeating, was handed back to the queue and may be running elsewhere."""
+
+
+class Heartbeat:
+    """
+    A worker's lease on a running job. Each call refreshes updated_at, at most every
+    HEARTBEAT_SECONDS unless forced, and raises LeaseLost once the job is no longer ours.
+    """
+
+    def __init__(self, job_id, lease):
+        self.job_id = job_id
+        self.lease = lease
+        self.beat_at = None
+
+    def __call__(self, force=False):
+        now = time.monotonic()
+        if not force and self.beat_at is not None and now - self.beat_at < HEARTBEAT_SECONDS:
+            return
+        if not GeneratedItinerary.objects.filter(id=self.job_id, status=RUNNING, lease=self.lease).update(
+            updated_at=timezone.now()
+        ):
+            raise LeaseLost(f"Lost the lease on itinerary generation {self.job_id}")
+        self.beat_at = now
+
+
+def _requeue_stale():
+    """Running jobs whose worker died (no heartbeat for a while) are handed back to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=settings.OPENAI_TIMEOUT_SECONDS * 3)
+    GeneratedItinerary.objects.filter(status=RUNNING, updated_at__lt=cutoff).update(status=PENDING, lease='')
+
+
+def claim_next_job():
+    """
+    Mark the next job running and return (its id, the lease to run it under), or None when the
+    queue is empty or the global/per-user limits are reached. Among pending jobs, users with the fewest running
+    generations go first, then the oldest request.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CLAIM_LOCK_ID])
+        _requeue_stale()
+
+        running = Counter(
+            GeneratedItinerary.objects.filter(status=RUNNING).values_list('trip__user_id', flat=True)
+        )
+        if sum(running.values()) >= settings.ITINERARY_GENERATION_CONCURRENCY:
+            return None
+
+        candidates = (
+            GeneratedItinerary.objects.filter(status=PENDING)
+            .order_by('updated_at')
+            .values_list('id', 'trip__user_id')[:CLAIM_WINDOW]
+        )
+        eligible = [
+            (running[user_id], position, job_id)
+            for position, (job_id, user_id) in enumerate(candidates)
+            if running[user_id] < settings.ITINERARY_GENERATION_PER_USER
+        ]
+        if not eligible:
+            return None
+
+        _, _, job_id = min(eligible)
+        lease = uuid.uuid4().hex
+        GeneratedItinerary.objects.filter(id=job_id).update(status=RUNNING, lease=lease, updated_at=timezone.now())
+        return job_id, lease
+
+
+def build_messages(trip):
+    days = (trip.end_date - trip.start_date).days + 1
+    details = {
+        'destination': trip.destination,
+        'start_date': trip.start_date.isoformat(),
+        'end_date': trip.end_date.isoformat(),
+        'days': days,
+        'number_of_travelers': trip.number_of_travelers,
+        'preferences': trip.preferences or {},
+    }
+    return [
+        {
+            'role': 'system',
+            'content': (
+                "You are a travel planner. Reply with a JSON object of the form "
+                '{"title": str, "days": [{"day": int, "date": "YYYY-MM-DD", "title": str, '
+                '"activities": [{"time": "HH:MM", "name": str, "description": str, "location": str}]}]} '
+                "with one entry per day of the trip."
+            ),
+        },
+        {'role': 'user', 'content': json.dumps(details)},
+    ]
+
+
+def generate_itinerary_data(trip, on_event=None, heartbeat=None):
+    """
+    Itinerary for the trip, reused from an earlier generation for the same canonical request
+    (destination, length, month, travelers and preferences) when one is cached.
+    The reply is streamed; on_event receives each top-level field and day as soon as it is complete,
+    and heartbeat is called on every chunk.
+    """
+    on_event = on_event or (lambda event: None)
+    heartbeat = heartbeat or (lambda: None)
+    request = generation_cache.itinerary_request(trip)
+    cached = generation_cache.get_cached('itinerary', request)
+    if cached is not None:
+        data = generation_cache.personalize_itinerary(cached, trip)
+        for key, value in data.items():
+            if key != 'days':
+                on_event(('field', key, value))
+        for day in data['days']:
+            on_event(('day', day))
+        return data
+
+    stream = get_client().chat.completions.create(
+        model=settings.OPENAI_ITINERARY_MODEL,
+        messages=build_messages(trip),
+        response_format={'type': 'json_object'},
+        stream=True,
+        stream_options={'include_usage': True},
+    )
+    parser = ItineraryStreamParser()
+    content = []
+    tokens = 0
+    for chunk in stream:
+        heartbeat()
+        if chunk.usage:
+            tokens = chunk.usage.total_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            content.append(chunk.choices[0].delta.content)
+            for event in parser.feed(chunk.choices[0].delta.content):
+                on_event(event)
+
+    data = json.loads(''.join(content))
+    if generation_cache.is_valid_itinerary(data, request['days']):
+        generation_cache.store('itinerary', request, data, tokens)
+    else:
+        logger.warning(f"Itinerary for trip {trip.id} does not match the requested shape, not caching it")
+    return data
+
+
+def run_job(job_id, lease):
+    itinerary = GeneratedItinerary.objects.select_related('trip').get(id=job_id)
+    heartbeat = Heartbeat(job_id, lease)
+    try:
+        heartbeat(force=True)
+    except LeaseLost as e:
+        # Re-queued between the claim and now; whoever claimed it since runs it
+        logger.warning(str(e))
+        return False
+
+    log = ChunkLog(job_id)
+    try:
+        data = generate_itinerary_data(itinerary.trip, on_event=log.on_event, heartbeat=heartbeat)
+    except LeaseLost as e:
+        logger.warning(str(e))
+        return False
+    except Exception as e:
+        logger.error(f"Itinerary generation failed for trip {itinerary.trip_id}: {e}")
+        GeneratedItinerary.objects.filter(id=job_id, status=RUNNING, lease=lease).update(
+            status=FAILED, error_message=str(e), updated_at=timezone.now()
+        )
+        log.append({'type': 'failed', 'error': str(e)})
+        return False
+
+    # The streamed chunks are never written to the database, only the finished document
+    with transaction.atomic():
+        if GeneratedItinerary.objects.filter(id=job_id, status=RUNNING, lease=lease).update(
+            status=COMPLETED, error_message='', lease='', updated_at=timezone.now()
+        ):
+            commit_document(GeneratedItinerary, job_id, data, snapshot=True)
+    log.append({'type': 'completed', 'itinerary_data': data})
+    return True
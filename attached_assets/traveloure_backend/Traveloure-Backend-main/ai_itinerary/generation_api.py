@@ -0,0 +1,47 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.generation import COMPLETED, enqueue_generation
+from ai_itinerary.generation_cache import get_stats
+from ai_itinerary.models import GeneratedItinerary, Trip
+
+
+class GenerateItineraryAPIView(APIView):
+    """Queue an itinerary generation for the trip; poll ItineraryJobStatusAPIView with the returned id."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, trip_id):
+        trip = get_object_or_404(Trip, id=trip_id, user=request.user)
+        itinerary = enqueue_generation(trip)
+        return Response({
+            "message": "Itinerary generation queued",
+            "data": {"id": str(itinerary.id), "status": itinerary.status},
+            "status": True,
+        }, status=202)
+
+
+class ItineraryJobStatusAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        itinerary = get_object_or_404(GeneratedItinerary, id=id, trip__user=request.user)
+        data = {
+            "id": str(itinerary.id),
+            "trip": str(itinerary.trip_id),
+            "status": itinerary.status,
+            "error_message": itinerary.error_message,
+            "updated_at": itinerary.updated_at,
+        }
+        if itinerary.status == COMPLETED:
+            data["itinerary_data"] = itinerary.itinerary_data
+        return Response({"message": "Fetched Successfully", "data": data, "status": True}, status=200)
+
+
+class GenerationCacheStatsAPIView(APIView):
+    """Hit/miss counts of the generation cache and the LLM tokens its hits saved."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"message": "Fetched Successfully", "data": get_stats(), "status": True}, status=200)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import unicodedata
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+STATS_KEYS = {
+    'hits': 'generation-cache:hits',
+    'misses': 'generation-cache:misses',
+    'tokens_saved': 'generation-cache:tokens-saved',
+}
+
+
+def _cache():
+    # Own alias, so generated documents are evicted least recently used without pushing out other entries
+    return caches['generations']
+
+
+# Accents are folded on letters below this code point (Latin, Greek, Cyrillic). Marks of other
+# scripts (kana voicing, Devanagari virama, Thai tones) tell words apart and are kept.
+ACCENT_FOLDED_BELOW = 0x0530
+
+
+def _fold_accents(value):
+    chars = []
+    base = ''
+    for char in unicodedata.normalize('NFKD', value):
+        if not unicodedata.combining(char):
+            base = char
+        elif base and ord(base) < ACCENT_FOLDED_BELOW:
+            continue
+        chars.append(char)
+    return unicodedata.normalize('NFC', ''.join(chars))
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_' or unicodedata.category(char).startswith('M')
+
+
+def normalize_text(value):
+    """'  São Paulo, Brazil ' -> 'sao paulo brazil', 'Москва' -> 'москва', '東京' -> '東京'"""
+    value = _fold_accents(str(value)).casefold()
+    # Word characters and the marks kept above; \w alone would split 'दिल्ली' at its vowel signs
+    return ' '.join(''.join(char if _is_word_char(char) else ' ' for char in value).split())
+
+
+def _canonical(value):
+    """Preferences with keys sorted, strings normalized and list order ignored."""
+    if isinstance(value, dict):
+        return {normalize_text(k): _canonical(v) for k, v in value.items() if v not in (None, '', [], {})}
+    if isinstance(value, (list, tuple, set)):
+        return sorted((_canonical(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(value, str):
+        return normalize_text(value)
+    return value
+
+
+def _travelers_bucket(count):
+    return 'solo' if count <= 1 else 'couple' if count == 2 else 'group'
+
+
+def itinerary_request(trip):
+    """Canonical form of a trip's generation request; trips that differ only in dates or spelling share it."""
+    return {
+        'destination': normalize_text(trip.destination),
+        'days': (trip.end_date - trip.start_date).days + 1,
+        'month': trip.start_date.month,
+        'travelers': _travelers_bucket(trip.number_of_travelers),
+        'preferences': _canonical(trip.preferences or {}),
+        'model': settings.OPENAI_ITINERARY_MODEL,
+    }
+
+
+def request_key(kind, request):
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+    return f"generation:{kind}:{digest}"
+
+
+def is_valid_itinerary(data, days):
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get('days'), list)
+        and len(data['days']) == days
+        and all(isinstance(day, dict) and isinstance(day.get('activities'), list) for day in data['days'])
+    )
+
+
+def personalize_itinerary(data, trip):
+    """Re-date a cached itinerary for this trip; everything else in the document is shared."""
+    days = []
+    for n, day in enumerate(data['days']):
+        days.append({**day, 'day': n + 1, 'date': (trip.start_date + timedelta(days=n)).isoformat()})
+    return {**data, 'days': days}
+
+
+def _bump(stat, amount=1):
+    try:
+        cache.incr(STATS_KEYS[stat], amount)
+    except ValueError:
+        cache.add(STATS_KEYS[stat], 0, None)
+        cache.incr(STATS_KEYS[stat], amount)
+
+
+def get_cached(kind, request):
+    entry = _cache().get(request_key(kind, request))
+    if entry is None:
+        _bump('misses')
+        return None
+    _bump('hits')
+    _bump('tokens_saved', entry['tokens'])
+    return entry['data']
+
+
+def store(kind, request, data, tokens):
+    _cache().set(request_key(kind, request), {'data': data, 'tokens': tokens}, settings.GENERATION_CACHE_TTL)
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
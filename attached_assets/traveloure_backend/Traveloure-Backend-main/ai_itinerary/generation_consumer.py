@@ -0,0 +1,89 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.urls import path
+
+from ai_itinerary.generation import COMPLETED, FAILED
+from ai_itinerary.generation_stream import TERMINAL, group_name, replay
+from ai_itinerary.models import GeneratedItinerary
+
+
+class ItineraryStreamConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams a queued itinerary generation as it is produced: a "start" event, top-level "field"
+    events, one "day" event per finished day, then "completed" or "failed".
+    Clients reconnect with ?attempt=<attempt>&after=<last seq> to receive only what they missed.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.job_id = str(self.scope['url_route']['kwargs']['id'])
+        itinerary = await self._get_itinerary(user)
+        if itinerary is None:
+            await self.close(code=4404)
+            return
+
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            after = int(params.get('after', ['-1'])[0])
+        except ValueError:
+            after = -1
+        self.group = group_name(self.job_id)
+        await self.accept()
+        # Join before replaying, events that arrive meanwhile are handled afterwards and deduplicated by seq
+        await self.channel_layer.group_add(self.group, self.channel_name)
+
+        self.attempt, events, finished = await replay(self.job_id, params.get('attempt', [None])[0], after)
+        self.sent = -1
+        if self.attempt is None and itinerary.status in (COMPLETED, FAILED):
+            # The event log expired, the stored result is all there is
+            await self._send_final(itinerary)
+            return
+        for event in events:
+            await self._send_event(event)
+        if finished:
+            await self.close()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group'):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def itinerary_chunk(self, message):
+        event = message['event']
+        if event['attempt'] != self.attempt:
+            # A retry started over
+            self.attempt, self.sent = event['attempt'], -1
+        if event['seq'] <= self.sent:
+            return
+        if event['seq'] > self.sent + 1:
+            _, events, _ = await replay(self.job_id, self.attempt, self.sent)
+            for missed in events:
+                if missed['seq'] < event['seq']:
+                    await self._send_event(missed)
+        await self._send_event(event)
+        if event['type'] in TERMINAL:
+            await self.close()
+
+    async def _send_event(self, event):
+        await self.send_json(event)
+        self.sent = event['seq']
+
+    async def _send_final(self, itinerary):
+        if itinerary.status == COMPLETED:
+            await self.send_json({'type': 'completed', 'itinerary_data': itinerary.itinerary_data})
+        else:
+            await self.send_json({'type': 'failed', 'error': itinerary.error_message})
+        await self.close()
+
+    @database_sync_to_async
+    def _get_itinerary(self, user):
+        return GeneratedItinerary.objects.filter(id=self.job_id, trip__user=user).first()
+
+
+websocket_urlpatterns = [
+    path('ws/itinerary-jobs/<uuid:id>/', ItineraryStreamConsumer.as_asgi()),
+]
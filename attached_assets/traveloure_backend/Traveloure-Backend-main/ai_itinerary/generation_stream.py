@@ -0,0 +1,142 @@
+import json
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+STATE_KEY = 'itinerary-stream:{}'
+CHUNK_KEY = 'itinerary-stream:{}:{}:{}'
+TERMINAL = ('completed', 'failed')
+
+
+def group_name(job_id):
+    return f"itinerary-{job_id}"
+
+
+class ItineraryStreamParser:
+    """
+    Incremental scanner over the model's JSON reply. feed() returns the top-level fields
+    ('field', key, value) and the entries of "days" ('day', value) completed by the new text,
+    so days can be forwarded while the rest of the document is still being generated.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.after_colon = False
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+        self.day_start = None
+
+    def feed(self, text):
+        events = []
+        start = len(self.buffer)
+        self.buffer += text
+        for i in range(start, len(self.buffer)):
+            char = self.buffer[i]
+            depth = len(self.stack)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if depth == 1 and self.key_start is not None:
+                        self.key = json.loads(self.buffer[self.key_start:i + 1])
+                        self.key_start = None
+                    elif depth == 1 and self.value_start is not None:
+                        events.append(self._field(i + 1))
+                continue
+
+            if depth == 1 and char not in ' \t\r\n,:}' and self.after_colon and self.value_start is None:
+                self.value_start = i
+
+            if char == '"':
+                self.in_string = True
+                if depth == 1 and not self.after_colon:
+                    self.key_start = i
+            elif char in '{[':
+                if depth == 2 and char == '{' and self.key == 'days' and self.stack[-1] == '[':
+                    self.day_start = i
+                self.stack.append(char)
+            elif char in '}]':
+                self.stack.pop()
+                depth = len(self.stack)
+                if depth == 2 and self.day_start is not None:
+                    events.append(('day', json.loads(self.buffer[self.day_start:i + 1])))
+                    self.day_start = None
+                elif depth == 1 and self.value_start is not None:
+                    if self.key != 'days':
+                        events.append(self._field(i + 1))
+                    else:
+                        self.value_start = None
+                elif depth == 0 and self.value_start is not None:
+                    # A bare number/true/null closing the object
+                    events.append(self._field(i))
+            elif depth == 1 and char == ':':
+                self.after_colon = True
+            elif depth == 1 and char == ',':
+                if self.value_start is not None:
+                    events.append(self._field(i))
+                self.after_colon = False
+        return events
+
+    def _field(self, end):
+        value = json.loads(self.buffer[self.value_start:end])
+        self.value_start = None
+        self.after_colon = False
+        return 'field', self.key, value
+
+
+class ChunkLog:
+    """
+    Ordered events of one generation attempt. Each is kept in the cache so a reconnecting client
+    can replay what it missed, and broadcast to the job's group for clients already listening.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = str(job_id)
+        self.attempt = uuid.uuid4().hex
+        self.count = 0
+        self.channel_layer = get_channel_layer()
+        self.append({'type': 'start'})
+
+    def append(self, event):
+        event = {**event, 'attempt': self.attempt, 'seq': self.count}
+        timeout = settings.ITINERARY_STREAM_TTL
+        cache.set(CHUNK_KEY.format(self.job_id, self.attempt, self.count), event, timeout)
+        self.count += 1
+        cache.set(
+            STATE_KEY.format(self.job_id),
+            {'attempt': self.attempt, 'count': self.count, 'finished': event['type'] in TERMINAL},
+            timeout,
+        )
+        async_to_sync(self.channel_layer.group_send)(
+            group_name(self.job_id), {'type': 'itinerary.chunk', 'event': event}
+        )
+
+    def on_event(self, event):
+        kind, *payload = event
+        if kind == 'day':
+            self.append({'type': 'day', 'day': payload[0]})
+        else:
+            key, value = payload
+            self.append({'type': 'field', 'key': key, 'value': value})
+
+
+async def replay(job_id, attempt, after):
+    """Events of the job's current attempt after seq `after`, with whether the attempt finished."""
+    state = await cache.aget(STATE_KEY.format(job_id))
+    if state is None:
+        return None, [], False
+    if state['attempt'] != attempt:
+        after = -1
+    keys = [CHUNK_KEY.format(job_id, state['attempt'], seq) for seq in range(after + 1, state['count'])]
+    chunks = await cache.aget_many(keys)
+    return state['attempt'], [chunks[key] for key in keys if key in chunks], state['finished']
@@ -0,0 +1,100 @@
+import math
+import re
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Stored precision; a 9 character cell is about 5 x 5 m
+GEOHASH_PRECISION = 9
+
+_COORDINATE_RE = re.compile(r'^\s*([+-]?\d+(?:[.,]\d+)?)\s*°?\s*([NSEWnsew])?\s*$')
+
+
+def parse_coordinate(value, limit):
+    """
+    Float from the free-form coordinates the places agent returns ('48.85', '48,85', '48.85° N',
+    '2.35 W'), or None when it is missing, unparsable or outside [-limit, limit].
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = _COORDINATE_RE.match(str(value))
+        if not match:
+            return None
+        number = float(match.group(1).replace(',', '.'))
+        if match.group(2) and match.group(2).upper() in 'SW':
+            number = -abs(number)
+    if not math.isfinite(number) or abs(number) > limit:
+        return None
+    return number
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """(height, width) of a geohash cell of the given length, in degrees."""
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together contain the whole circle: the cell holding the point and
+    its eight neighbours, at the finest precision whose cells are at least radius_km across.
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    precision = GEOHASH_PRECISION
+    while precision > 1:
+        height, width = cell_size_degrees(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * KM_PER_DEGREE * cos_lat >= radius_km:
+            break
+        precision -= 1
+
+    height, width = cell_size_degrees(precision)
+    cells = set()
+    for d_lat in (-height, 0, height):
+        for d_lon in (-width, 0, width):
+            lat = min(max(latitude + d_lat, -90.0), 90.0)
+            lon = (longitude + d_lon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return sorted(cells)
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distances in km from one point to arrays of points."""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_matrix(latitudes, longitudes):
+    """Pairwise distances in km between points, as an n x n array."""
+    lat, lon = np.radians(latitudes), np.radians(longitudes)
+    d_lat = lat[:, None] - lat[None, :]
+    d_lon = lon[:, None] - lon[None, :]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
@@ -0,0 +1,296 @@
+import fcntl
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+from urllib.parse import urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.signing import Signer
+from django.utils.crypto import constant_time_compare
+from django.http import FileResponse, HttpResponseBadRequest, HttpResponseNotModified, HttpResponseRedirect
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('travelDNA')
+
+SIGN_SALT = 'image-proxy'
+CACHE_HEADER = 'public, max-age=31536000, immutable'
+# Evict down to this share of the limit so a full cache is not scanned on every write
+EVICT_TO = 0.9
+
+
+class ImageProxyError(Exception):
+    pass
+
+
+class DiskLRUCache:
+    """
+    Size-bounded file cache. Hits touch the file's mtime, and eviction removes the
+    least recently used files once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    @contextmanager
+    def single_flight(self, key):
+        """
+        Hold an exclusive lock on key, shared by the threads and processes using the directory,
+        so one caller fills a miss while the others wait and then read its result.
+        """
+        path = f"{self.path(key)}.lock"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(('.tmp', '.lock')):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, path, stat.st_size
+
+    def _evict(self):
+        # Rescan instead of trusting the running total, other workers share the directory
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * EVICT_TO
+        for _, path, size in entries:
+            if total <= target:
+                break
+            # Lock files stay: a caller may have opened one and be about to flock it, and
+            # unlinking it then would let the next caller lock a fresh file alongside.
+            # They are empty, so they never count against max_bytes.
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskLRUCache(settings.IMAGE_PROXY_CACHE_DIR, settings.IMAGE_PROXY_CACHE_MAX_BYTES)
+    return _cache
+
+
+def _sign(url):
+    return Signer(salt=SIGN_SALT).signature(url)
+
+
+def proxied_image_url(url, request=None, width=None):
+    """Rewrite a third-party image URL to go through the caching proxy."""
+    if not url or not isinstance(url, str) or urlparse(url).scheme not in ('http', 'https'):
+        return url
+    query = urlencode({'url': url, 'w': width or settings.IMAGE_PROXY_DEFAULT_WIDTH, 's': _sign(url)})
+    path = f"{reverse('image-proxy')}?{query}"
+    return request.build_absolute_uri(path) if request else path
+
+
+def _vetted_address(host):
+    """
+    The address the proxy may fetch host from. The request connects to it instead of resolving
+    the name again, so DNS cannot be rebound to a private address between the check and the fetch.
+    """
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ImageProxyError(f"Cannot resolve {host}: {e}")
+    addresses = [ipaddress.ip_address(info[4][0]) for info in infos]
+    if not addresses:
+        raise ImageProxyError(f"Cannot resolve {host}")
+    if not settings.IMAGE_PROXY_ALLOW_PRIVATE_HOSTS:
+        for address in addresses:
+            if not address.is_global:
+                raise ImageProxyError(f"Refusing to fetch from non-public address {address}")
+    return addresses[0]
+
+
+class PinnedHostAdapter(HTTPAdapter):
+    """Sends TLS SNI and verifies the certificate for host while the URL names its vetted address."""
+
+    def __init__(self, host, **kwargs):
+        self.host = host
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        # Dropped by urllib3 for plain http pools
+        kwargs['server_hostname'] = self.host
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _fetch(url):
+    parsed = urlparse(url)
+    host = parsed.hostname
+    if not host:
+        raise ImageProxyError("URL has no host")
+    address = _vetted_address(host)
+    netloc = f"[{address}]" if address.version == 6 else str(address)
+    if parsed.port:
+        netloc = f"{netloc}:{parsed.port}"
+    pinned_url = parsed._replace(netloc=netloc).geturl()
+    host_header = f"{host}:{parsed.port}" if parsed.port else host
+
+    with requests.Session() as session:
+        # Environment proxies would resolve the name themselves
+        session.trust_env = False
+        session.mount(f"{parsed.scheme}://", PinnedHostAdapter(host))
+        with session.get(
+            pinned_url, headers={'Host': host_header}, stream=True,
+            timeout=settings.IMAGE_PROXY_FETCH_TIMEOUT, allow_redirects=False,
+        ) as response:
+            response.raise_for_status()
+            if not response.headers.get('Content-Type', '').startswith('image/'):
+                raise ImageProxyError(f"Origin returned {response.headers.get('Content-Type')}")
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > settings.IMAGE_PROXY_MAX_SOURCE_BYTES:
+                    raise ImageProxyError("Origin image is too large")
+    return bytes(data)
+
+
+def _resize(original, width, fmt):
+    image = ImageOps.exif_transpose(Image.open(BytesIO(original)))
+    image.thumbnail((width, width * 4), Image.LANCZOS)
+    if fmt == 'webp':
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    else:
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, 'WEBP' if fmt == 'webp' else 'JPEG', quality=80, optimize=True)
+    return buffer.getvalue()
+
+
+def get_resized_image(url, width, fmt):
+    """
+    Path of the cached rendition, fetching the original and resizing it on a miss. Concurrent
+    misses for one URL wait for the first one instead of fetching the origin again.
+    """
+    cache = get_cache()
+    url_key = hashlib.sha256(url.encode()).hexdigest()
+    key = f"{url_key}_{width}.{fmt}"
+    path = cache.get(key)
+    if path:
+        return path, key
+
+    with cache.single_flight(url_key):
+        path = cache.get(key)
+        if path:
+            return path, key
+        original_key = f"{url_key}.orig"
+        original_path = cache.get(original_key)
+        if original_path:
+            with open(original_path, 'rb') as f:
+                original = f.read()
+        else:
+            original = _fetch(url)
+            cache.put(original_key, original)
+        return cache.put(key, _resize(original, width, fmt)), key
+
+
+@require_GET
+def image_proxy(request):
+    url = request.GET.get('url', '')
+    signature = request.GET.get('s', '')
+    if not url or not constant_time_compare(signature, _sign(url)):
+        return HttpResponseBadRequest("Invalid image URL signature")
+    try:
+        width = int(request.GET.get('w', settings.IMAGE_PROXY_DEFAULT_WIDTH))
+    except ValueError:
+        width = None
+    if width not in settings.IMAGE_PROXY_WIDTHS:
+        return HttpResponseBadRequest(f"Width must be one of {', '.join(map(str, settings.IMAGE_PROXY_WIDTHS))}")
+
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    try:
+        path, key = get_resized_image(url, width, fmt)
+        etag = f'"{key}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            # Opened before another worker can evict it; an unlinked open file stays readable
+            response = FileResponse(open(path, 'rb'), content_type=f'image/{fmt}')
+    except Exception as e:
+        logger.warning(f"Image proxy could not serve {url}: {e}")
+        return HttpResponseRedirect(url)
+
+    response['Cache-Control'] = CACHE_HEADER
+    response['ETag'] = etag
+    response['Vary'] = 'Accept'
+    return response
+
+
+class ProxiedImageMixin:
+    """
+    Serializer mixin rewriting the fields named in proxied_image_fields (a URL or a
+    list of URLs) through the image proxy on output. Input is left untouched.
+    """
+    proxied_image_fields = ('image_url',)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+        for field in self.proxied_image_fields:
+            value = data.get(field)
+            if isinstance(value, list):
+                data[field] = [proxied_image_url(url, request) for url in value]
+            elif value:
+                data[field] = proxied_image_url(value, request)
+        return data
@@ -0,0 +1,28 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.itinerary_projection import Projection, project_queryset
+from ai_itinerary.models import GeneratedItinerary
+from ai_itinerary.serializers import GeneratedItinerarySerializer
+
+
+class GeneratedItineraryDetailAPIView(APIView):
+    """
+    The trip owner's generated itinerary. ?days=3-5 and ?fields=title,days return only that part
+    of itinerary_data, extracted by the database where it can.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        queryset = project_queryset(
+            GeneratedItinerary.objects.filter(trip__user=request.user),
+            Projection.from_request(request),
+        )
+        itinerary = get_object_or_404(queryset, id=id)
+        return Response({
+            "message": "Fetched Successfully",
+            "data": GeneratedItinerarySerializer(itinerary, context={'request': request}).data,
+            "status": True,
+        }, status=200)
@@ -0,0 +1,142 @@
+import re
+
+from django.db import connections
+from django.db.models import F, Func, JSONField, Value
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELD_NAME = re.compile(r'^[A-Za-z0-9_]{1,64}$')
+MAX_FIELDS = 20
+
+
+class JsonbPathArray(Func):
+    function = 'jsonb_path_query_array'
+    template = '%(function)s(%(expressions)s::jsonpath)'
+    output_field = JSONField()
+
+
+class JsonbSet(Func):
+    output_field = JSONField()
+
+    def __init__(self, document, key, value):
+        self.key = key
+        super().__init__(document, value)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, value = self.get_source_expressions()
+        document_sql, document_params = compiler.compile(document)
+        value_sql, value_params = compiler.compile(value)
+        sql = f"jsonb_set({document_sql}, %s::text[], {value_sql})"
+        return sql, (*document_params, '{%s}' % self.key, *value_params)
+
+
+class JsonbPick(Func):
+    """Only the listed top-level members of a jsonb object."""
+    output_field = JSONField()
+
+    def __init__(self, document, keys):
+        super().__init__(document, *[Value(key) for key in keys])
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, *keys = self.get_source_expressions()
+        sql, params = compiler.compile(document)
+        key_sql = []
+        for key in keys:
+            part, part_params = compiler.compile(key)
+            key_sql.append(part)
+            params = (*params, *part_params)
+        return (
+            "(SELECT coalesce(jsonb_object_agg(e.key, e.value), '{}'::jsonb) "
+            f"FROM jsonb_each({sql}) AS e WHERE e.key IN ({', '.join(key_sql)}))"
+        ), params
+
+
+class Projection:
+    """
+    A slice of an itinerary document: ?days=3-5 keeps days 3 to 5 (1-based, inclusive) of its
+    "days" list, ?fields=title,days keeps only those top-level members. Either may be left out.
+    """
+
+    def __init__(self, days=None, fields=None):
+        self.days = days
+        self.fields = fields
+        if days is not None and fields is not None and 'days' not in fields:
+            self.fields = [*fields, 'days']
+
+    @classmethod
+    def from_request(cls, request):
+        """The projection asked for in the query string, or None for the whole document."""
+        if request is None:
+            return None
+        days = cls._parse_days(request.query_params.get('days'))
+        fields = cls._parse_fields(request.query_params.get('fields'))
+        if days is None and fields is None:
+            return None
+        return cls(days, fields)
+
+    @staticmethod
+    def _parse_days(value):
+        if not value:
+            return None
+        first, _, last = value.partition('-')
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise ValidationError({"days": "Use a day number or a range like 3-5."})
+        if not 1 <= first <= last:
+            raise ValidationError({"days": "Days start at 1 and a range must not run backwards."})
+        return first, last
+
+    @staticmethod
+    def _parse_fields(value):
+        if not value:
+            return None
+        fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+        if not fields or len(fields) > MAX_FIELDS or not all(FIELD_NAME.match(field) for field in fields):
+            raise ValidationError({"fields": f"Up to {MAX_FIELDS} comma-separated top-level itinerary keys."})
+        return fields
+
+    def expression(self, field='itinerary_data'):
+        """The projected document as a Postgres jsonb expression."""
+        document = F(field)
+        if self.days is not None:
+            first, last = self.days
+            days = JsonbPathArray(field, Value(f'$.days[{first - 1} to {last - 1}]'))
+            document = JsonbSet(document, 'days', days)
+        if self.fields is not None:
+            document = JsonbPick(document, self.fields)
+        return document
+
+    def apply(self, data):
+        """The same projection done in Python, for documents already loaded or other databases."""
+        if not isinstance(data, dict):
+            return data
+        if self.fields is not None:
+            data = {key: value for key, value in data.items() if key in self.fields}
+        if self.days is not None:
+            days = data.get('days')
+            first, last = self.days
+            data = {**data, 'days': days[first - 1:last] if isinstance(days, list) else []}
+        return data
+
+
+def project_queryset(queryset, projection, field='itinerary_data'):
+    """
+    Have the database send only the projected part of the itinerary. On Postgres the full
+    document is deferred and the slice annotated as itinerary_projection; elsewhere the
+    queryset is returned as is and ProjectedItineraryField slices in Python.
+    """
+    if projection is None or connections[queryset.db].vendor != 'postgresql':
+        return queryset
+    return queryset.defer(field).annotate(itinerary_projection=projection.expression(field))
+
+
+class ProjectedItineraryField(serializers.JSONField):
+    """itinerary_data narrowed to the ?days= / ?fields= of the request in the serializer context."""
+
+    def get_attribute(self, instance):
+        if hasattr(instance, 'itinerary_projection'):
+            return instance.itinerary_projection
+        data = super().get_attribute(instance)
+        projection = Projection.from_request(self.context.get('request'))
+        return projection.apply(data) if projection else data
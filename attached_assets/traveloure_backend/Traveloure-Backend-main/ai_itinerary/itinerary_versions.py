@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ai_itinerary.json_patch import apply_patch, make_patch
+from ai_itinerary.models import GeneratedItinerary, ItineraryRevision
+from ai_itinerary.share_snapshots import schedule_publish
+
+
+class VersionConflict(Exception):
+    def __init__(self, current):
+        super().__init__(f"Itinerary is at version {current}")
+        self.current = current
+
+
+def _owner_field(model):
+    return 'generated_itinerary' if model is GeneratedItinerary else 'expert_itinerary'
+
+
+def _revisions(model, itinerary_id):
+    return ItineraryRevision.objects.filter(**{f"{_owner_field(model)}_id": itinerary_id})
+
+
+def _commit(model, itinerary_id, change, user, expected_version, snapshot):
+    with transaction.atomic():
+        itinerary = model.objects.select_for_update().get(id=itinerary_id)
+        if expected_version is not None and expected_version != itinerary.version:
+            raise VersionConflict(itinerary.version)
+        document, patch = change(itinerary.itinerary_data)
+        if patch == []:
+            return itinerary
+
+        owner = {_owner_field(model): itinerary}
+        if itinerary.version == 0 and not _revisions(model, itinerary.id).exists():
+            # Whatever was written before versioning began is the base document
+            ItineraryRevision.objects.create(version=0, snapshot=itinerary.itinerary_data, **owner)
+        version = itinerary.version + 1
+        ItineraryRevision.objects.create(
+            version=version,
+            patch=patch,
+            snapshot=document if snapshot or version % settings.ITINERARY_SNAPSHOT_INTERVAL == 0 else None,
+            created_by=user,
+            **owner,
+        )
+
+        fields = {'itinerary_data': document, 'version': version}
+        if model is GeneratedItinerary:
+            fields['updated_at'] = timezone.now()
+        model.objects.filter(id=itinerary.id).update(**fields)
+        for field, value in fields.items():
+            setattr(itinerary, field, value)
+        # update() skips the post_save that refreshes share snapshots
+        if model is GeneratedItinerary and itinerary.share_key:
+            schedule_publish(id=itinerary.id)
+    return itinerary
+
+
+def commit_patch(model, itinerary_id, patch, user=None, expected_version=None):
+    """
+    Apply an RFC 6902 patch to the itinerary's current document and record it as the next version.
+    Raises JsonPatchError for a patch that does not apply and VersionConflict when
+    expected_version is given and no longer current.
+    """
+    return _commit(model, itinerary_id, lambda data: (apply_patch(data, patch), patch), user, expected_version, False)
+
+
+def commit_document(model, itinerary_id, document, user=None, expected_version=None, snapshot=False):
+    """Record a whole new document as the next version, storing only its difference from the current one."""
+    def change(data):
+        # A regenerated itinerary shares little with the old one, it is kept as a snapshot instead of a patch
+        return document, None if snapshot else make_patch(data, document)
+
+    return _commit(model, itinerary_id, change, user, expected_version, snapshot)
+
+
+def document_at(model, itinerary_id, version):
+    """The itinerary as it was at the version, rebuilt from the closest snapshot; None for unknown versions."""
+    revisions = _revisions(model, itinerary_id)
+    base = (
+        revisions.filter(version__lte=version, snapshot__isnull=False)
+        .order_by('-version')
+        .values_list('version', 'snapshot')
+        .first()
+    )
+    if base is None:
+        if version == 0 and not revisions.exists():
+            return model.objects.filter(id=itinerary_id).values_list('itinerary_data', flat=True).first()
+        return None
+    base_version, document = base
+    patches = list(
+        revisions.filter(version__gt=base_version, version__lte=version).order_by('version').values_list('patch', flat=True)
+    )
+    if len(patches) != version - base_version:
+        return None
+    for patch in patches:
+        document = apply_patch(document, patch)
+    return document
+
+
+def history(model, itinerary_id):
+    return _revisions(model, itinerary_id).order_by('-version').values(
+        'version', 'created_by', 'created_at', 'patch'
+    )
@@ -0,0 +1,108 @@
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.itinerary_versions import VersionConflict, commit_patch, document_at, history
+from ai_itinerary.json_patch import JsonPatchError
+from ai_itinerary.models import ExpertUpdatedItinerary, GeneratedItinerary
+
+
+class ItineraryVersionsBaseView(APIView):
+    permission_classes = [IsAuthenticated]
+    model = None
+
+    def readable(self, user):
+        raise NotImplementedError
+
+    def writable(self, user):
+        raise NotImplementedError
+
+
+class ItineraryVersionsAPIView(ItineraryVersionsBaseView):
+    """
+    GET lists the itinerary's versions, newest first, each with the patch that produced it.
+    PATCH applies {"patch": [RFC 6902 operations], "version": n} as the next version; with
+    "version" given, the edit is refused with 409 when someone else saved in between.
+    """
+
+    def get(self, request, id):
+        itinerary = get_object_or_404(self.readable(request.user), id=id)
+        return Response({
+            "message": "Fetched Successfully",
+            "data": {"version": itinerary.version, "versions": list(history(self.model, itinerary.id))},
+            "status": True,
+        }, status=200)
+
+    def patch(self, request, id):
+        itinerary = get_object_or_404(self.writable(request.user), id=id)
+        patch = request.data.get('patch')
+        expected_version = request.data.get('version')
+        if expected_version is not None and (isinstance(expected_version, bool) or not isinstance(expected_version, int)):
+            return Response({"message": "version must be an integer", "status": False}, status=400)
+        try:
+            itinerary = commit_patch(self.model, itinerary.id, patch, request.user, expected_version)
+        except VersionConflict as e:
+            return Response({
+                "message": "The itinerary was changed by someone else, reload and try again",
+                "data": {"version": e.current},
+                "status": False,
+            }, status=409)
+        except JsonPatchError as e:
+            return Response({"message": f"Invalid patch: {e}", "status": False}, status=400)
+        return Response({
+            "message": "Updated Successfully",
+            "data": {"version": itinerary.version, "itinerary_data": itinerary.itinerary_data},
+            "status": True,
+        }, status=200)
+
+
+class ItineraryVersionDetailAPIView(ItineraryVersionsBaseView):
+    """The itinerary as it was at one version."""
+
+    def get(self, request, id, version):
+        itinerary = get_object_or_404(self.readable(request.user), id=id)
+        document = document_at(self.model, itinerary.id, version)
+        if document is None:
+            return Response({"message": "Version not found", "status": False}, status=404)
+        return Response({
+            "message": "Fetched Successfully",
+            "data": {"version": version, "itinerary_data": document},
+            "status": True,
+        }, status=200)
+
+
+class GeneratedItineraryAccess:
+    model = GeneratedItinerary
+
+    def readable(self, user):
+        return GeneratedItinerary.objects.filter(trip__user=user)
+
+    writable = readable
+
+
+class ExpertItineraryAccess:
+    model = ExpertUpdatedItinerary
+
+    def readable(self, user):
+        return ExpertUpdatedItinerary.objects.filter(Q(trip__user=user) | Q(created_by=user))
+
+    def writable(self, user):
+        return ExpertUpdatedItinerary.objects.filter(created_by=user)
+
+
+class GeneratedItineraryVersionsAPIView(GeneratedItineraryAccess, ItineraryVersionsAPIView):
+    pass
+
+
+class GeneratedItineraryVersionDetailAPIView(GeneratedItineraryAccess, ItineraryVersionDetailAPIView):
+    pass
+
+
+class ExpertItineraryVersionsAPIView(ExpertItineraryAccess, ItineraryVersionsAPIView):
+    pass
+
+
+class ExpertItineraryVersionDetailAPIView(ExpertItineraryAccess, ItineraryVersionDetailAPIView):
+    pass
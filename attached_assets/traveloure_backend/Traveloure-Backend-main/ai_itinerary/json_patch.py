@@ -0,0 +1,152 @@
+import copy
+
+OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _tokens(pointer):
+    if pointer == '':
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON pointer '{pointer}'")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise JsonPatchError(f"Invalid array index '{token}'")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index {index} out of range")
+    return index
+
+
+def _resolve(document, tokens):
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise JsonPatchError(f"Member '{token}' not found")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_index(document, token)]
+        else:
+            raise JsonPatchError(f"Cannot descend into a scalar at '{token}'")
+    return document
+
+
+def _add(document, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        raise JsonPatchError("Cannot add to a scalar")
+    return document
+
+
+def _remove(document, tokens):
+    if not tokens:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent = _resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise JsonPatchError(f"Member '{tokens[-1]}' not found")
+        return document, parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return document, parent.pop(_index(parent, tokens[-1]))
+    raise JsonPatchError("Cannot remove from a scalar")
+
+
+def apply_patch(document, patch):
+    """Return a patched copy of the document; the operations are all-or-nothing."""
+    if not isinstance(patch, list):
+        raise JsonPatchError("A patch is a list of operations")
+    document = copy.deepcopy(document)
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS or 'path' not in operation:
+            raise JsonPatchError(f"Invalid operation {operation!r}")
+        op, path = operation['op'], _tokens(operation['path'])
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise JsonPatchError(f"'{op}' needs a value")
+        if op in ('move', 'copy') and 'from' not in operation:
+            raise JsonPatchError(f"'{op}' needs a from")
+
+        if op == 'add':
+            document = _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            document, _ = _remove(document, path)
+        elif op == 'replace':
+            if path:
+                _resolve(document, path)
+                document, _ = _remove(document, path)
+            document = _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'move':
+            source = _tokens(operation['from'])
+            if path[:len(source)] == source and path != source:
+                raise JsonPatchError("Cannot move a value into itself")
+            document, value = _remove(document, source)
+            document = _add(document, path, value)
+        elif op == 'copy':
+            document = _add(document, path, copy.deepcopy(_resolve(document, _tokens(operation['from']))))
+        elif not _equal(_resolve(document, path), operation['value']):
+            raise JsonPatchError(f"Test failed at '{operation['path']}'")
+    return document
+
+
+def _equal(a, b):
+    """JSON equality; unlike ==, true is not 1."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_equal(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def make_patch(source, target, path=''):
+    """Operations turning source into target, descending into objects and arrays so edits stay small."""
+    if _equal(source, target):
+        return []
+    if isinstance(source, dict) and isinstance(target, dict):
+        patch = []
+        for key in source:
+            if key not in target:
+                patch.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            if key not in source:
+                patch.append({'op': 'add', 'path': f"{path}/{_escape(key)}", 'value': value})
+            else:
+                patch.extend(make_patch(source[key], value, f"{path}/{_escape(key)}"))
+        return patch
+    if isinstance(source, list) and isinstance(target, list):
+        # Trim the common head and tail, so inserting or deleting a day does not rewrite the rest
+        start = 0
+        while start < min(len(source), len(target)) and _equal(source[start], target[start]):
+            start += 1
+        end_s, end_t = len(source), len(target)
+        while end_s > start and end_t > start and _equal(source[end_s - 1], target[end_t - 1]):
+            end_s -= 1
+            end_t -= 1
+        patch = []
+        paired = min(end_s, end_t) - start
+        for i in range(start, start + paired):
+            patch.extend(make_patch(source[i], target[i], f"{path}/{i}"))
+        for i in range(end_s - 1, start + paired - 1, -1):
+            patch.append({'op': 'remove', 'path': f"{path}/{i}"})
+        for i in range(start + paired, end_t):
+            patch.append({'op': 'add', 'path': f"{path}/{i}", 'value': target[i]})
+        return patch
+    return [{'op': 'replace', 'path': path, 'value': target}]
@@ -0,0 +1,65 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from ai_itinerary.event_dates import MAX_EVENT_DAYS
+from ai_itinerary.models import LiveEvent
+from ai_itinerary.place_search_cache import normalize_search
+
+EVENT_FIELDS = ('title', 'start_date', 'address', 'link', 'image_url')
+
+
+def store_events(entry, events):
+    """
+    Save the events a search (TouristPlacesSearches) found, given as dicts keyed by LiveEvent field
+    names. Events already stored by any search of the same city are updated in place and now point
+    to this one.
+    """
+    rows = {}
+    reference = timezone.localdate()
+    for item in events:
+        row = LiveEvent(search=entry, city=entry.normalized_search, **{field: item.get(field) for field in EVENT_FIELDS})
+        if not row.title:
+            continue
+        row.set_schedule(reference)
+        # Repeats within one batch would make the upsert touch a row twice
+        rows[row.event_key] = row
+    rows = list(rows.values())
+    LiveEvent.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['event_key'],
+        update_fields=['search', *EVENT_FIELDS, 'city', 'starts_at', 'ends_at'],
+    )
+    return rows
+
+
+def trip_window(trip):
+    """The trip's dates as [start, end) aware datetimes, the whole of its last day included."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(trip.start_date, time()), tz)
+    end = timezone.make_aware(datetime.combine(trip.end_date + timedelta(days=1), time()), tz)
+    return start, end
+
+
+def events_during(trip):
+    """
+    Events in the trip's destination overlapping its dates. Events last at most MAX_EVENT_DAYS,
+    so the ones still running at the start began no earlier than that: a single range scan of the
+    (city, starts_at) index.
+    """
+    start, end = trip_window(trip)
+    return LiveEvent.objects.filter(
+        city=normalize_search(trip.destination),
+        starts_at__gte=start - timedelta(days=MAX_EVENT_DAYS),
+        starts_at__lt=end,
+        ends_at__gt=start,
+    ).order_by('starts_at', 'title')
+
+
+def prune_events(retention_days):
+    """Delete events that ended more than retention_days ago, and undated ones no search refers to."""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    ended = LiveEvent.objects.filter(ends_at__lt=cutoff).delete()[1].get(LiveEvent._meta.label, 0)
+    orphaned = LiveEvent.objects.filter(starts_at__isnull=True, search__isnull=True).delete()[1].get(LiveEvent._meta.label, 0)
+    return ended + orphaned
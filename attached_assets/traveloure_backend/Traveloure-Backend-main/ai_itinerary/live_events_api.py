@@ -0,0 +1,18 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.live_events import events_during
+from ai_itinerary.models import Trip
+from ai_itinerary.serializers import LiveEventSerializer
+
+
+class TripEventsAPIView(APIView):
+    """Live events in the trip's destination that overlap its dates, earliest first."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trip_id):
+        trip = get_object_or_404(Trip, id=trip_id, user=request.user)
+        data = LiveEventSerializer(events_during(trip), many=True, context={'request': request}).data
+        return Response({"message": "Fetched Successfully", "data": data, "status": True}, status=200)
@@ -0,0 +1,55 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from ai_itinerary.affiliate_links import AffiliateLinks
+from ai_itinerary.models import AffiliatePlatform
+
+
+class Command(BaseCommand):
+    help = "Time rewriting a batch of links through compiled affiliate templates; fails when p95 is over --target-ms"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--links", type=int, default=10000)
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--target-ms", type=float, default=100.0, help="p95 limit for one batch")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # Unsaved platforms, so the run needs no database rows
+        created = datetime(2024, 1, 1)
+        platforms = [
+            AffiliatePlatform(title="Booking.com", platform="hotel", created_at=created,
+                              base_url="https://www.booking.com/index.html?aid=123456&label=traveloure"),
+            AffiliatePlatform(title="Deep link", platform="hotel", created_at=created + timedelta(days=1),
+                              base_url="https://prf.hn/click/camref:1100l/destination:{url}"),
+            AffiliatePlatform(title="Flights", platform="flight", created_at=created,
+                              base_url="https://flights.example.com/search?to={destination}&ref=traveloure&q={name}"),
+        ]
+        start = time.perf_counter()
+        links = AffiliateLinks(platforms)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        batch = []
+        for n in range(options["links"]):
+            kind = rng.choice(("hotel", "hotel", "flight", "place"))
+            host = rng.choice(("www.booking.com", "m.booking.com", "hotels.example.com", f"site{n % 200}.example.org"))
+            query = "?checkin=2025-06-01&group_adults=2" if rng.random() < 0.5 else ""
+            batch.append((kind, f"https://{host}/{kind}/{n}.html{query}", f"{kind} {n}", "Lisbon", n))
+
+        timings = []
+        for _ in range(options["runs"]):
+            start = time.perf_counter()
+            links.rewrite(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f"compiled {len(platforms)} templates in {compile_ms:.2f} ms")
+        self.stdout.write(
+            f"{len(batch)} links: p50 {statistics.median(timings):.1f} ms, p95 {p95:.1f} ms, max {timings[-1]:.1f} ms"
+        )
+        if p95 > options["target_ms"]:
+            raise CommandError(f"p95 {p95:.1f} ms over {options['target_ms']} ms")
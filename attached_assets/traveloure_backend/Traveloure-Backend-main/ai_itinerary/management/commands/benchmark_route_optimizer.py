@@ -0,0 +1,51 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from ai_itinerary import route_optimizer
+from ai_itinerary.route_optimizer import RoutePoint, optimize_route
+
+
+class Command(BaseCommand):
+    help = "Time the route optimizer on random places around a city; fails when p95 is over --target-ms"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--places", type=int, nargs="+", default=[10, 50, 150, 300])
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--runs", type=int, default=30)
+        parser.add_argument("--time-budget-ms", type=int, default=None)
+        parser.add_argument("--target-ms", type=float, default=50.0, help="p95 limit for 150 places")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def _time(self, points, days, budget, runs, cold):
+        timings = []
+        for _ in range(runs):
+            if cold:
+                route_optimizer._matrices.clear()
+            start = time.perf_counter()
+            optimize_route(points, days, budget)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        slow = []
+        for count in options["places"]:
+            # Spread over roughly 20 x 20 km, like a city trip
+            points = [
+                RoutePoint(n, 48.8566 + rng.uniform(-0.09, 0.09), 2.3522 + rng.uniform(-0.135, 0.135))
+                for n in range(count)
+            ]
+            for cold in (True, False):
+                timings = self._time(points, options["days"], options["time_budget_ms"], options["runs"], cold)
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f"{count:>5} places {'cold' if cold else 'warm'}: "
+                    f"p50 {statistics.median(timings):.1f} ms, p95 {p95:.1f} ms, max {timings[-1]:.1f} ms"
+                )
+                if count == 150 and p95 > options["target_ms"]:
+                    slow.append(f"{'cold' if cold else 'warm'} p95 {p95:.1f} ms")
+        if slow:
+            raise CommandError(f"150 places over {options['target_ms']} ms: {', '.join(slow)}")
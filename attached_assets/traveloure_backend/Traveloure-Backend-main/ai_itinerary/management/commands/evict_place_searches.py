@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ai_itinerary.live_events import prune_events
+from ai_itinerary.map_clusters import prune_empty
+from ai_itinerary.place_search_cache import evict_cold_searches
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete tourist place searches nobody looked up recently, least recently used first, past live events "
+        "and the map clusters left empty"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-entries", type=int, default=settings.PLACE_SEARCH_MAX_ENTRIES)
+        parser.add_argument("--idle-days", type=int, default=settings.PLACE_SEARCH_IDLE_DAYS)
+        parser.add_argument("--event-retention-days", type=int, default=settings.LIVE_EVENT_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = evict_cold_searches(options["max_entries"], options["idle_days"])
+        self.stdout.write(f"Evicted {deleted} searches")
+        pruned = prune_events(options["event_retention_days"])
+        self.stdout.write(f"Pruned {pruned} live events")
+        self.stdout.write(f"Pruned {prune_empty()} empty map clusters")
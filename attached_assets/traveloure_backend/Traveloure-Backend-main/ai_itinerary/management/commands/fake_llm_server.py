@@ -0,0 +1,114 @@
+import json
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+
+
+def fake_itinerary(details):
+    start = date.fromisoformat(details.get("start_date", date.today().isoformat()))
+    destination = details.get("destination", "the destination")
+    return {
+        "title": f"{details.get('days', 1)} days in {destination}",
+        "days": [
+            {
+                "day": n + 1,
+                "date": (start + timedelta(days=n)).isoformat(),
+                "title": f"Day {n + 1} in {destination}",
+                "activities": [
+                    {"time": "09:00", "name": "Morning walk", "description": "Explore the old town.", "location": destination},
+                    {"time": "13:00", "name": "Lunch", "description": "Try a local specialty.", "location": destination},
+                ],
+            }
+            for n in range(details.get("days", 1))
+        ],
+    }
+
+
+def make_server(port, delay=1.0, fail_rate=0.0):
+    """
+    A ThreadingHTTPServer answering chat completions with fake_itinerary, streamed or not; port 0
+    picks a free one. Tests run it in a thread, the command serves it until interrupted.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            # A streamed reply starts at once and spreads the delay over its chunks
+            time.sleep(0 if body.get("stream") else delay)
+            if random.random() < fail_rate:
+                return self._send(500, {"error": {"message": "Fake failure", "type": "server_error"}})
+
+            try:
+                details = json.loads(body["messages"][-1]["content"])
+            except (KeyError, IndexError, ValueError):
+                details = {}
+            if body.get("stream"):
+                return self._stream(body, json.dumps(fake_itinerary(details)))
+            self._send(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps(fake_itinerary(details))},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        def _stream(self, body, content):
+            """Server-sent chunks of about 16 characters, the delay spread over them."""
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+
+            def event(choices, usage=None):
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": choices,
+                    "usage": usage,
+                }
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            for piece in pieces:
+                event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                time.sleep(delay / len(pieces))
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            event([], {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)})
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+class Command(BaseCommand):
+    help = "Serve a stand-in for the OpenAI chat completions API; set OPENAI_BASE_URL=http://127.0.0.1:<port>/v1"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--delay", type=float, default=1.0, help="Seconds each completion takes")
+        parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+
+    def handle(self, *args, **options):
+        server = make_server(options["port"], options["delay"], options["fail_rate"])
+        self.stdout.write(f"Fake LLM listening on http://127.0.0.1:{options['port']}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from ai_itinerary.map_clusters import SOURCES, rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the map clusters from the place and service tables; only needed once or after bulk SQL edits"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=list(SOURCES), help="Only rebuild this kind")
+
+    def handle(self, *args, **options):
+        for kind in [options["kind"]] if options["kind"] else SOURCES:
+            rebuild(kind)
+            self.stdout.write(f"Rebuilt {kind} clusters")
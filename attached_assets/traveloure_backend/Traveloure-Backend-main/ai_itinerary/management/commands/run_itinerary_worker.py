@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from ai_itinerary.generation import claim_next_job, run_job
+
+
+def _run(job_id, lease):
+    try:
+        return run_job(job_id, lease)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run queued itinerary generations with a bounded number of concurrent LLM calls"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=settings.ITINERARY_GENERATION_CONCURRENCY,
+            help="Generations this process runs at once; the global limit still applies across processes",
+        )
+        parser.add_argument("--sleep", type=float, default=0.25, help="Seconds to wait when nothing can be claimed")
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="itinerary") as executor:
+            while True:
+                in_flight = {future for future in in_flight if not future.done()}
+                claimed = False
+                while len(in_flight) < threads:
+                    close_old_connections()
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    claimed = True
+                    job_id, lease = job
+                    self.stdout.write(f"Generating itinerary {job_id}")
+                    in_flight.add(executor.submit(_run, job_id, lease))
+                if not claimed:
+                    time.sleep(options["sleep"])
@@ -0,0 +1,33 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.map_clusters import SOURCES, clusters_in_bbox
+
+
+class MapClustersAPIView(APIView):
+    """
+    Precomputed clusters for a map viewport: ?kind=place|service&bbox=south,west,north,east&zoom=<0-22>.
+    Each cluster has its count, centroid and best item.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        kind = request.query_params.get('kind', 'place')
+        if kind not in SOURCES:
+            raise ValidationError({"kind": f"Must be one of {', '.join(SOURCES)}."})
+        try:
+            south, west, north, east = (float(v) for v in request.query_params.get('bbox', '').split(','))
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            raise ValidationError({"detail": "Pass bbox=south,west,north,east and an integer zoom."})
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180 and 0 <= zoom <= 22):
+            raise ValidationError({"detail": "bbox or zoom out of range."})
+
+        precision, clusters = clusters_in_bbox(kind, south, west, north, east, zoom)
+        return Response({
+            "message": "Fetched Successfully",
+            "data": {"kind": kind, "precision": precision, "clusters": clusters},
+            "status": True,
+        }, status=200)
@@ -0,0 +1,269 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from ai_itinerary.geo import cell_size_degrees, encode_geohash
+from ai_itinerary.models import MapCluster, TouristPlaceResults, TouristPreferences
+from serviceproviderapp.models import AllService
+
+ClusterPoint = namedtuple('ClusterPoint', 'id name latitude longitude score')
+
+# Geohash lengths clusters are kept for; each is 32x finer than the one before
+PRECISIONS = range(1, 9)
+# Precision shown at each map zoom level, so a cluster cell spans roughly 40-160 px on screen
+ZOOM_PRECISION = [1, 1, 1, 2, 2, 3, 3, 3, 4, 4, 5, 5, 5, 6, 6, 7, 7, 7, 8]
+MAX_CELLS = 1024
+
+
+def zoom_precision(zoom):
+    return ZOOM_PRECISION[min(max(zoom, 0), len(ZOOM_PRECISION) - 1)]
+
+
+def place_point(place, score=None):
+    if place.latitude is None or place.longitude is None:
+        return None
+    if score is None:
+        score = TouristPreferences.objects.filter(preference_id=place.id).count()
+    return ClusterPoint(place.id, place.place, place.latitude, place.longitude, score)
+
+
+def service_point(service):
+    if service.latitude is None or service.longitude is None or service.form_status != 'approved':
+        return None
+    return ClusterPoint(service.id, service.service_name or '', service.latitude, service.longitude, 0)
+
+
+def _top_place(cell):
+    return (
+        TouristPlaceResults.objects.filter(geohash__startswith=cell)
+        .annotate(score=Count('touristpreferences'))
+        .order_by('-score', 'id')
+        .values_list('id', 'place', 'score')
+        .first()
+    )
+
+
+def _top_service(cell):
+    # Services carry no score, the longest listed one leads
+    top = (
+        AllService.objects.filter(geohash__startswith=cell, form_status='approved')
+        .order_by('created_at')
+        .values_list('id', 'service_name')
+        .first()
+    )
+    return top and (*top, 0)
+
+
+SOURCES = {
+    'place': {'model': TouristPlaceResults, 'top': _top_place},
+    'service': {'model': AllService, 'top': _top_service},
+}
+
+
+def _recompute_top(kind, precision, cell):
+    """
+    Find the cell's leader again after it left. Only the finest cells scan the items; a coarser
+    cell's leader is the best of its (at most 32) child cells' leaders, so recomputing never scans
+    a continent. Callers go from fine to coarse, so the children are already current.
+    """
+    if precision == max(PRECISIONS):
+        top = SOURCES[kind]['top'](cell)
+    else:
+        top = (
+            MapCluster.objects.filter(
+                kind=kind, precision=precision + 1, cell__startswith=cell, count__gt=0, top_item_id__isnull=False
+            )
+            .order_by('-top_score', 'top_item_id')
+            .values_list('top_item_id', 'top_item_name', 'top_score')
+            .first()
+        )
+    item_id, name, score = top if top else (None, '', 0)
+    MapCluster.objects.filter(kind=kind, precision=precision, cell=cell).update(
+        top_item_id=item_id, top_item_name=name or '', top_score=score
+    )
+
+
+def _lock_cells(kind, keys):
+    """
+    Create the missing cells among keys and lock them all, in a fixed order so concurrent
+    writers cannot deadlock. A cell pruned between the create and the lock is created again.
+    """
+    while True:
+        MapCluster.objects.bulk_create(
+            [MapCluster(kind=kind, precision=p, cell=c) for p, c in keys],
+            ignore_conflicts=True,
+        )
+        by_precision = defaultdict(list)
+        for precision, cell in keys:
+            by_precision[precision].append(cell)
+        cells = Q()
+        for precision, precision_cells in by_precision.items():
+            cells |= Q(precision=precision, cell__in=precision_cells)
+        locked = list(
+            MapCluster.objects.select_for_update().filter(cells, kind=kind)
+            .order_by('precision', 'cell').values_list('precision', 'cell')
+        )
+        if len(locked) == len(keys):
+            return
+
+
+def apply(kind, removed=(), added=()):
+    """
+    Move points out of and into the clusters of every precision. A point moved or renamed
+    is passed in both lists with its old and new values. Cells left empty stay, with a zero
+    count, until prune_empty; deleting them here would race with a concurrent add.
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    best = {}
+    removed_ids = defaultdict(set)
+    for sign, points in ((-1, removed), (1, added)):
+        for point in points:
+            if point is None:
+                continue
+            full = encode_geohash(point.latitude, point.longitude, max(PRECISIONS))
+            for precision in PRECISIONS:
+                key = (precision, full[:precision])
+                delta = deltas[key]
+                delta[0] += sign
+                delta[1] += sign * point.latitude
+                delta[2] += sign * point.longitude
+                if sign < 0:
+                    removed_ids[key].add(point.id)
+                elif key not in best or point.score > best[key].score:
+                    best[key] = point
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        _lock_cells(kind, sorted(deltas))
+        for (precision, cell), (count, latitude, longitude) in deltas.items():
+            MapCluster.objects.filter(kind=kind, precision=precision, cell=cell).update(
+                count=F('count') + count,
+                latitude_sum=F('latitude_sum') + latitude,
+                longitude_sum=F('longitude_sum') + longitude,
+            )
+
+        for key, point in best.items():
+            clusters = MapCluster.objects.filter(kind=kind, precision=key[0], cell=key[1])
+            # The same item re-added (moved inside the cell or renamed) keeps its place with its new values
+            clusters.filter(top_item_id=point.id).update(top_item_name=point.name, top_score=point.score)
+            clusters.filter(Q(top_item_id__isnull=True) | Q(top_score__lt=point.score)).update(
+                top_item_id=point.id, top_item_name=point.name, top_score=point.score
+            )
+        # Finest first, coarser leaders are recomputed from their children
+        for (precision, cell), ids in sorted(removed_ids.items(), reverse=True):
+            ids -= {point.id for key, point in best.items() if key == (precision, cell)}
+            if ids and MapCluster.objects.filter(kind=kind, precision=precision, cell=cell, top_item_id__in=ids).exists():
+                _recompute_top(kind, precision, cell)
+
+
+def prune_empty():
+    """Delete the cells whose every point left; run periodically, outside request transactions."""
+    return MapCluster.objects.filter(count__lte=0).delete()[1].get(MapCluster._meta.label, 0)
+
+
+def rescore_place(place_id):
+    """A place's preference count changed; it may now lead, or stop leading, its clusters."""
+    place = TouristPlaceResults.objects.filter(id=place_id).first()
+    point = place and place_point(place)
+    if point is None:
+        return
+    full = encode_geohash(point.latitude, point.longitude, max(PRECISIONS))
+    with transaction.atomic():
+        # Finest first, coarser leaders are recomputed from their children
+        for precision in reversed(PRECISIONS):
+            clusters = MapCluster.objects.filter(kind='place', precision=precision, cell=full[:precision])
+            if clusters.filter(top_item_id=point.id, top_score__gt=point.score).exists():
+                _recompute_top('place', precision, full[:precision])
+                continue
+            clusters.filter(Q(top_item_id=point.id) | Q(top_score__lt=point.score)).update(
+                top_item_id=point.id, top_item_name=point.name, top_score=point.score
+            )
+
+
+def clusters_in_bbox(kind, south, west, north, east, zoom):
+    """Clusters intersecting the box at the zoom's precision; a box crossing the antimeridian has west > east."""
+    precision = zoom_precision(zoom)
+    while True:
+        height, width = cell_size_degrees(precision)
+        lon_ranges = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rows = range(int((south + 90) // height), int(min(north + 90, 180 - 1e-9) // height) + 1)
+        columns = [
+            j
+            for low, high in lon_ranges
+            for j in range(int((low + 180) // width), int(min(high + 180, 360 - 1e-9) // width) + 1)
+        ]
+        if len(rows) * len(columns) <= MAX_CELLS or precision == 1:
+            break
+        precision -= 1
+
+    cells = [
+        encode_geohash(-90 + (i + 0.5) * height, -180 + (j + 0.5) * width, precision)
+        for i in rows
+        for j in columns
+    ]
+    clusters = MapCluster.objects.filter(kind=kind, precision=precision, cell__in=cells, count__gt=0)
+    return precision, [
+        {
+            'cell': cluster.cell,
+            'count': cluster.count,
+            'latitude': round(cluster.latitude_sum / cluster.count, 6),
+            'longitude': round(cluster.longitude_sum / cluster.count, 6),
+            'top': {'id': cluster.top_item_id, 'name': cluster.top_item_name} if cluster.top_item_id else None,
+        }
+        for cluster in clusters
+    ]
+
+
+def rebuild(kind, chunk_size=2000):
+    """Recompute every cluster of the kind from its table."""
+    source = SOURCES[kind]
+    queryset = source['model'].objects.exclude(geohash='')
+    if kind == 'place':
+        queryset = queryset.annotate(score=Count('touristpreferences'))
+    with transaction.atomic():
+        MapCluster.objects.filter(kind=kind).delete()
+        batch = []
+        for item in queryset.iterator(chunk_size=chunk_size):
+            point = place_point(item, item.score) if kind == 'place' else service_point(item)
+            if point is not None:
+                batch.append(point)
+            if len(batch) >= chunk_size:
+                apply(kind, added=batch)
+                batch = []
+        apply(kind, added=batch)
+
+
+def _point(kind, instance):
+    # Without the score, which a save does not change; only preferences move it
+    return place_point(instance, score=0) if kind == 'place' else service_point(instance)
+
+
+def remember_point(sender, instance, **kwargs):
+    kind = 'place' if sender is TouristPlaceResults else 'service'
+    previous = None
+    if not instance._state.adding:
+        previous = sender.objects.filter(pk=instance.pk).first()
+    instance._previous_cluster_point = previous and _point(kind, previous)
+
+
+def point_saved(sender, instance, **kwargs):
+    kind = 'place' if sender is TouristPlaceResults else 'service'
+    old = getattr(instance, '_previous_cluster_point', None)
+    new = _point(kind, instance)
+    if old == new:
+        return
+    if kind == 'place' and new is not None:
+        new = place_point(instance)
+    apply(kind, removed=[old], added=[new])
+
+
+def point_deleted(sender, instance, **kwargs):
+    kind = 'place' if sender is TouristPlaceResults else 'service'
+    apply(kind, removed=[_point(kind, instance)])
+
+
+def preference_changed(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        transaction.on_commit(lambda: rescore_place(instance.preference_id))
@@ -0,0 +1,64 @@
+import unicodedata
+
+from django.db import migrations
+from django.db.models import Count
+
+from ai_itinerary.countries import COUNTRY_NAMES
+
+
+def _fold_accents(value):
+    chars = []
+    base = ''
+    for char in unicodedata.normalize('NFKD', value):
+        if not unicodedata.combining(char):
+            base = char
+        elif base and ord(base) < 0x0530:
+            continue
+        chars.append(char)
+    return unicodedata.normalize('NFC', ''.join(chars))
+
+
+def _normalize(value):
+    # Same as ai_itinerary.generation_cache.normalize_text, frozen here
+    value = _fold_accents(str(value)).casefold()
+    return ' '.join(''.join(
+        char if char.isalnum() or char == '_' or unicodedata.category(char).startswith('M') else ' '
+        for char in value
+    ).split())
+
+
+def merge_duplicate_searches(apps, schema_editor):
+    """Fill normalized_search and fold searches sharing one into the search with the most results."""
+    TouristPlacesSearches = apps.get_model('ai_itinerary', 'TouristPlacesSearches')
+    TouristPlaceResults = apps.get_model('ai_itinerary', 'TouristPlaceResults')
+    LiveEvent = apps.get_model('ai_itinerary', 'LiveEvent')
+
+    groups = {}
+    searches = TouristPlacesSearches.objects.annotate(result_count=Count('touristplaceresults'))
+    for search in searches.iterator():
+        segments = [s for s in (_normalize(part) for part in search.search.split(',')) if s]
+        while len(segments) > 1 and segments[-1] in COUNTRY_NAMES:
+            segments.pop()
+        key = ' '.join(segments)[:255] or str(search.id)
+        groups.setdefault(key, []).append(search)
+
+    for key, searches in groups.items():
+        searches.sort(key=lambda s: -s.result_count)
+        keeper, duplicates = searches[0], searches[1:]
+        if duplicates:
+            TouristPlaceResults.objects.filter(search__in=duplicates).update(search=keeper)
+            LiveEvent.objects.filter(search__in=duplicates).update(search=keeper)
+            TouristPlacesSearches.objects.filter(id__in=[s.id for s in duplicates]).delete()
+        keeper.normalized_search = key
+        keeper.save(update_fields=['normalized_search'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0019_touristplacessearches_cache_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_searches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0020_merge_duplicate_touristplacessearches'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='touristplacessearches',
+            name='normalized_search',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0021_alter_touristplacessearches_normalized_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='touristplaceresults',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+from ai_itinerary.geo import encode_geohash, parse_coordinate
+
+
+def clean_coordinates(apps, schema_editor):
+    """Rewrite the text coordinates as plain decimals, or NULL when invalid, so the columns can become floats."""
+    TouristPlaceResults = apps.get_model('ai_itinerary', 'TouristPlaceResults')
+    rows = TouristPlaceResults.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=2000)
+    batch = []
+    for row in rows:
+        latitude = parse_coordinate(row.latitude, 90)
+        longitude = parse_coordinate(row.longitude, 180)
+        if latitude is None or longitude is None:
+            latitude = longitude = None
+        row.latitude = None if latitude is None else repr(latitude)
+        row.longitude = None if longitude is None else repr(longitude)
+        row.geohash = '' if latitude is None else encode_geohash(latitude, longitude)
+        batch.append(row)
+        if len(batch) == 2000:
+            TouristPlaceResults.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+            batch = []
+    TouristPlaceResults.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0022_touristplaceresults_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(clean_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0024_alter_touristplaceresults_latitude_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCluster',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('place', 'Place'), ('service', 'Service')], max_length=20)),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('cell', models.CharField(max_length=12)),
+                ('count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+                ('top_item_id', models.UUIDField(blank=True, null=True)),
+                ('top_item_name', models.CharField(blank=True, default='', max_length=255)),
+                ('top_score', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'precision', 'cell'), name='map_cluster_cell_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0025_mapcluster'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateditinerary',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='expertupdateditinerary',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ItineraryRevision',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField()),
+                ('patch', models.JSONField(blank=True, null=True)),
+                ('snapshot', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('expert_itinerary', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='ai_itinerary.expertupdateditinerary')),
+                ('generated_itinerary', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='ai_itinerary.generateditinerary')),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('generated_itinerary', 'version'), name='revision_generated_version_uniq'),
+                    models.UniqueConstraint(fields=('expert_itinerary', 'version'), name='revision_expert_version_uniq'),
+                    models.CheckConstraint(condition=models.Q(('generated_itinerary__isnull', True), ('expert_itinerary__isnull', True), _connector='XOR'), name='revision_one_itinerary'),
+                ],
+            },
+        ),
+    ]
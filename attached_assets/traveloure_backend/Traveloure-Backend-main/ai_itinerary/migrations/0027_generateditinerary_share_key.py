@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0026_itinerary_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateditinerary',
+            name='share_key',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,49 @@
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0027_generateditinerary_share_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('place', 'Place'), ('hotel', 'Hotel'), ('service', 'Service')], max_length=20)),
+                ('provider_id', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'provider_id'), name='catalog_entry_provider_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='tripselectedplace',
+            name='catalog',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ai_itinerary.catalogentry'),
+        ),
+        migrations.AddField(
+            model_name='tripselectedhotel',
+            name='catalog',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ai_itinerary.catalogentry'),
+        ),
+        migrations.AddField(
+            model_name='tripselectedplace',
+            name='catalog_inherited',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='tripselectedhotel',
+            name='catalog_inherited',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,124 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations
+
+# Same rules as ai_itinerary.catalog, frozen here
+REF_KEY = 'catalog_ref'
+OMIT_KEY = 'catalog_omit'
+SELECTIONS = {
+    'TripSelectedPlace': ('place', 'place_id', ('description', 'address', 'rating', 'image_url', 'website_url', 'metadata')),
+    'TripSelectedHotel': (
+        'hotel', 'hotel_id', ('description', 'address', 'rating', 'price_range', 'image_url', 'website_url', 'metadata'),
+    ),
+}
+AFFILIATE_FIELDS = {'place_data': 'place', 'hotel_data': 'hotel', 'service_data': 'service'}
+PROVIDER_KEYS = {'place': ('place_id', 'id'), 'hotel': ('hotel_id', 'id'), 'service': ('service_id', 'id')}
+BATCH_SIZE = 1000
+
+
+def _canonical(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+
+
+def _provider_id(kind, item):
+    for key in PROVIDER_KEYS[kind]:
+        value = item.get(key)
+        if value not in (None, ''):
+            return str(value)[:255]
+    return None
+
+
+def fill_catalog(apps, schema_editor):
+    """
+    Move the content trip selections and affiliate lists repeat into catalog entries, created from
+    the first row naming each provider id. Rows keep only what differs from their entry and list
+    the fields they inherit.
+    """
+    CatalogEntry = apps.get_model('ai_itinerary', 'CatalogEntry')
+    AffiliateTrip = apps.get_model('ai_itinerary', 'AffiliateTrip')
+
+    def create_entries(kind, contents):
+        CatalogEntry.objects.bulk_create(
+            [
+                CatalogEntry(kind=kind, provider_id=provider_id, data=data,
+                             content_hash=hashlib.sha256(_canonical(data).encode()).hexdigest())
+                for provider_id, data in contents.items()
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        return {entry.provider_id: entry for entry in CatalogEntry.objects.filter(kind=kind)}
+
+    for model_name, (kind, provider_field, fields) in SELECTIONS.items():
+        model = apps.get_model('ai_itinerary', model_name)
+        contents = {}
+        for row in model.objects.exclude(**{provider_field: ''}).order_by('id').iterator(chunk_size=BATCH_SIZE):
+            data = {'name': row.name}
+            data.update({field: getattr(row, field) for field in fields if getattr(row, field) is not None})
+            contents.setdefault(str(getattr(row, provider_field))[:255], data)
+        entries = create_entries(kind, contents)
+
+        batch = []
+        for row in model.objects.exclude(**{provider_field: ''}).iterator(chunk_size=BATCH_SIZE):
+            entry = entries[str(getattr(row, provider_field))[:255]]
+            row.catalog = entry
+            row.catalog_inherited = []
+            for field in fields:
+                value = getattr(row, field)
+                if value is not None and field in entry.data and _canonical(value) == _canonical(entry.data[field]):
+                    setattr(row, field, None)
+                    row.catalog_inherited.append(field)
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ['catalog', 'catalog_inherited', *fields])
+                batch = []
+        model.objects.bulk_update(batch, ['catalog', 'catalog_inherited', *fields])
+
+    contents = {kind: {} for kind in AFFILIATE_FIELDS.values()}
+    for affiliate in AffiliateTrip.objects.order_by('created_at').iterator(chunk_size=BATCH_SIZE):
+        for field, kind in AFFILIATE_FIELDS.items():
+            items = getattr(affiliate, field)
+            for item in items if isinstance(items, list) else []:
+                provider_id = isinstance(item, dict) and REF_KEY not in item and _provider_id(kind, item)
+                if provider_id:
+                    contents[kind].setdefault(provider_id, item)
+    entries = {kind: create_entries(kind, kind_contents) for kind, kind_contents in contents.items()}
+
+    batch = []
+    for affiliate in AffiliateTrip.objects.iterator(chunk_size=BATCH_SIZE):
+        for field, kind in AFFILIATE_FIELDS.items():
+            items = getattr(affiliate, field)
+            if not isinstance(items, list):
+                continue
+            compacted = []
+            for item in items:
+                provider_id = isinstance(item, dict) and REF_KEY not in item and _provider_id(kind, item)
+                if not provider_id:
+                    compacted.append(item)
+                    continue
+                data = entries[kind][provider_id].data
+                ref = {REF_KEY: provider_id}
+                ref.update({k: v for k, v in item.items() if k not in data or _canonical(v) != _canonical(data[k])})
+                omitted = [k for k in data if k not in item]
+                if omitted:
+                    ref[OMIT_KEY] = omitted
+                compacted.append(ref)
+            setattr(affiliate, field, compacted)
+        batch.append(affiliate)
+        if len(batch) >= BATCH_SIZE:
+            AffiliateTrip.objects.bulk_update(batch, list(AFFILIATE_FIELDS))
+            batch = []
+    AffiliateTrip.objects.bulk_update(batch, list(AFFILIATE_FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0028_catalogentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+from django.db.models import Count
+
+SELECTIONS = {
+    'TripSelectedPlace': 'place_id',
+    'TripSelectedHotel': 'hotel_id',
+    'TripSelectedService': 'service_id',
+    'TripSelectedFlight': 'flight_id',
+}
+
+
+EMPTY = (None, '', {})
+
+
+def _value(row, field):
+    # Historical models have no CatalogValue descriptors: inherited fields are read from the entry
+    if field in (getattr(row, 'catalog_inherited', None) or []) and row.catalog_id:
+        return row.catalog.data.get(field)
+    return getattr(row, field)
+
+
+def dedupe_selections(apps, schema_editor):
+    """
+    Merge the rows selecting the same place, hotel, service or flight twice for one trip into the
+    one with the most values, which takes the values it lacked from the others, so the unique
+    constraints apply. Selection ids are UUIDs and rows carry no creation time, so among equally
+    complete rows the lowest id is kept: an arbitrary choice, but the same on every run.
+    """
+    for model_name, external_id in SELECTIONS.items():
+        model = apps.get_model('ai_itinerary', model_name)
+        fields = [
+            field.name for field in model._meta.concrete_fields
+            if field.name not in ('id', 'trip', external_id, 'catalog', 'catalog_inherited')
+        ]
+        duplicated = (
+            model.objects.values('trip_id', external_id)
+            .annotate(rows=Count('id'))
+            .filter(rows__gt=1)
+        )
+        for group in duplicated.iterator():
+            rows = model.objects.filter(trip_id=group['trip_id'], **{external_id: group[external_id]})
+            if hasattr(model, 'catalog_inherited'):
+                rows = rows.select_related('catalog')
+            rows = sorted(rows, key=lambda row: (-sum(_value(row, f) not in EMPTY for f in fields), str(row.id)))
+            kept, *others = rows
+            for other in others:
+                for field in fields:
+                    if _value(kept, field) in EMPTY and _value(other, field) not in EMPTY:
+                        setattr(kept, field, _value(other, field))
+                        if field in (getattr(kept, 'catalog_inherited', None) or []):
+                            # The copied value is the row's own now, not its entry's
+                            kept.catalog_inherited = [f for f in kept.catalog_inherited if f != field]
+            update_fields = fields + (['catalog_inherited'] if hasattr(model, 'catalog_inherited') else [])
+            kept.save(update_fields=update_fields)
+            model.objects.filter(id__in=[other.id for other in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0029_fill_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_selections, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0030_dedupe_trip_selections'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='tripselectedplace',
+            constraint=models.UniqueConstraint(fields=('trip', 'place_id'), name='trip_selected_place_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tripselectedhotel',
+            constraint=models.UniqueConstraint(fields=('trip', 'hotel_id'), name='trip_selected_hotel_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tripselectedservice',
+            constraint=models.UniqueConstraint(fields=('trip', 'service_id'), name='trip_selected_service_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tripselectedflight',
+            constraint=models.UniqueConstraint(fields=('trip', 'flight_id'), name='trip_selected_flight_uniq'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0031_trip_selection_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='liveevent',
+            name='search',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ai_itinerary.touristplacessearches'),
+        ),
+        migrations.AddField(
+            model_name='liveevent',
+            name='city',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='liveevent',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='liveevent',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='liveevent',
+            name='event_key',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='liveevent',
+            index=models.Index(fields=['city', 'starts_at'], name='live_event_city_start_idx'),
+        ),
+    ]
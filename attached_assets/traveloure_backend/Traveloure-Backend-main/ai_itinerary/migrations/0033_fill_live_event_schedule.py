@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import F
+
+from ai_itinerary.event_dates import event_key, parse_event_dates
+
+BATCH_SIZE = 1000
+
+
+def fill_schedule(apps, schema_editor):
+    """
+    Parse the start and end of every stored event and merge the copies of one event that several
+    searches stored, keeping the copy from the most recently refreshed search.
+    """
+    LiveEvent = apps.get_model('ai_itinerary', 'LiveEvent')
+
+    seen, duplicates, batch = set(), [], []
+    events = LiveEvent.objects.select_related('search').order_by(F('search__refreshed_at').desc(nulls_last=True), 'id')
+    for event in events.iterator(chunk_size=BATCH_SIZE):
+        event.city = event.search.normalized_search if event.search else ''
+        # Dates without a year were written relative to when the search fetched them
+        reference = event.search.refreshed_at.date() if event.search else None
+        event.starts_at, event.ends_at = parse_event_dates(event.start_date, reference)
+        event.event_key = event_key(event.title, event.starts_at, event.start_date, event.city, event.address)
+        if event.event_key in seen:
+            duplicates.append(event.id)
+            continue
+        seen.add(event.event_key)
+        batch.append(event)
+        if len(batch) >= BATCH_SIZE:
+            LiveEvent.objects.bulk_update(batch, ['city', 'starts_at', 'ends_at', 'event_key'])
+            batch = []
+    LiveEvent.objects.bulk_update(batch, ['city', 'starts_at', 'ends_at', 'event_key'])
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        LiveEvent.objects.filter(id__in=duplicates[start:start + BATCH_SIZE]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0032_liveevent_schedule'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_schedule, migrations.RunPython.noop),
+    ]
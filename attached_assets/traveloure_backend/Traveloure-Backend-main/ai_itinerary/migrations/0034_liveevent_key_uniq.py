@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0033_fill_live_event_schedule'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='liveevent',
+            constraint=models.UniqueConstraint(fields=('event_key',), name='live_event_key_uniq'),
+        ),
+    ]
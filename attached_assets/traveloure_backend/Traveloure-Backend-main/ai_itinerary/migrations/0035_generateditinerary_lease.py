@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_itinerary', '0034_liveevent_key_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateditinerary',
+            name='lease',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,116 @@
+import uuid
+from statistics import median
+
+import numpy as np
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.geo import covering_cells, haversine_km, parse_coordinate
+from ai_itinerary.models import TouristPlaceResults, TouristPlacesSearches, Trip
+from ai_itinerary.place_search_cache import normalize_search
+from ai_itinerary.serializers import TouristPlacesResultSerializer
+
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 100.0
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def places_within(latitude, longitude, radius_km, limit=DEFAULT_LIMIT):
+    """
+    Places within radius_km of the point, nearest first, as (place, distance_km) pairs.
+    The geohash index narrows the table to nine cells around the point; exact distances are
+    computed in one vectorized pass over just those candidates.
+    """
+    cells = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        cells |= Q(geohash__startswith=cell)
+    candidates = list(TouristPlaceResults.objects.filter(cells).values_list('id', 'latitude', 'longitude'))
+    if not candidates:
+        return []
+
+    ids, latitudes, longitudes = zip(*candidates)
+    distances = haversine_km(latitude, longitude, np.array(latitudes), np.array(longitudes))
+    inside = np.flatnonzero(distances <= radius_km)
+    nearest = inside[np.argsort(distances[inside], kind='stable')[:limit]]
+
+    places = TouristPlaceResults.objects.in_bulk([ids[i] for i in nearest])
+    return [(places[ids[i]], float(distances[i])) for i in nearest if ids[i] in places]
+
+
+def destination_point(destination):
+    """A trip destination's (lat, lon): the median of the places cached for it, None when there are none."""
+    search = TouristPlacesSearches.objects.filter(normalized_search=normalize_search(destination)).first()
+    if search is None:
+        return None
+    points = list(
+        TouristPlaceResults.objects.filter(search=search, latitude__isnull=False, longitude__isnull=False)
+        .values_list('latitude', 'longitude')
+    )
+    if not points:
+        return None
+    return median(p[0] for p in points), median(p[1] for p in points)
+
+
+class NearbyPlacesAPIView(APIView):
+    """
+    Places around ?lat=&lng= or around the destination of ?trip=<id> (trip owner only),
+    within ?radius_km= (default 5, max 100), nearest first.
+    """
+    permission_classes = [AllowAny]
+
+    def _number(self, name, default, low, high):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValidationError({name: f"Must be a number between {low} and {high}."})
+        if not low <= number <= high:
+            raise ValidationError({name: f"Must be a number between {low} and {high}."})
+        return number
+
+    def get(self, request):
+        radius_km = self._number('radius_km', DEFAULT_RADIUS_KM, 0, MAX_RADIUS_KM)
+        limit = int(self._number('limit', DEFAULT_LIMIT, 1, MAX_LIMIT))
+
+        trip_id = request.query_params.get('trip')
+        if trip_id:
+            if not request.user.is_authenticated:
+                return Response({"message": "Authentication required", "status": False}, status=401)
+            try:
+                trip_id = uuid.UUID(trip_id)
+            except ValueError:
+                raise ValidationError({"trip": "Must be a valid UUID."})
+            trip = get_object_or_404(Trip, id=trip_id, user=request.user)
+            point = destination_point(trip.destination)
+            if point is None:
+                return Response({
+                    "message": "No known location for this trip's destination",
+                    "data": [],
+                    "status": False,
+                }, status=404)
+        else:
+            point = (
+                parse_coordinate(request.query_params.get('lat'), 90),
+                parse_coordinate(request.query_params.get('lng'), 180),
+            )
+            if None in point:
+                raise ValidationError({"detail": "Pass lat and lng, or trip."})
+
+        results = places_within(*point, radius_km, limit)
+        data = TouristPlacesResultSerializer(
+            [place for place, _ in results], many=True, context={'request': request}
+        ).data
+        for item, (_, distance) in zip(data, results):
+            item['distance_km'] = round(distance, 3)
+        return Response({
+            "message": "Fetched Successfully",
+            "data": {"latitude": point[0], "longitude": point[1], "radius_km": radius_km, "results": data},
+            "status": True,
+        }, status=200)
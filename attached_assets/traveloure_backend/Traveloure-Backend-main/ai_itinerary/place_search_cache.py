@@ -0,0 +1,210 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.countries import normalize_search
+from ai_itinerary.generation_cache import normalize_text
+from ai_itinerary.geo import parse_coordinate
+from ai_itinerary import map_clusters
+from ai_itinerary.models import TouristPlaceResults, TouristPlacesSearches, TouristPreferences
+
+logger = logging.getLogger('travelDNA')
+
+STATS_KEYS = {
+    'hits': 'place-search:hits',
+    'stale_hits': 'place-search:stale-hits',
+    'misses': 'place-search:misses',
+    'refreshes': 'place-search:refreshes',
+    'evictions': 'place-search:evictions',
+}
+REFRESH_LOCK_KEY = 'place-search:refreshing:{}'
+# A hit only rewrites last_hit_at when it is older than this, so reads stay reads
+TOUCH_INTERVAL = timedelta(minutes=15)
+REFRESH_LOCK_SECONDS = 300
+
+PLACE_FIELDS = (
+    'country', 'city', 'place', 'description', 'activities', 'festivals',
+    'latitude', 'longitude', 'category', 'best_months', 'image_url',
+)
+# Written by the bulk operations, which skip TouristPlaceResults.save
+STORED_FIELDS = PLACE_FIELDS + ('geohash',)
+
+_executor = ThreadPoolExecutor(max_workers=settings.PLACE_SEARCH_REFRESH_WORKERS, thread_name_prefix='place-search')
+
+
+def _bump(stat, amount=1):
+    try:
+        cache.incr(STATS_KEYS[stat], amount)
+    except ValueError:
+        cache.add(STATS_KEYS[stat], 0, None)
+        cache.incr(STATS_KEYS[stat], amount)
+
+
+def _place_key(item):
+    return tuple(normalize_text(item.get(field) or '') for field in ('country', 'city', 'place'))
+
+
+def store_results(key, search, places):
+    """
+    Create or refresh the search's cache entry with the fetched places. Places are matched to the
+    existing rows by country/city/place and updated in place; rows a user saved a preference for
+    are never dropped.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        entry, _ = TouristPlacesSearches.objects.get_or_create(normalized_search=key, defaults={'search': search})
+        entry = TouristPlacesSearches.objects.select_for_update().get(id=entry.id)
+        existing = {_place_key(vars(row)): row for row in TouristPlaceResults.objects.filter(search=entry)}
+
+        # Bulk writes skip the signals that keep the map clusters current, so the moves are applied here
+        old_points = {row.id: map_clusters.place_point(row, score=0) for row in existing.values()}
+        to_create, to_update, seen = [], [], set()
+        for item in places:
+            place_key = _place_key(item)
+            if place_key in seen:
+                continue
+            seen.add(place_key)
+            values = {field: item.get(field) for field in PLACE_FIELDS}
+            values['activities'] = values['activities'] or []
+            values['festivals'] = values['festivals'] or []
+            values['image_url'] = values['image_url'] or []
+            for field in ('country', 'city', 'place', 'description', 'category', 'best_months'):
+                values[field] = (values[field] or '').strip()
+            values['latitude'] = parse_coordinate(values['latitude'], 90)
+            values['longitude'] = parse_coordinate(values['longitude'], 180)
+            row = existing.get(place_key)
+            if row is None:
+                row = TouristPlaceResults(search=entry, **values)
+                to_create.append(row)
+            else:
+                for field, value in values.items():
+                    setattr(row, field, value)
+                to_update.append(row)
+            row.set_geohash()
+
+        TouristPlaceResults.objects.bulk_create(to_create)
+        TouristPlaceResults.objects.bulk_update(to_update, STORED_FIELDS)
+        moved = [row for row in to_update if old_points[row.id] != map_clusters.place_point(row, score=0)]
+        scores = dict(
+            TouristPreferences.objects.filter(preference_id__in=[row.id for row in moved])
+            .values('preference_id').annotate(n=Count('id')).values_list('preference_id', 'n')
+        )
+        map_clusters.apply(
+            'place',
+            removed=[old_points[row.id] for row in moved],
+            added=[map_clusters.place_point(row, scores.get(row.id, 0)) for row in moved + to_create],
+        )
+        gone = [row.id for place_key, row in existing.items() if place_key not in seen]
+        TouristPlaceResults.objects.filter(id__in=gone, touristpreferences__isnull=True).delete()
+
+        entry.refreshed_at = entry.last_hit_at = now
+        entry.save(update_fields=['refreshed_at', 'last_hit_at'])
+    return entry
+
+
+def _refresh(entry_id, key, search, fetch):
+    try:
+        places = fetch(search)
+        if places:
+            store_results(key, search, places)
+            _bump('refreshes')
+    except Exception as e:
+        logger.error(f"Refreshing place search '{search}' failed: {e}")
+    finally:
+        cache.delete(REFRESH_LOCK_KEY.format(entry_id))
+        connection.close()
+
+
+def schedule_refresh(entry, fetch):
+    # One refresh per entry at a time, across processes
+    if cache.add(REFRESH_LOCK_KEY.format(entry.id), True, REFRESH_LOCK_SECONDS):
+        args = (entry.id, entry.normalized_search, entry.search, fetch)
+        transaction.on_commit(lambda: _executor.submit(_refresh, *args))
+
+
+def _touch(entry, now):
+    if now - entry.last_hit_at > TOUCH_INTERVAL:
+        TouristPlacesSearches.objects.filter(id=entry.id).update(last_hit_at=now)
+        entry.last_hit_at = now
+
+
+def get_places(search, fetch):
+    """
+    Cache entry (TouristPlacesSearches) for the search text, or None when nothing was found.
+    fetch(search) returns a list of dicts keyed by TouristPlaceResults field names and is only
+    called on a miss, on an entry past PLACE_SEARCH_TTL + PLACE_SEARCH_STALE_TTL, or in the
+    background for an entry past PLACE_SEARCH_TTL, which is still served meanwhile.
+    """
+    key = normalize_search(search)
+    if not key:
+        return None
+    now = timezone.now()
+    entry = TouristPlacesSearches.objects.filter(normalized_search=key).first()
+    if entry is not None:
+        age = (now - entry.refreshed_at).total_seconds()
+        if age <= settings.PLACE_SEARCH_TTL:
+            _bump('hits')
+            _touch(entry, now)
+            return entry
+        if age <= settings.PLACE_SEARCH_TTL + settings.PLACE_SEARCH_STALE_TTL:
+            _bump('stale_hits')
+            _touch(entry, now)
+            schedule_refresh(entry, fetch)
+            return entry
+
+    _bump('misses')
+    places = fetch(entry.search if entry else search)
+    if not places:
+        # Expired results beat none when the source has nothing to say
+        return entry
+    return store_results(key, entry.search if entry else search, places)
+
+
+def evict_cold_searches(max_entries=None, idle_days=None):
+    """
+    Delete searches not hit for idle_days, then the least recently hit ones beyond max_entries.
+    Searches with a place some user saved as a preference are kept. Returns the number deleted.
+    """
+    max_entries = settings.PLACE_SEARCH_MAX_ENTRIES if max_entries is None else max_entries
+    idle_days = settings.PLACE_SEARCH_IDLE_DAYS if idle_days is None else idle_days
+    evictable = TouristPlacesSearches.objects.exclude(
+        id__in=TouristPlaceResults.objects.filter(touristpreferences__isnull=False).values('search_id')
+    )
+
+    cutoff = timezone.now() - timedelta(days=idle_days)
+    deleted = evictable.filter(last_hit_at__lt=cutoff).delete()[1].get(TouristPlacesSearches._meta.label, 0)
+
+    overflow = TouristPlacesSearches.objects.count() - max_entries
+    if overflow > 0:
+        ids = list(evictable.order_by('last_hit_at').values_list('id', flat=True)[:overflow])
+        deleted += TouristPlacesSearches.objects.filter(id__in=ids).delete()[1].get(TouristPlacesSearches._meta.label, 0)
+
+    if deleted:
+        _bump('evictions', deleted)
+    return deleted
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+    stats['entries'] = TouristPlacesSearches.objects.count()
+    return stats
+
+
+class PlaceSearchCacheStatsAPIView(APIView):
+    """Hit/miss/refresh/eviction counts of the tourist place search cache."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"message": "Fetched Successfully", "data": get_stats(), "status": True}, status=200)
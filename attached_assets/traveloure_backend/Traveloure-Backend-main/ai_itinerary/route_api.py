@@ -0,0 +1,113 @@
+import uuid
+from datetime import timedelta
+
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.geo import parse_coordinate
+from ai_itinerary.models import TouristPlaceResults, Trip, TripSelectedPlace
+from ai_itinerary.route_optimizer import RoutePoint, optimize_route
+
+MAX_TIME_BUDGET_MS = 1000
+COORDINATE_KEYS = (('latitude', 'longitude'), ('lat', 'lng'), ('lat', 'lon'))
+
+
+def metadata_coordinates(metadata):
+    if not isinstance(metadata, dict):
+        return None
+    for source in (metadata, metadata.get('location'), metadata.get('coordinates')):
+        if not isinstance(source, dict):
+            continue
+        for lat_key, lon_key in COORDINATE_KEYS:
+            latitude = parse_coordinate(source.get(lat_key), 90)
+            longitude = parse_coordinate(source.get(lon_key), 180)
+            if latitude is not None and longitude is not None:
+                return latitude, longitude
+    return None
+
+
+def selected_places():
+    """Prefetch of a trip's selected places along with the catalog entries they inherit from."""
+    return Prefetch('trip_selected_places', queryset=TripSelectedPlace.objects.select_related('catalog'))
+
+
+def trip_points(trip):
+    """
+    RoutePoints for the trip's selected places and the places left without coordinates. Coordinates
+    come from the selection's metadata, or from the cached place result its place_id points to.
+    """
+    selected = list(trip.trip_selected_places.all())
+    coordinates = {place.id: metadata_coordinates(place.metadata) for place in selected}
+
+    lookups = {}
+    for place in selected:
+        if coordinates[place.id] is None:
+            try:
+                lookups[place.id] = uuid.UUID(str(place.place_id))
+            except ValueError:
+                pass
+    known = {
+        str(result_id): (latitude, longitude)
+        for result_id, latitude, longitude in TouristPlaceResults.objects.filter(
+            id__in=lookups.values(), latitude__isnull=False, longitude__isnull=False
+        ).values_list('id', 'latitude', 'longitude')
+    }
+    for place_id, result_id in lookups.items():
+        coordinates[place_id] = known.get(str(result_id))
+
+    points = [RoutePoint(place.id, *coordinates[place.id]) for place in selected if coordinates[place.id]]
+    missing = [place for place in selected if not coordinates[place.id]]
+    return selected, points, missing
+
+
+class TripRouteAPIView(APIView):
+    """
+    The trip's selected places split over its days, each day ordered to keep travel short.
+    ?time_budget_ms= caps the time spent improving the route (default: until no move helps).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trip_id):
+        trip = get_object_or_404(Trip.objects.prefetch_related(selected_places()), id=trip_id, user=request.user)
+        time_budget_ms = request.query_params.get('time_budget_ms')
+        if time_budget_ms is not None:
+            try:
+                time_budget_ms = int(time_budget_ms)
+            except ValueError:
+                time_budget_ms = 0
+            if not 1 <= time_budget_ms <= MAX_TIME_BUDGET_MS:
+                raise ValidationError({"time_budget_ms": f"Must be an integer between 1 and {MAX_TIME_BUDGET_MS}."})
+
+        selected, points, missing = trip_points(trip)
+        by_id = {place.id: place for place in selected}
+        located = {point.id: point for point in points}
+        days = max((trip.end_date - trip.start_date).days + 1, 1)
+        plan = optimize_route(points, days, time_budget_ms)
+
+        def stop(place_id):
+            place, point = by_id[place_id], located[place_id]
+            return {
+                "id": str(place.id),
+                "place_id": place.place_id,
+                "name": place.name,
+                "latitude": point.latitude,
+                "longitude": point.longitude,
+            }
+
+        data = {
+            "days": [
+                {
+                    "day": n + 1,
+                    "date": (trip.start_date + timedelta(days=n)).isoformat(),
+                    "distance_km": day['distance_km'],
+                    "stops": [stop(place_id) for place_id in day['stops']],
+                }
+                for n, day in enumerate(plan)
+            ],
+            "unrouted": [{"id": str(place.id), "place_id": place.place_id, "name": place.name} for place in missing],
+        }
+        return Response({"message": "Fetched Successfully", "data": data, "status": True}, status=200)
@@ -0,0 +1,148 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from ai_itinerary.geo import haversine_matrix
+
+RoutePoint = namedtuple('RoutePoint', 'id latitude longitude')
+
+# Distance matrices of recently routed place sets, kept in process: rebuilding one costs less than
+# fetching it from a shared cache, but the same trip is usually re-routed several times in a row
+MATRIX_CACHE_SIZE = 128
+_matrices = OrderedDict()
+_matrices_lock = threading.Lock()
+
+
+def place_set_key(points):
+    digest = hashlib.sha256()
+    for point in points:
+        digest.update(f"{point.id}|{point.latitude:.6f}|{point.longitude:.6f}\n".encode())
+    return digest.hexdigest()
+
+
+def distance_matrix(points):
+    """
+    Pairwise distances in km between the points, in the order given. Matrices are cached by the
+    set of points, so the same places in another order reuse the one computed before.
+    """
+    order = sorted(range(len(points)), key=lambda i: str(points[i].id))
+    canonical = [points[i] for i in order]
+    key = place_set_key(canonical)
+    with _matrices_lock:
+        matrix = _matrices.get(key)
+        if matrix is not None:
+            _matrices.move_to_end(key)
+    if matrix is None:
+        matrix = haversine_matrix(
+            np.array([p.latitude for p in canonical], dtype=float),
+            np.array([p.longitude for p in canonical], dtype=float),
+        )
+        matrix.flags.writeable = False
+        with _matrices_lock:
+            _matrices[key] = matrix
+            while len(_matrices) > MATRIX_CACHE_SIZE:
+                _matrices.popitem(last=False)
+    position = np.empty(len(points), dtype=int)
+    position[order] = np.arange(len(points))
+    return matrix[np.ix_(position, position)]
+
+
+def nearest_neighbour(matrix, start):
+    n = len(matrix)
+    route = [start]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    for _ in range(n - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        nxt = int(np.argmin(distances))
+        route.append(nxt)
+        visited[nxt] = True
+    return route
+
+
+def two_opt(route, matrix, deadline=None):
+    """
+    Improve an open path by reversing segments while that shortens it, best move first. A zero
+    distance dummy stop closes the path into a cycle, so its ends are free to move too.
+    """
+    if len(route) < 4:
+        return list(route)
+    n = len(matrix)
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = matrix
+    cycle = np.array([n, *route])
+    m = len(cycle)
+    upper = np.triu(np.ones((m, m), dtype=bool), k=1)
+    upper[0, :] = False
+
+    while deadline is None or time.perf_counter() < deadline:
+        prev = np.roll(cycle, 1)
+        nxt = np.roll(cycle, -1)
+        removed = padded[prev, cycle]
+        delta = (
+            padded[prev[:, None], cycle[None, :]]
+            + padded[cycle[:, None], nxt[None, :]]
+            - removed[:, None]
+            - padded[cycle, nxt][None, :]
+        )
+        delta[~upper] = 0.0
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] > -1e-9:
+            break
+        cycle[i:j + 1] = cycle[i:j + 1][::-1].copy()
+
+    start = int(np.flatnonzero(cycle == n)[0])
+    return [int(stop) for stop in np.roll(cycle, -start)[1:]]
+
+
+def path_length(route, matrix):
+    return float(matrix[route[:-1], route[1:]].sum()) if len(route) > 1 else 0.0
+
+
+def _cut_points(tour, matrix, parts):
+    """Where to split the tour into parts of near-equal size, preferring its longest legs."""
+    n = len(tour)
+    legs = matrix[tour[:-1], tour[1:]]
+    slack = max(1, n // (4 * parts))
+    cuts = [0]
+    for k in range(1, parts):
+        ideal = round(k * n / parts)
+        low = max(cuts[-1] + 1, ideal - slack)
+        high = min(n - (parts - k), ideal + slack)
+        # Cutting before stop c drops the leg between stops c - 1 and c
+        cuts.append(low + int(np.argmax(legs[low - 1:high])) if high > low else low)
+    return cuts + [n]
+
+
+def optimize_route(points, days=1, time_budget_ms=None):
+    """
+    Order the points into days of travel: one tour over all of them (nearest neighbour, then 2-opt),
+    cut into `days` stretches of similar size at its longest legs, and each stretch re-optimized
+    on its own. With time_budget_ms, 2-opt stops improving when the budget runs out.
+    Returns a list of {'stops': [point ids], 'distance_km': float}, one per day.
+    """
+    deadline = None if time_budget_ms is None else time.perf_counter() + time_budget_ms / 1000
+    if not points:
+        return [{'stops': [], 'distance_km': 0.0} for _ in range(days)]
+
+    matrix = distance_matrix(points)
+    # Starting from the most outlying point leaves the tour fewer long legs back across the map
+    tour = nearest_neighbour(matrix, int(np.argmax(matrix.sum(axis=1))))
+    tour = np.array(two_opt(tour, matrix, deadline))
+
+    parts = min(days, len(points))
+    cuts = _cut_points(tour, matrix, parts)
+    plan = []
+    for start, end in zip(cuts, cuts[1:]):
+        stops = tour[start:end]
+        sub = matrix[np.ix_(stops, stops)]
+        order = two_opt(range(len(stops)), sub, deadline)
+        plan.append({
+            'stops': [points[stops[i]].id for i in order],
+            'distance_km': round(path_length(np.array(order), sub), 3),
+        })
+    plan.extend({'stops': [], 'distance_km': 0.0} for _ in range(days - parts))
+    return plan
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.http import parse_etags
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.models import GeneratedItinerary
+from ai_itinerary.share_snapshots import get_snapshot, read_token, share, unshare
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class ShareItineraryAPIView(APIView):
+    """POST shares the trip owner's itinerary and returns its public link; DELETE revokes every link."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        itinerary = get_object_or_404(GeneratedItinerary, id=id, trip__user=request.user)
+        token = share(itinerary)
+        return Response({
+            "message": "Itinerary shared",
+            "data": {"token": token, "url": request.build_absolute_uri(reverse('shared-itinerary', args=[token]))},
+            "status": True,
+        }, status=200)
+
+    def delete(self, request, id):
+        itinerary = get_object_or_404(GeneratedItinerary, id=id, trip__user=request.user)
+        unshare(itinerary)
+        return Response({"message": "Itinerary no longer shared", "status": True}, status=200)
+
+
+class SharedItineraryAPIView(APIView):
+    """
+    A shared itinerary, served from its pre-rendered snapshot. The token is checked by signature
+    alone and the snapshot comes from the cache or storage, so a warm link never reaches the database.
+    Adding ?v=<etag> marks the response immutable for a year.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, token):
+        try:
+            itinerary_id, share_key = read_token(token)
+        except signing.BadSignature:
+            return Response({"message": "Invalid share link", "status": False}, status=404)
+        snapshot = get_snapshot(itinerary_id, share_key)
+        if snapshot is None:
+            return Response({"message": "This itinerary is no longer shared", "status": False}, status=404)
+        etag, body = snapshot
+        version = etag.strip('"')
+
+        if request.query_params.get('v') == version:
+            cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            cache_control = f"public, max-age={settings.ITINERARY_SHARE_MAX_AGE}"
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        response['Content-Location'] = f"{reverse('shared-itinerary', args=[token])}?v={version}"
+        return response
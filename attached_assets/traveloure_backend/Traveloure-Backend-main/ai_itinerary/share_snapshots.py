@@ -0,0 +1,226 @@
+import hashlib
+import json
+import logging
+import secrets
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from ai_itinerary.models import GeneratedItinerary, TripSelectedHotel, TripSelectedPlace
+
+logger = logging.getLogger('travelDNA')
+
+TOKEN_SALT = 'ai_itinerary.share'
+CACHE_KEY = 'itinerary-share:{}:{}:{}'
+# The share's current revision, so warm links skip the database; kept at most ITINERARY_SHARE_MAX_AGE
+REVISION_KEY = 'itinerary-share:{}:{}:revision'
+# User fields that appear in a shared itinerary
+USER_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+_executor = ThreadPoolExecutor(max_workers=settings.ITINERARY_SHARE_WORKERS, thread_name_prefix='itinerary-share')
+
+
+def make_token(itinerary):
+    return signing.dumps({'i': str(itinerary.id), 'k': itinerary.share_key}, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """(itinerary id, share key) from a share token; raises signing.BadSignature for forged ones."""
+    payload = signing.loads(token, salt=TOKEN_SALT)
+    if not isinstance(payload, dict) or not payload.get('i') or not payload.get('k'):
+        raise signing.BadSignature("Malformed share token")
+    return payload['i'], payload['k']
+
+
+def snapshot_dir(itinerary_id, share_key):
+    return f"itinerary-shares/{itinerary_id}/{share_key}"
+
+
+def snapshot_name(itinerary_id, share_key, revision):
+    # One file per revision: a write never replaces a file another request may be reading
+    return f"{snapshot_dir(itinerary_id, share_key)}/{revision or '0'}.json"
+
+
+def render(itinerary):
+    """The response body a share link serves, and its strong ETag."""
+    from ai_itinerary.serializers import ShareGeneratedItinerarySerializer
+
+    data = ShareGeneratedItinerarySerializer(itinerary).data
+    body = json.dumps(
+        {"message": "Fetched Successfully", "data": data, "status": True},
+        cls=DjangoJSONEncoder, separators=(',', ':'),
+    ).encode()
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _load(itinerary_id):
+    return (
+        GeneratedItinerary.objects.select_related('trip__user')
+        .prefetch_related(
+            Prefetch('trip__trip_selected_places', queryset=TripSelectedPlace.objects.select_related('catalog')),
+            Prefetch('trip__trip_selected_hotels', queryset=TripSelectedHotel.objects.select_related('catalog')),
+            'trip__trip_selected_services',
+        )
+        .filter(id=itinerary_id)
+        .exclude(share_key='')
+        .first()
+    )
+
+
+def _delete_snapshots(itinerary_id, share_key, keep=None):
+    directory = snapshot_dir(itinerary_id, share_key)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        if f"{directory}/{name}" != keep:
+            default_storage.delete(f"{directory}/{name}")
+
+
+def publish(itinerary_id):
+    """
+    Render the shared itinerary's snapshot for its current revision into storage and the cache,
+    and return it as (etag, body). None when it is not shared.
+    """
+    itinerary = _load(itinerary_id)
+    if itinerary is None:
+        return None
+    body, etag = render(itinerary)
+    revision = itinerary.share_revision
+    name = snapshot_name(itinerary.id, itinerary.share_key, revision)
+    # Rendered already by a concurrent publish of the same revision
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(body))
+    cache.set(CACHE_KEY.format(itinerary.id, itinerary.share_key, revision), (etag, body), settings.ITINERARY_SHARE_CACHE_TTL)
+    # Older revisions are dropped once this one is current; a newer one removed by mistake is rendered again on read
+    if GeneratedItinerary.objects.filter(id=itinerary.id, share_key=itinerary.share_key, share_revision=revision).exists():
+        _delete_snapshots(itinerary.id, itinerary.share_key, keep=name)
+    return etag, body
+
+
+def _current_revision(itinerary_id, share_key):
+    """The share's revision, None when the itinerary is no longer shared under share_key."""
+    key = REVISION_KEY.format(itinerary_id, share_key)
+    revision = cache.get(key)
+    if revision is None:
+        revision = (
+            GeneratedItinerary.objects.filter(id=itinerary_id, share_key=share_key)
+            .values_list('share_revision', flat=True).first()
+        )
+        if revision is None:
+            return None
+        cache.set(key, revision, settings.ITINERARY_SHARE_MAX_AGE)
+    return revision
+
+
+def get_snapshot(itinerary_id, share_key):
+    """
+    (etag, body) for a verified token: the snapshot of the share's current revision from the cache,
+    else from storage, else rendered now (a lost or unfinished background render is never served
+    stale). None for revoked links.
+    """
+    revision = _current_revision(itinerary_id, share_key)
+    if revision is None:
+        return None
+    key = CACHE_KEY.format(itinerary_id, share_key, revision)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+    name = snapshot_name(itinerary_id, share_key, revision)
+    if default_storage.exists(name):
+        with default_storage.open(name, 'rb') as f:
+            body = f.read()
+        snapshot = (f'"{hashlib.sha256(body).hexdigest()[:32]}"', body)
+        cache.set(key, snapshot, settings.ITINERARY_SHARE_CACHE_TTL)
+        return snapshot
+    return publish(itinerary_id)
+
+
+def share(itinerary):
+    """Share the itinerary (keeping the current key when it already is) and return its token."""
+    with transaction.atomic():
+        itinerary = GeneratedItinerary.objects.select_for_update().get(id=itinerary.id)
+        if not itinerary.share_key:
+            itinerary.share_key = secrets.token_hex(8)
+            GeneratedItinerary.objects.filter(id=itinerary.id).update(
+                share_key=itinerary.share_key, share_revision=uuid.uuid4().hex
+            )
+    publish(itinerary.id)
+    return make_token(itinerary)
+
+
+def unshare(itinerary):
+    """Stop sharing; every token issued so far stops resolving."""
+    with transaction.atomic():
+        share_key = (
+            GeneratedItinerary.objects.select_for_update().filter(id=itinerary.id)
+            .values_list('share_key', flat=True).first()
+        )
+        GeneratedItinerary.objects.filter(id=itinerary.id).update(share_key='')
+    if share_key:
+        cache.delete(REVISION_KEY.format(itinerary.id, share_key))
+        _delete_snapshots(itinerary.id, share_key)
+
+
+def _publish(itinerary_id):
+    try:
+        publish(itinerary_id)
+    except Exception as e:
+        logger.error(f"Rendering the share snapshot of itinerary {itinerary_id} failed: {e}")
+    finally:
+        connection.close()
+
+
+def schedule_publish(**lookup):
+    """
+    Give the shared itineraries matching lookup a new revision, in the current transaction, and
+    re-render them once it commits. Readers only serve the snapshot of the current revision.
+    """
+    shared = GeneratedItinerary.objects.filter(**lookup).exclude(share_key='')
+    shares = list(shared.values_list('id', 'share_key'))
+    if not shares:
+        return
+    GeneratedItinerary.objects.filter(id__in=[itinerary_id for itinerary_id, _ in shares]).update(
+        share_revision=uuid.uuid4().hex
+    )
+
+    def submit():
+        for itinerary_id, share_key in shares:
+            cache.delete(REVISION_KEY.format(itinerary_id, share_key))
+            _executor.submit(_publish, itinerary_id)
+
+    transaction.on_commit(submit)
+
+
+def itinerary_changed(sender, instance, **kwargs):
+    if instance.share_key:
+        schedule_publish(id=instance.id)
+
+
+def itinerary_deleted(sender, instance, **kwargs):
+    if instance.share_key:
+        cache.delete(REVISION_KEY.format(instance.id, instance.share_key))
+        _delete_snapshots(instance.id, instance.share_key)
+
+
+def trip_changed(sender, instance, **kwargs):
+    schedule_publish(trip_id=instance.id)
+
+
+def selection_changed(sender, instance, **kwargs):
+    schedule_publish(trip_id=instance.trip_id)
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; those never change a snapshot
+    if update_fields is None or USER_FIELDS & set(update_fields):
+        schedule_publish(trip__user_id=instance.id)
@@ -0,0 +1,275 @@
+import shutil
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from ai_itinerary import generation, image_proxy
+from ai_itinerary.countries import normalize_search
+from ai_itinerary.day_planner import DayPacker, PlanDay, PlanItem, build_plan
+from ai_itinerary.event_dates import event_key, parse_event_dates
+from ai_itinerary.generation_cache import normalize_text, request_key
+from ai_itinerary.management.commands.fake_llm_server import make_server
+from ai_itinerary.models import GeneratedItinerary, Trip
+
+
+def _png():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), (200, 40, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class _StubOrigin(BaseHTTPRequestHandler):
+    """Serves server.body for every path, recording the path and Host header of each request."""
+
+    def do_GET(self):
+        self.server.seen.append((self.path, self.headers.get('Host')))
+        self.server.release.wait(5)
+        self.send_response(200)
+        self.send_header('Content-Type', self.server.content_type)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(IMAGE_PROXY_ALLOW_PRIVATE_HOSTS=True)
+class ImageProxyFetchTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubOrigin)
+        self.server.seen = []
+        self.server.body = _png()
+        self.server.content_type = 'image/png'
+        self.server.release = threading.Event()
+        self.server.release.set()
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        patcher = mock.patch.object(image_proxy, '_cache', image_proxy.DiskLRUCache(cache_dir, 10 * 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # images.example resolves to the stub first, and to another address on any later lookup
+        self.lookups = []
+        real_getaddrinfo = socket.getaddrinfo
+
+        def getaddrinfo(host, *args, **kwargs):
+            if host != 'images.example':
+                return real_getaddrinfo(host, *args, **kwargs)
+            self.lookups.append(host)
+            address = '127.0.0.1' if len(self.lookups) == 1 else '10.255.255.1'
+            return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, 0))]
+
+        patcher = mock.patch('socket.getaddrinfo', side_effect=getaddrinfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = f"http://images.example:{self.port}/photo.png"
+
+    def test_fetch_connects_to_the_vetted_address(self):
+        self.assertEqual(image_proxy._fetch(self.url), self.server.body)
+        self.assertEqual(self.lookups, ['images.example'])
+        self.assertEqual(self.server.seen, [('/photo.png', f"images.example:{self.port}")])
+
+    @override_settings(IMAGE_PROXY_ALLOW_PRIVATE_HOSTS=False)
+    def test_fetch_refuses_private_addresses(self):
+        with self.assertRaises(image_proxy.ImageProxyError):
+            image_proxy._fetch(self.url)
+        self.assertEqual(self.server.seen, [])
+
+    def test_fetch_refuses_non_images(self):
+        self.server.content_type = 'text/html'
+        with self.assertRaises(image_proxy.ImageProxyError):
+            image_proxy._fetch(self.url)
+
+    def test_concurrent_misses_fetch_the_origin_once(self):
+        self.server.release.clear()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(image_proxy.get_resized_image, self.url, 160, fmt) for fmt in ('jpeg', 'webp') * 2]
+            self.server.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(self.server.seen), 1)
+        for path, _ in results:
+            with open(path, 'rb') as f:
+                self.assertEqual(Image.open(f).width, 64)
+
+
+class NormalizeTextTests(SimpleTestCase):
+    def test_latin_accents_and_punctuation_are_folded(self):
+        self.assertEqual(normalize_text('  São Paulo, Brazil '), 'sao paulo brazil')
+        self.assertEqual(normalize_text('Hà Nội'), 'ha noi')
+        self.assertEqual(normalize_text('STRASSE'), normalize_text('Straße'))
+
+    def test_non_latin_destinations_keep_their_letters(self):
+        names = ['東京', 'Москва', 'القاهرة', 'Αθήνα', '서울', 'दिल्ली']
+        normalized = [normalize_text(name) for name in names]
+        self.assertEqual(normalized[:2], ['東京', 'москва'])
+        self.assertEqual(normalize_text('Αθήνα'), 'αθηνα')
+        self.assertNotIn('', normalized)
+        self.assertEqual(len(set(normalized)), len(names))
+
+    def test_marks_that_tell_words_apart_are_kept(self):
+        self.assertNotEqual(normalize_text('ガイド'), normalize_text('カイド'))
+        self.assertEqual(normalize_text('दिल्ली'), 'दिल्ली')
+
+    def test_non_latin_destinations_get_their_own_cache_keys(self):
+        keys = {request_key('itinerary', {'destination': normalize_text(name)}) for name in ('東京', 'Москва', 'القاهرة')}
+        self.assertEqual(len(keys), 3)
+
+
+class NormalizeSearchTests(SimpleTestCase):
+    def test_trailing_country_is_dropped(self):
+        self.assertEqual(normalize_search('Paris, France'), 'paris')
+        self.assertEqual(normalize_search(' paris '), 'paris')
+
+    def test_states_are_kept(self):
+        self.assertEqual(normalize_search('Springfield, Illinois'), 'springfield illinois')
+        self.assertEqual(normalize_search('Atlanta, Georgia'), 'atlanta georgia')
+
+
+def _item(name, duration, opens=None, closes=None, latitude=None, longitude=None):
+    windows = None if opens is None else {day: [(opens, closes)] for day in range(7)}
+    return PlanItem('place', name, name, '', '', duration, windows, None, latitude, longitude)
+
+
+class DayPackerTests(SimpleTestCase):
+    def setUp(self):
+        # Between A and B the known travel time (about 160 minutes) exceeds the two unknown legs
+        # through U (30 each), so taking U out of the day makes B miss its window
+        self.items = [
+            _item('A', 60, 9 * 60, 10 * 60, 0.0, 0.0),
+            _item('U', 90),
+            _item('B', 90, 9 * 60, 14 * 60, 0.0, 0.45),
+        ]
+        self.days = [PlanDay(date(2026, 5, 4), 9 * 60, 21 * 60, 12 * 60)]
+
+    def test_removal_that_breaks_the_day_is_skipped(self):
+        packer = DayPacker(self.items, self.days)
+        for position in range(3):
+            packer.insert(position, 0, position)
+        self.assertIsNone(packer.remove(0, 1))
+        self.assertEqual(packer.sequences, [[0, 1, 2]])
+
+        packer.improve()
+        self.assertEqual(packer.sequences, [[0, 1, 2]])
+        self.assertEqual(packer.unscheduled, [])
+
+    def test_plan_keeps_every_item(self):
+        plan = build_plan(self.items, self.days)
+        self.assertEqual([a['name'] for a in plan['days'][0]['activities']], ['A', 'U', 'B'])
+        self.assertEqual(plan['unscheduled'], [])
+
+
+class EventKeyTests(SimpleTestCase):
+    def test_same_title_and_day_in_two_cities_are_two_events(self):
+        starts_at, _ = parse_event_dates('Sat, Jun 14', date(2026, 5, 1))
+        self.assertNotEqual(
+            event_key('Gala Night', starts_at, 'Sat, Jun 14', normalize_text('Tokyo'), None),
+            event_key('Gala Night', starts_at, 'Sat, Jun 14', normalize_text('Москва'), None),
+        )
+
+    def test_key_ignores_case_and_punctuation(self):
+        starts_at, _ = parse_event_dates('Jun 14, 2026')
+        self.assertEqual(
+            event_key('Gala Night!', starts_at, 'Jun 14, 2026', 'tokyo', '1-1 Marunouchi'),
+            event_key('gala night', starts_at, 'June 14 2026', 'tokyo', '1 1 marunouchi'),
+        )
+
+
+class EventDatesTests(SimpleTestCase):
+    def test_day_range_runs_into_the_next_month(self):
+        starts_at, ends_at = parse_event_dates('Aug 31 – 2, 2026')
+        self.assertEqual(starts_at.date(), date(2026, 8, 31))
+        self.assertEqual(ends_at.date(), date(2026, 9, 3))
+
+    def test_day_range_runs_into_the_next_year(self):
+        starts_at, ends_at = parse_event_dates('Dec 30 – 2', date(2026, 12, 1))
+        self.assertEqual(starts_at.date(), date(2026, 12, 30))
+        self.assertEqual(ends_at.date(), date(2027, 1, 3))
+
+
+@override_settings(ITINERARY_GENERATION_CONCURRENCY=4, ITINERARY_GENERATION_PER_USER=1, OPENAI_API_KEY='')
+class GenerationQueueTests(TestCase):
+    def setUp(self):
+        self.server = make_server(0, delay=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base_url = override_settings(OPENAI_BASE_URL=f"http://127.0.0.1:{self.server.server_address[1]}/v1")
+        base_url.enable()
+        self.addCleanup(base_url.disable)
+        patcher = mock.patch.object(generation, '_client', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches['generations'].clear()
+
+        User = get_user_model()
+        self.user = User.objects.create_user(email='traveler@example.com', username='traveler')
+        self.other_user = User.objects.create_user(email='other@example.com', username='other')
+
+    def trip(self, user=None):
+        return Trip.objects.create(
+            user=user or self.user, destination='Lisbon', start_date=date(2026, 6, 1), end_date=date(2026, 6, 2),
+        )
+
+    def test_enqueue_returns_pending(self):
+        self.assertEqual(generation.enqueue_generation(self.trip()).status, generation.PENDING)
+
+    def test_duplicate_requests_collapse_onto_one_job(self):
+        trip = self.trip()
+        first = generation.enqueue_generation(trip)
+        job_id, _ = generation.claim_next_job()
+        second = generation.enqueue_generation(trip)
+        self.assertEqual((first.id, second.id), (job_id, job_id))
+        self.assertEqual(second.status, generation.RUNNING)
+        self.assertEqual(GeneratedItinerary.objects.filter(trip=trip).count(), 1)
+
+    def test_per_user_limit_is_enforced(self):
+        generation.enqueue_generation(self.trip())
+        generation.enqueue_generation(self.trip())
+        other_job = generation.enqueue_generation(self.trip(self.other_user))
+
+        first, _ = generation.claim_next_job()
+        second, _ = generation.claim_next_job()
+        self.assertNotEqual(first, other_job.id)
+        self.assertEqual(second, other_job.id)
+        self.assertIsNone(generation.claim_next_job())
+
+    def test_claimed_job_completes_from_the_fake_server(self):
+        generation.enqueue_generation(self.trip())
+        job_id, lease = generation.claim_next_job()
+        self.assertTrue(generation.run_job(job_id, lease))
+
+        itinerary = GeneratedItinerary.objects.get(id=job_id)
+        self.assertEqual(itinerary.status, generation.COMPLETED)
+        self.assertEqual([day['date'] for day in itinerary.itinerary_data['days']], ['2026-06-01', '2026-06-02'])
+
+    def test_stale_lease_is_requeued(self):
+        generation.enqueue_generation(self.trip())
+        job_id, lease = generation.claim_next_job()
+        # The worker stopped heartbeating
+        GeneratedItinerary.objects.filter(id=job_id).update(updated_at=timezone.now() - timedelta(days=1))
+
+        generation._requeue_stale()
+        itinerary = GeneratedItinerary.objects.get(id=job_id)
+        self.assertEqual((itinerary.status, itinerary.lease), (generation.PENDING, ''))
+        # The old worker's lease no longer runs it; the next claim does
+        self.assertFalse(generation.run_job(job_id, lease))
+        self.assertEqual(generation.claim_next_job()[0], job_id)
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models import Prefetch
+
+from ai_itinerary import catalog
+from ai_itinerary.models import (
+    CatalogBacked, TripSelectedFlight, TripSelectedHotel, TripSelectedPlace, TripSelectedService,
+)
+from ai_itinerary.share_snapshots import schedule_publish
+
+# Request key -> (model, the field naming the selected thing, the trip's related name)
+SELECTIONS = {
+    'places': (TripSelectedPlace, 'place_id', 'trip_selected_places'),
+    'hotels': (TripSelectedHotel, 'hotel_id', 'trip_selected_hotels'),
+    'services': (TripSelectedService, 'service_id', 'trip_selected_services'),
+    'flights': (TripSelectedFlight, 'flight_id', 'trip_selected_flights'),
+}
+
+
+def upsert_selections(trip, selections):
+    """
+    Add {'places': [...], 'hotels': [...], ...} to the trip in one transaction, one statement per
+    kind. An item naming something the trip already selected replaces that row's values (its id
+    stays); items must not repeat an external id within a kind.
+    """
+    with transaction.atomic():
+        for key, items in selections.items():
+            if not items:
+                continue
+            model, external_id, _ = SELECTIONS[key]
+            rows = [model(trip=trip, **item) for item in items]
+            # bulk_create skips save(), so the catalog compaction is done here
+            if issubclass(model, CatalogBacked):
+                catalog.compact_selections(rows)
+            with CatalogBacked.stored_values(rows):
+                model.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['trip', external_id],
+                    update_fields=[
+                        field.name for field in model._meta.concrete_fields
+                        if field.name not in ('id', 'trip', external_id)
+                    ],
+                )
+        # Nor post_save: shared snapshots of the trip's itinerary are re-rendered explicitly
+        schedule_publish(trip_id=trip.id)
+
+
+def with_selections(trips):
+    """The trips with all their selections (and the catalog entries they inherit from) prefetched."""
+    prefetches = []
+    for model, _, related_name in SELECTIONS.values():
+        queryset = model.objects.select_related('catalog') if issubclass(model, CatalogBacked) else model.objects.all()
+        prefetches.append(Prefetch(related_name, queryset=queryset))
+    return trips.prefetch_related(*prefetches)
@@ -0,0 +1,33 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ai_itinerary.models import Trip
+from ai_itinerary.serializers import TripSelectionsSerializer, TripSelectionsUpsertSerializer
+from ai_itinerary.trip_selections import upsert_selections, with_selections
+
+
+class TripSelectionsAPIView(APIView):
+    """
+    GET lists everything selected for the trip. POST adds arrays of places, hotels, services and
+    flights in one go: {"places": [...], "hotels": [...], ...}, each item a full selection without
+    the trip. Items naming something already selected (same place_id, hotel_id, service_id or
+    flight_id) replace it. Both return the trip's whole selection.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _selections(self, request, trip_id):
+        trip = get_object_or_404(with_selections(Trip.objects.all()), id=trip_id, user=request.user)
+        return TripSelectionsSerializer(trip, context={'request': request}).data
+
+    def get(self, request, trip_id):
+        return Response({"message": "Fetched Successfully", "data": self._selections(request, trip_id), "status": True}, status=200)
+
+    def post(self, request, trip_id):
+        trip = get_object_or_404(Trip, id=trip_id, user=request.user)
+        serializer = TripSelectionsUpsertSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"message": "Validation Error", "status": False, "errors": serializer.errors}, status=400)
+        upsert_selections(trip, serializer.validated_data)
+        return Response({"message": "Selections saved", "data": self._selections(request, trip_id), "status": True}, status=200)
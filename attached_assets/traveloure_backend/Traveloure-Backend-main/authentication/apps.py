@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from .category_tree import bump_tree_version
+        from .models import Category, SubCategory
+
+        for model in (Category, SubCategory):
+            post_save.connect(bump_tree_version, sender=model, dispatch_uid=f'category-tree-{model.__name__}-save')
+            post_delete.connect(bump_tree_version, sender=model, dispatch_uid=f'category-tree-{model.__name__}-delete')
@@ -0,0 +1,200 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from .category_tree import bump_tree_version
+from .models import Category, SubCategory
+
+CHUNK_SIZE = 1000
+# Stop collecting row errors past this many, the counts stay exact
+MAX_REPORTED_ERRORS = 1000
+
+# Export column -> queryset lookup. The columns line up with the import rows, so an export can be re-imported.
+CATEGORY_EXPORT_COLUMNS = {'id': 'id', 'name': 'name', 'is_default': 'is_default', 'created_at': 'created_at'}
+SUBCATEGORY_EXPORT_COLUMNS = {
+    'id': 'id', 'category': 'category_id', 'name': 'name', 'price': 'price',
+    'description': 'description', 'is_default': 'is_default', 'created_at': 'created_at',
+}
+
+
+class CategoryImportRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+
+
+class SubCategoryImportRowSerializer(serializers.Serializer):
+    # Either the category id or its name, resolved against the importer's visible categories
+    category = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict or parse error) from an NDJSON or CSV body without reading it whole."""
+    if stream is None:
+        return
+    text = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # CSV has no null, an empty cell means the column was left out
+            yield reader.line_num, {key: value for key, value in row.items() if value != ''}
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ValueError("Each line must be a JSON object")
+            continue
+        yield line_number, row
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        yield chunk
+
+
+class ImportResult:
+    def __init__(self):
+        self.upserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'upserted': self.upserted, 'failed': self.failed, 'errors': self.errors}
+
+
+def _valid_rows(chunk, serializer_class, result):
+    for line, row in chunk:
+        if isinstance(row, Exception):
+            result.error(line, [str(row)])
+            continue
+        serializer = serializer_class(data=row)
+        if serializer.is_valid():
+            yield line, serializer.validated_data
+        else:
+            result.error(line, serializer.errors)
+
+
+def _owner(user):
+    """Superusers import the platform defaults, experts their own rows, as in perform_create."""
+    if user.is_superuser:
+        return None, True
+    return user, False
+
+
+def import_categories(user, rows):
+    """Upsert the rows in one transaction: a failing chunk rolls back the whole import."""
+    owner, is_default = _owner(user)
+    result = ImportResult()
+    with transaction.atomic():
+        for chunk in _chunks(rows):
+            # Later rows win when a chunk repeats a name, Postgres refuses to upsert one key twice
+            objs = {}
+            for _, data in _valid_rows(chunk, CategoryImportRowSerializer, result):
+                objs[data['name']] = Category(user=owner, name=data['name'], is_default=is_default)
+            Category.objects.bulk_create(
+                objs.values(),
+                update_conflicts=True,
+                unique_fields=['user', 'name'],
+                update_fields=['is_default'],
+            )
+            result.upserted += len(objs)
+        transaction.on_commit(bump_tree_version)
+    return result
+
+
+def _resolve_categories(user, refs):
+    """
+    Map each category id or name in refs to a category the user may add subcategories to: the
+    defaults for superusers, whose subcategories are defaults too, else the user's own and the defaults.
+    """
+    if user.is_superuser:
+        visible = Category.objects.filter(is_default=True)
+    else:
+        visible = Category.objects.filter(Q(user=user) | Q(is_default=True))
+    ids = []
+    for ref in refs:
+        try:
+            ids.append(serializers.UUIDField().to_internal_value(ref))
+        except serializers.ValidationError:
+            pass
+    resolved = {}
+    # Own categories are listed first so they shadow a default of the same name
+    for category in visible.filter(Q(id__in=ids) | Q(name__in=refs)).order_by('is_default'):
+        resolved.setdefault(str(category.id), category)
+        resolved.setdefault(category.name, category)
+    return resolved
+
+
+def import_subcategories(user, rows):
+    """Upsert the rows in one transaction: a failing chunk rolls back the whole import."""
+    owner, is_default = _owner(user)
+    result = ImportResult()
+    with transaction.atomic():
+        for chunk in _chunks(rows):
+            valid = list(_valid_rows(chunk, SubCategoryImportRowSerializer, result))
+            categories = _resolve_categories(user, {data['category'] for _, data in valid})
+
+            objs = {}
+            for line, data in valid:
+                category = categories.get(data['category'])
+                if category is None:
+                    result.error(line, {'category': [f"Unknown category '{data['category']}'."]})
+                    continue
+                objs[(category.id, data['name'])] = SubCategory(
+                    user=owner,
+                    category=category,
+                    name=data['name'],
+                    price=data.get('price'),
+                    description=data.get('description'),
+                    is_default=is_default,
+                )
+            SubCategory.objects.bulk_create(
+                objs.values(),
+                update_conflicts=True,
+                unique_fields=['user', 'category', 'name'],
+                update_fields=['price', 'description', 'is_default'],
+            )
+            result.upserted += len(objs)
+        transaction.on_commit(bump_tree_version)
+    return result
+
+
+class _Echo:
+    """File-like object whose write returns the line, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def stream_rows(queryset, columns, fmt, chunk_size=2000):
+    """Generator of NDJSON or CSV lines over the queryset, never holding the whole table."""
+    headers = list(columns)
+    rows = queryset.values_list(*columns.values()).iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), default=str) + '\n'
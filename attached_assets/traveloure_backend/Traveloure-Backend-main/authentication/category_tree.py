@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
+
+from .models import Category, SubCategory
+from .serializers import CategorySerializer
+
+VERSION_KEY = 'category-tree:version'
+
+
+def get_tree_version():
+    # Seeded from the clock so an evicted version key never brings back stale trees
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_tree_version(**kwargs):
+    """Invalidate every cached tree. Connected to Category/SubCategory save and delete."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def build_category_tree(expert_id):
+    """
+    The expert's own categories plus the defaults, each with the expert's and the
+    default subcategories nested. Defaults sharing a name with one of the expert's
+    own rows are left out, as in CategoryAPIView. Two queries.
+    """
+    own_category_names = Category.objects.filter(user_id=expert_id).values('name')
+    categories = Category.objects.filter(
+        Q(user_id=expert_id) | (Q(is_default=True) & ~Q(name__in=own_category_names))
+    )
+
+    own_subcategory_names = SubCategory.objects.filter(user_id=expert_id).values('name')
+    subcategories = SubCategory.objects.filter(
+        Q(user_id=expert_id) | (Q(is_default=True) & ~Q(name__in=own_subcategory_names))
+    ).order_by('-created_at')
+
+    categories = categories.prefetch_related(
+        Prefetch('subcategory_set', queryset=subcategories)
+    ).order_by('-created_at')
+    return [dict(item) for item in CategorySerializer(categories, many=True).data]
+
+
+def get_category_tree(expert_id):
+    key = f"category-tree:{get_tree_version()}:{expert_id}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree(expert_id)
+        cache.set(key, tree, settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
@@ -0,0 +1,216 @@
+import math
+import os
+import re
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from rest_framework import serializers
+
+# Upload targets and the upload_to prefix of the FileField each one ends up in
+UPLOAD_TARGETS = {
+    'service_file': 'serviceprovider/services/',
+    'gov_id': 'localExpert/',
+    'travel_licence': 'localExpert/',
+    'chat_attachment': 'trip_expert_advice/',
+    'itinerary_feedback_attachment': 'itinerary_feedbacks/',
+    'faq_attachment': 'faq_attachments/',
+}
+
+SESSION_SALT = 'direct-upload-session'
+PART_SALT = 'direct-upload-part'
+FILE_SALT = 'direct-upload-file'
+# Extensions are kept only in this shape, so a filename cannot add path segments to the key
+EXTENSION_RE = re.compile(r'[A-Za-z0-9]{1,10}')
+
+
+class DirectUploadError(Exception):
+    pass
+
+
+def build_key(target, filename):
+    """Storage name in the same uuid + timestamp format the dynamic storages produce."""
+    ext = os.path.splitext(os.path.basename(filename))[1][1:]
+    name = f"{uuid.uuid4().hex}_{int(time.time())}"
+    if EXTENSION_RE.fullmatch(ext):
+        name = f"{name}.{ext}"
+    return f"{UPLOAD_TARGETS[target]}{name}"
+
+
+class S3DirectUploadBackend:
+    """Multipart uploads straight to the S3-compatible bucket behind UUIDTimeStampS3Storage."""
+
+    def __init__(self):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = settings.AWS_STORAGE_BUCKET_NAME
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+            region_name=settings.AWS_S3_REGION_NAME,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            config=Config(signature_version='s3v4', s3={'addressing_style': settings.AWS_S3_ADDRESSING_STYLE or 'auto'}),
+        )
+
+    def start(self, key, content_type):
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+        return response['UploadId']
+
+    def part_url(self, request, key, upload_id, part_number):
+        return self.client.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': self.bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+            ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRY,
+        )
+
+    def complete(self, key, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [{'ETag': p['etag'], 'PartNumber': p['part_number']} for p in parts]},
+        )
+        return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+
+    def abort(self, key, upload_id):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+class FileSystemDirectUploadBackend:
+    """
+    Local stand-in used in DEV and tests. Part URLs point at DirectUploadPartAPIView,
+    which writes each part under MEDIA_ROOT the way the bucket would.
+    """
+
+    def _parts_dir(self, upload_id):
+        return os.path.join(settings.MEDIA_ROOT, 'direct_uploads', upload_id)
+
+    def start(self, key, content_type):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._parts_dir(upload_id), exist_ok=True)
+        return upload_id
+
+    def part_url(self, request, key, upload_id, part_number):
+        token = signing.dumps({'upload_id': upload_id, 'part_number': part_number}, salt=PART_SALT)
+        return request.build_absolute_uri(reverse('direct_upload_part', kwargs={'token': token}))
+
+    def write_part(self, upload_id, part_number, chunks):
+        parts_dir = self._parts_dir(upload_id)
+        if not os.path.isdir(parts_dir):
+            raise DirectUploadError("Unknown upload.")
+        path = os.path.join(parts_dir, str(part_number))
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return f'"{upload_id}-{part_number}"'
+
+    def complete(self, key, upload_id, parts):
+        parts_dir = self._parts_dir(upload_id)
+        target = os.path.join(settings.MEDIA_ROOT, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as out:
+            for part in sorted(parts, key=lambda p: p['part_number']):
+                part_path = os.path.join(parts_dir, str(part['part_number']))
+                if not os.path.exists(part_path):
+                    raise DirectUploadError(f"Part {part['part_number']} was not uploaded.")
+                with open(part_path, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return os.path.getsize(target)
+
+    def abort(self, key, upload_id):
+        shutil.rmtree(self._parts_dir(upload_id), ignore_errors=True)
+        target = os.path.join(settings.MEDIA_ROOT, key)
+        if os.path.exists(target):
+            os.remove(target)
+
+
+def get_direct_upload_backend():
+    if settings.ENVIRONMENT == "DEV":
+        return FileSystemDirectUploadBackend()
+    return S3DirectUploadBackend()
+
+
+def create_upload_session(request, target, filename, size, content_type):
+    """Start a multipart upload and return presigned part URLs plus the session token."""
+    if size > settings.DIRECT_UPLOAD_MAX_SIZE:
+        raise DirectUploadError(f"File is larger than {settings.DIRECT_UPLOAD_MAX_SIZE} bytes.")
+
+    backend = get_direct_upload_backend()
+    key = build_key(target, filename)
+    upload_id = backend.start(key, content_type)
+    part_count = max(1, math.ceil(size / settings.DIRECT_UPLOAD_PART_SIZE))
+    session_token = signing.dumps({
+        'user': str(request.user.id),
+        'target': target,
+        'key': key,
+        'upload_id': upload_id,
+        'size': size,
+        'part_count': part_count,
+    }, salt=SESSION_SALT)
+    return {
+        'upload_token': session_token,
+        'part_size': settings.DIRECT_UPLOAD_PART_SIZE,
+        'parts': [
+            {'part_number': n, 'url': backend.part_url(request, key, upload_id, n)}
+            for n in range(1, part_count + 1)
+        ],
+    }
+
+
+def complete_upload_session(request, upload_token, parts):
+    """Finish the multipart upload and return a file token the model serializers accept."""
+    try:
+        session = signing.loads(upload_token, salt=SESSION_SALT, max_age=settings.DIRECT_UPLOAD_URL_EXPIRY)
+    except signing.BadSignature:
+        raise DirectUploadError("Invalid or expired upload token.")
+    if session['user'] != str(request.user.id):
+        raise DirectUploadError("Upload token does not belong to this user.")
+    if sorted(p['part_number'] for p in parts) != list(range(1, session['part_count'] + 1)):
+        raise DirectUploadError("All parts must be listed exactly once.")
+
+    backend = get_direct_upload_backend()
+    size = backend.complete(session['key'], session['upload_id'], parts)
+    if size > settings.DIRECT_UPLOAD_MAX_SIZE:
+        backend.abort(session['key'], session['upload_id'])
+        raise DirectUploadError(f"File is larger than {settings.DIRECT_UPLOAD_MAX_SIZE} bytes.")
+
+    file_token = signing.dumps(
+        {'user': session['user'], 'target': session['target'], 'key': session['key']},
+        salt=FILE_SALT,
+    )
+    return {'file_token': file_token, 'key': session['key'], 'size': size}
+
+
+class DirectUploadField(serializers.CharField):
+    """
+    Write-only field taking the file_token from the upload complete API. Point its
+    source at the FileField and the stored object is attached without any bytes
+    passing through the app worker.
+    """
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+        kwargs.setdefault('write_only', True)
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        token = super().to_internal_value(data)
+        try:
+            payload = signing.loads(token, salt=FILE_SALT, max_age=settings.DIRECT_UPLOAD_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid or expired file token.")
+
+        request = self.context.get('request')
+        if payload['target'] != self.target:
+            raise serializers.ValidationError("File token was issued for a different field.")
+        if request and payload['user'] != str(request.user.id):
+            raise serializers.ValidationError("File token does not belong to this user.")
+        return payload['key']
@@ -0,0 +1,130 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('travelDNA')
+
+# Widths every uploaded image is resized to, and the formats each width is encoded in
+VARIANT_WIDTHS = (96, 320, 800)
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'tiff'}
+# The largest variant is written last, so its presence means the set is complete
+LAST_VARIANT = (max(VARIANT_WIDTHS), list(VARIANT_FORMATS)[-1])
+# How long an image found without variants is trusted to still lack them
+MISSING_VARIANTS_SECONDS = 60
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+
+
+def is_image_name(name):
+    return bool(name) and name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def variant_name(name, width, fmt):
+    """Derivatives live at a fixed name next to the original's path, so no lookup is needed to serve them."""
+    stem = os.path.splitext(name)[0]
+    return f"variants/{stem}_{width}w.{fmt}"
+
+
+def _ready_key(name):
+    return f"image-variants:{name}"
+
+
+def variants_ready(name):
+    """Whether every variant of the stored image exists; the storage is asked once and the answer cached."""
+    ready = cache.get(_ready_key(name))
+    if ready is None:
+        ready = default_storage.exists(variant_name(name, *LAST_VARIANT))
+        cache.set(_ready_key(name), ready, None if ready else MISSING_VARIANTS_SECONDS)
+    return ready
+
+
+def generate_variants(storage, name):
+    """Write every width/format derivative of the stored image into the default storage."""
+    with storage.open(name, 'rb') as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        flattened = Image.new('RGB', image.size, (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel('A'))
+    else:
+        flattened = image
+
+    cache.delete(_ready_key(name))
+    for width in VARIANT_WIDTHS:
+        for fmt, pil_format in VARIANT_FORMATS.items():
+            # JPEG has no alpha channel, WebP keeps it
+            resized = (image if fmt == 'webp' else flattened).copy()
+            # thumbnail never upscales, small originals are re-encoded at their own size
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+
+            target = variant_name(name, width, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+    cache.set(_ready_key(name), True, None)
+
+
+def delete_image(storage, name):
+    """Remove a replaced original together with its derivatives."""
+    storage.delete(name)
+    if not is_image_name(name):
+        return
+    cache.delete(_ready_key(name))
+    for width in VARIANT_WIDTHS:
+        for fmt in VARIANT_FORMATS:
+            default_storage.delete(variant_name(name, width, fmt))
+
+
+def _run(func, storage, name):
+    try:
+        func(storage, name)
+    except Exception as e:
+        logger.error(f"Image job {func.__name__} failed for {name}: {e}")
+
+
+def _schedule(func, field_file):
+    storage, name = field_file.storage, field_file.name
+    # Only hand the file to the worker once the row pointing at it is committed
+    transaction.on_commit(lambda: _executor.submit(_run, func, storage, name))
+
+
+def schedule_variants(field_file):
+    if field_file and is_image_name(field_file.name):
+        _schedule(generate_variants, field_file)
+
+
+def schedule_delete(field_file):
+    if field_file:
+        _schedule(delete_image, field_file)
+
+
+def variant_srcset(field_file, request):
+    """
+    srcset strings per format, e.g. {'webp': '<url> 96w, <url> 320w, ...', 'jpeg': ...}.
+    None for empty fields, files that are not images and images whose variants are not all
+    generated yet (or failed), for which clients use the original.
+    """
+    if not field_file or not is_image_name(field_file.name) or not variants_ready(field_file.name):
+        return None
+    build_url = request.build_absolute_uri if request else str
+    return {
+        fmt: ', '.join(
+            f"{build_url(default_storage.url(variant_name(field_file.name, width, fmt)))} {width}w"
+            for width in VARIANT_WIDTHS
+        )
+        for fmt in VARIANT_FORMATS
+    }
@@ -2,6 +2,7 @@ import uuid
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from authentication.models import Category, SubCategory
+from authentication.category_tree import bump_tree_version
 
 User = get_user_model()
 
@@ -230,45 +231,33 @@ class Command(BaseCommand):
             },
         ]
 
-        for cat_data in data:
-            # --- Category creation or skip ---
-            category = Category.objects.filter(
-                name=cat_data["name"],
-                is_default=True,
-                user=None,
-            ).first()
-
-            if category:
-                self.stdout.write(self.style.WARNING(f"Category exists: {category.name}"))
-            else:
-                category = Category.objects.create(
-                    name=cat_data["name"],
-                    is_default=True,
-                    user=None,
-                )
-                self.stdout.write(self.style.SUCCESS(f"Created category: {category.name}"))
-
-            for sub in cat_data.get("sub_category", []):
-                subcategory = SubCategory.objects.filter(
-                    category=category,
-                    name=sub["name"],
-                    price=sub["price"],
-                    user=None,
-                ).first()
-
-                if subcategory:
-                    self.stdout.write(f"  → Exists: {subcategory.name}")
-                    continue
-
-                subcategory = SubCategory.objects.create(
-                    category=category,
-                    name=sub["name"],
-                    price=sub["price"],
-                    is_default=sub["is_default"],
-                    user=None,
-                )
-
-                self.stdout.write(self.style.SUCCESS(f"  → Created subcategory: {subcategory.name}"))
+        # Existing defaults are left as they are, so prices edited by admins survive a re-seed
+        Category.objects.bulk_create(
+            [Category(name=cat_data["name"], is_default=True, user=None) for cat_data in data],
+            ignore_conflicts=True,
+        )
+        categories = {
+            category.name: category
+            for category in Category.objects.filter(user=None, name__in=[cat_data["name"] for cat_data in data])
+        }
 
+        subcategories = [
+            SubCategory(
+                category=categories[cat_data["name"]],
+                name=sub["name"],
+                price=sub["price"],
+                is_default=sub["is_default"],
+                user=None,
+            )
+            for cat_data in data
+            for sub in cat_data.get("sub_category", [])
+        ]
+        existing = SubCategory.objects.filter(user=None, category__in=categories.values()).count()
+        SubCategory.objects.bulk_create(subcategories, ignore_conflicts=True)
+        # bulk_create skips the save signals that invalidate cached trees
+        bump_tree_version()
+        added = SubCategory.objects.filter(user=None, category__in=categories.values()).count() - existing
 
-        self.stdout.write(self.style.SUCCESS("\n Categories and Subcategories seeding complete."))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(categories)} default categories and {len(subcategories)} subcategories ({added} new)"
+        ))
@@ -0,0 +1,35 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from authentication.image_variants import LAST_VARIANT, generate_variants, is_image_name, variant_name
+from authentication.models import User
+from serviceproviderapp.models import AllService
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails for profile, cover and service images uploaded before the image worker existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate images that already have variants")
+
+    def _files(self):
+        users = User.objects.exclude(image='', cover_image='').only('image', 'cover_image').iterator()
+        for user in users:
+            yield user.image
+            yield user.cover_image
+        for service in AllService.objects.exclude(service_file='').only('service_file').iterator():
+            yield service.service_file
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for field_file in self._files():
+            if not field_file or not is_image_name(field_file.name):
+                continue
+            if not options["force"] and default_storage.exists(variant_name(field_file.name, *LAST_VARIANT)):
+                continue
+            try:
+                generate_variants(field_file.storage, field_file.name)
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(self.style.ERROR(f"{field_file.name}: {e}"))
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {generated} image(s), {failed} failed"))
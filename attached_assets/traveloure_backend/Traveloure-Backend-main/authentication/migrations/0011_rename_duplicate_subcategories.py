@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def rename_duplicate_subcategories(apps, schema_editor):
+    """Suffix repeated (user, category, name) rows so the new constraint can be added."""
+    SubCategory = apps.get_model('authentication', 'SubCategory')
+    seen = set()
+    for sub in SubCategory.objects.order_by('created_at').iterator():
+        key = (sub.user_id, sub.category_id, sub.name)
+        if key not in seen:
+            seen.add(key)
+            continue
+        n = 1
+        while key in seen:
+            n += 1
+            suffix = f" ({n})"
+            key = (sub.user_id, sub.category_id, f"{sub.name[:100 - len(suffix)]}{suffix}")
+        seen.add(key)
+        sub.name = key[2]
+        sub.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0010_alter_user_preferred_months_alter_user_travel_style'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_subcategories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_category_subcategory_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['is_default', 'created_at', 'id'], name='category_default_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['is_default', 'name', 'id'], name='category_default_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['category', 'is_default', 'created_at', 'id'], name='subcat_cat_default_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['category', 'is_default', 'name', 'id'], name='subcat_cat_default_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['category', 'is_default', 'price', 'id'], name='subcat_cat_default_price_idx'),
+        ),
+    ]
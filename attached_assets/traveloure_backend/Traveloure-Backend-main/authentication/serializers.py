@@ -5,6 +5,8 @@ import uuid
 from django.conf import settings
 from django.db.models import Q
 from .utils import send_verification_mail, generate_unique_username, generate_random_password
+from .direct_upload import DirectUploadField
+from .image_variants import variant_srcset
 from django.utils.timezone import now
 import stripe
 from ai_itinerary.models import ReviewRating, Trip, GeneratedItinerary
@@ -139,9 +141,28 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.save()
         return user
     
-class UserSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin:
+    """
+    Leaves out the image_variants/cover_image_variants srcsets unless the request asks for them
+    with ?image_variants=true, so only the screens rendering the images pay for them.
+    """
+    variant_fields = ('image_variants', 'cover_image_variants')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        params = getattr(request, 'query_params', {})
+        if params.get('image_variants') not in ('1', 'true'):
+            for name in self.variant_fields:
+                fields.pop(name, None)
+        return fields
+
+
+class UserSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     cover_image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    cover_image_variants = serializers.SerializerMethodField()
     trip_planned = serializers.SerializerMethodField()
     preferences = serializers.SerializerMethodField()
     current_trips = serializers.SerializerMethodField()
@@ -184,6 +205,12 @@ class UserSerializer(serializers.ModelSerializer):
         if obj.cover_image and hasattr(obj.cover_image, 'url'):
             return request.build_absolute_uri(obj.cover_image.url)
         return None
+
+    def get_image_variants(self, obj):
+        return variant_srcset(obj.image, self.context.get('request'))
+
+    def get_cover_image_variants(self, obj):
+        return variant_srcset(obj.cover_image, self.context.get('request'))
     
     def get_trip_planned(self, obj):
         """
@@ -241,8 +268,8 @@ class UserSerializer(serializers.ModelSerializer):
     
     def get_trips_with_services(self, obj):
         user = self.context['request'].user
-        trips = Trip.objects.filter(user=user)
-        return TripWithServicesSerializer(trips, many=True).data
+        trips = TripWithServicesSerializer.prefetch(Trip.objects.filter(user=user))
+        return TripWithServicesSerializer(trips, many=True, context=self.context).data
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -289,19 +316,22 @@ class UserSerializer(serializers.ModelSerializer):
         return data
 
 
-class LeanUserSerializer(serializers.ModelSerializer):
+class LeanUserSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     """
     A lean version of UserSerializer for admin list views that only includes essential user information
     without trip details and other heavy data
     """
     image = serializers.SerializerMethodField()
     cover_image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    cover_image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = [
             'id', 'username', 'first_name', 'last_name', 'email', 'phone_number',
             'country', 'city', 'dob', 'about_me', 'image', 'cover_image',
+            'image_variants', 'cover_image_variants',
             'is_local_expert', 'is_service_provider', 'created_at'
         ]
 
@@ -317,6 +347,12 @@ class LeanUserSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.cover_image.url)
         return None
 
+    def get_image_variants(self, obj):
+        return variant_srcset(obj.image, self.context.get('request'))
+
+    def get_cover_image_variants(self, obj):
+        return variant_srcset(obj.cover_image, self.context.get('request'))
+
 
 class UpdateProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -370,9 +406,24 @@ class LocalExpertCreateSerializer(serializers.ModelSerializer):
     user_dob = serializers.DateField(required=False, write_only=True)
     user_about_me = serializers.CharField(required=False, write_only=True)
 
+    # Tokens from the direct upload API, used instead of sending the files in the form
+    gov_id_token = DirectUploadField(target='gov_id', source='gov_id')
+    travel_licence_token = DirectUploadField(target='travel_licence', source='travel_licence')
+
     class Meta:
         model = LocalExpertForm
         exclude = ['user','status', 'created_at']
+        extra_kwargs = {
+            'gov_id': {'required': False},
+            'travel_licence': {'required': False},
+        }
+
+    def validate(self, data):
+        if not self.partial:
+            for field in ['gov_id', 'travel_licence']:
+                if not data.get(field):
+                    raise serializers.ValidationError({field: f"Upload {field} or send {field}_token."})
+        return data
 
     def create(self, validated_data):
         request = self.context.get('request')
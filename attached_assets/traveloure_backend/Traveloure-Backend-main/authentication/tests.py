@@ -1,3 +1,87 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import uuid
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.core import signing
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from authentication import direct_upload
+from authentication.direct_upload import (
+    DirectUploadError, FileSystemDirectUploadBackend, build_key, complete_upload_session, create_upload_session,
+)
+
+
+class BuildKeyTests(SimpleTestCase):
+    def test_key_keeps_a_plain_extension(self):
+        key = build_key('service_file', 'brochure.final.PDF')
+        self.assertTrue(key.startswith('serviceprovider/services/'))
+        self.assertTrue(key.endswith('.PDF'))
+
+    def test_filename_cannot_add_path_segments(self):
+        for filename in ('x.png/etc/evil', 'x.png/../../evil', 'x.png\\evil', 'x.' + 'a' * 11, 'noext'):
+            key = build_key('service_file', filename)
+            name = key[len('serviceprovider/services/'):]
+            self.assertNotIn('/', name)
+            self.assertNotIn('.', name)
+
+
+@override_settings(ENVIRONMENT='DEV', DIRECT_UPLOAD_PART_SIZE=4)
+class FileSystemDirectUploadTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media_root = media_root
+
+        self.request = RequestFactory().post('/api/uploads/')
+        self.request.user = SimpleNamespace(id=uuid.uuid4())
+        self.backend = FileSystemDirectUploadBackend()
+
+    def create(self, size=6):
+        session = create_upload_session(self.request, 'service_file', 'brochure.pdf', size, 'application/pdf')
+        return session, signing.loads(session['upload_token'], salt=direct_upload.SESSION_SALT)
+
+    def test_create_starts_an_upload_with_a_url_per_part(self):
+        session, payload = self.create()
+        self.assertEqual([part['part_number'] for part in session['parts']], [1, 2])
+        self.assertTrue(payload['key'].startswith('serviceprovider/services/'))
+        self.assertTrue(os.path.isdir(self.backend._parts_dir(payload['upload_id'])))
+
+    def test_complete_joins_the_parts_in_order(self):
+        session, payload = self.create()
+        parts = [
+            {'part_number': 2, 'etag': self.backend.write_part(payload['upload_id'], 2, [b'ef'])},
+            {'part_number': 1, 'etag': self.backend.write_part(payload['upload_id'], 1, [b'ab', b'cd'])},
+        ]
+
+        result = complete_upload_session(self.request, session['upload_token'], parts)
+        with open(os.path.join(self.media_root, payload['key']), 'rb') as f:
+            self.assertEqual(f.read(), b'abcdef')
+        self.assertEqual(result['size'], 6)
+        self.assertFalse(os.path.exists(self.backend._parts_dir(payload['upload_id'])))
+        self.assertEqual(signing.loads(result['file_token'], salt=direct_upload.FILE_SALT)['key'], payload['key'])
+
+    def test_complete_refuses_missing_parts(self):
+        session, payload = self.create()
+        self.backend.write_part(payload['upload_id'], 1, [b'abcd'])
+        with self.assertRaises(DirectUploadError):
+            complete_upload_session(self.request, session['upload_token'], [{'part_number': 1, 'etag': ''}])
+
+    def test_complete_refuses_another_users_token(self):
+        session, _ = self.create(size=4)
+        self.request.user = SimpleNamespace(id=uuid.uuid4())
+        with self.assertRaises(DirectUploadError):
+            complete_upload_session(self.request, session['upload_token'], [{'part_number': 1, 'etag': ''}])
+
+    def test_abort_removes_the_parts_and_the_file(self):
+        session, payload = self.create(size=4)
+        self.backend.write_part(payload['upload_id'], 1, [b'abcd'])
+        complete_upload_session(self.request, session['upload_token'], [{'part_number': 1, 'etag': ''}])
+
+        self.backend.abort(payload['key'], payload['upload_id'])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, payload['key'])))
+        self.assertFalse(os.path.exists(self.backend._parts_dir(payload['upload_id'])))
@@ -4,6 +4,7 @@ from .google_auth_views import GoogleCallbackView
 from rest_framework.routers import DefaultRouter
 from .views_api.auth_api import *
 from .views_api.category_api import *
+from .views_api.upload_api import DirectUploadCreateAPIView, DirectUploadCompleteAPIView, DirectUploadPartAPIView
 from .views_api.local_expert import SearchLocalExertAPIView, LocalExpertCreate, RetrieveLocalExpertStatus, LocalExpertAdminListAPIView, LocalExpertAdminDetailUpdateAPIView, LocalExpertMyApplicationAPIView, LocalExpertDashboardAPIView, LocalExpertByCountryAPIView, LocalExpertBusinessProfileAPIView, LocalExpertEarningsView
 from .views_api.service_provider import CreateServiceProviderFormView, RetrieveServiceProviderStatus, ManageServiceProviderFormListView, ManageServiceProviderFormDetailUpdateView, ServiceProviderMyApplicationAPIView, ServiceProviderDashboardAPIView, ServiceProviderByCountryAPIView
 
@@ -60,7 +61,16 @@ urlpatterns = [
 
     # Category & SubCategory API's
     path('category/',CategoryAPIView.as_view(),name="list_create_category"),
+    path('category/import/',CategoryImportAPIView.as_view(),name="import_category"),
+    path('category/export/',CategoryExportAPIView.as_view(),name="export_category"),
     path('category/<str:id>/',CategoryDetailAPIView.as_view(),name="update_delete_category"),
     path('subcategory/',SubCategoryAPIView.as_view(),name="list_create_subcategory"),
+    path('subcategory/import/',SubCategoryImportAPIView.as_view(),name="import_subcategory"),
+    path('subcategory/export/',SubCategoryExportAPIView.as_view(),name="export_subcategory"),
     path('subcategory/<str:id>/',SubCategoryDetailAPIView.as_view(),name="update_delete_subcategory"),
+
+    # Direct-to-storage uploads
+    path('uploads/',DirectUploadCreateAPIView.as_view(),name="direct_upload_create"),
+    path('uploads/complete/',DirectUploadCompleteAPIView.as_view(),name="direct_upload_complete"),
+    path('uploads/part/<str:token>/',DirectUploadPartAPIView.as_view(),name="direct_upload_part"),
 ]
@@ -10,6 +10,8 @@ from authentication.utils import generate_tokens
 from django.shortcuts import get_object_or_404
 from rest_framework.serializers import Serializer
 from authentication.mixins import LoggingMixin
+from authentication.image_variants import schedule_delete, schedule_variants
+from django.db import transaction
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes, force_str
@@ -282,13 +284,15 @@ class UserProfileUpdateView(LoggingMixin,generics.UpdateAPIView):
         serializer = self.get_serializer(profile_instance, data=request.data, partial=True)
         if serializer.is_valid():
             profile_instance.updated_at = timezone.now()
-            if 'cover_image' in request.data and old_cover_image:
-                old_cover_image.delete(save=False)
-
-            # If new profile image is provided, delete the old one
-            if 'image' in request.data and old_image:
-                old_image.delete(save=False)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                # Replaced files are deleted and new ones resized by the image worker after commit
+                if 'cover_image' in request.data:
+                    schedule_delete(old_cover_image)
+                    schedule_variants(profile_instance.cover_image)
+                if 'image' in request.data:
+                    schedule_delete(old_image)
+                    schedule_variants(profile_instance.image)
             return Response({'message': "Profile Updated Successfully", "status": True}, status=200)
         
         return Response({"error": serializer.errors}, status=400)
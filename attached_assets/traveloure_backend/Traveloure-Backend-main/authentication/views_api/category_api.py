@@ -1,67 +1,85 @@
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.permissions import  IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.views import APIView
+from django.http import StreamingHttpResponse
+from django.db import DatabaseError
 from authentication.models import *
 from authentication.serializers import *
-
-
-class CategoryAPIView(generics.ListCreateAPIView):
+from authentication.category_tree import get_category_tree
+from authentication.category_bulk import (
+    CATEGORY_EXPORT_COLUMNS, SUBCATEGORY_EXPORT_COLUMNS,
+    import_categories, import_subcategories, read_rows, stream_rows,
+)
+
+
+
+class DeclaredOrderingMixin:
+    """
+    Ordering from the order_by/order_dir query params, limited to ordering_fields.
+    Each key is backed by an index and id is appended as a stable tiebreaker.
+    """
+    ordering_fields = ('created_at', 'name')
+    default_ordering_field = 'created_at'
+
+    def get_ordering(self):
+        field = self.request.query_params.get("order_by", self.default_ordering_field)
+        direction = self.request.query_params.get("order_dir", "desc").lower()
+        if field not in self.ordering_fields:
+            raise ValidationError({"order_by": f"Must be one of: {', '.join(self.ordering_fields)}."})
+        if direction not in ("asc", "desc"):
+            raise ValidationError({"order_dir": "Must be asc or desc."})
+        prefix = "-" if direction == "desc" else ""
+        return [f"{prefix}{field}", f"{prefix}id"]
+
+
+class CategoryAPIView(DeclaredOrderingMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CategorySerializer
     pagination_class = None
 
     def get_queryset(self):
-        user = self.request.user
+        # Only superusers list from the table, everyone else gets the cached tree in list()
         local_expert_id = self.request.query_params.get("expert_id")
         search = self.request.query_params.get("search")
         is_default_param = self.request.query_params.get("is_default")
 
         qs = Category.objects.all()
+        if local_expert_id:
+            qs = qs.filter(user_id=local_expert_id)
+        if is_default_param is not None:
+            qs = qs.filter(is_default=is_default_param.lower() == "true")
+        if search:
+            qs = qs.filter(name__icontains=search)
+        return qs.distinct().prefetch_related('subcategory_set').order_by(*self.get_ordering())
 
-        # --- Superuser logic ---
+    def list(self, request, *args, **kwargs):
+        user = request.user
+        ordering = self.get_ordering()
         if user.is_superuser:
-            if local_expert_id:
-                qs = qs.filter(user_id=local_expert_id)
-            if is_default_param is not None:
-                qs = qs.filter(is_default=is_default_param.lower() == "true")
-            if search:
-                qs = qs.filter(name__icontains=search)
-            return qs.distinct().order_by('-created_at')
-        if hasattr(user, "is_local_expert") and user.is_local_expert:
-            own_qs = Category.objects.filter(user=user)
-            default_qs = Category.objects.filter(is_default=True)
-
-            # Exclude defaults with same names as own categories
-            own_names = own_qs.values_list("name", flat=True)
-            merged_qs = own_qs | default_qs.exclude(name__in=own_names)
-            qs = merged_qs.distinct()
-
-            if is_default_param is not None:
-                qs = qs.filter(is_default=is_default_param.lower() == "true")
-            if search:
-                qs = qs.filter(name__icontains=search)
-
-            return qs.order_by('-created_at')
-
-        if not local_expert_id:
-            return Category.objects.none()
+            return super().list(request, *args, **kwargs)
 
-        try:
-            expert = User.objects.get(id=local_expert_id, is_local_expert=True)
-        except User.DoesNotExist:
-            return Category.objects.none()
-
-        qs = Category.objects.filter(
-            Q(user=expert) | Q(is_default=True)
-        ).distinct()
+        # Experts and the public expert_id lookup are served from the cached merged tree
+        if getattr(user, "is_local_expert", False):
+            expert_id = user.id
+        else:
+            expert_id = request.query_params.get("expert_id")
+            if not expert_id or not User.objects.filter(id=expert_id, is_local_expert=True).exists():
+                return Response([])
 
+        tree = get_category_tree(expert_id)
+        is_default_param = request.query_params.get("is_default")
+        search = request.query_params.get("search")
         if is_default_param is not None:
-            qs = qs.filter(is_default=is_default_param.lower() == "true")
+            is_default = is_default_param.lower() == "true"
+            tree = [category for category in tree if category["is_default"] == is_default]
         if search:
-            qs = qs.filter(name__icontains=search)
-
-        return qs.order_by('-created_at')
+            search = search.casefold()
+            tree = [category for category in tree if search in category["name"].casefold()]
+        field = ordering[0].lstrip("-")
+        tree = sorted(tree, key=lambda category: (category[field], str(category["id"])), reverse=ordering[0].startswith("-"))
+        return Response(tree)
     
     def perform_create(self, serializer):
         user = self.request.user
@@ -135,18 +153,18 @@ class CategoryDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
             return Response({"message":"You do not have permission to delete this category.","data":[],"status":False},status=403)
 
 
-class SubCategoryAPIView(generics.ListCreateAPIView):
+class SubCategoryAPIView(DeclaredOrderingMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = SubCategorySerializer
     pagination_class = None
+    ordering_fields = ('created_at', 'name', 'price')
 
     def get_queryset(self):
         user = self.request.user
         category_id = self.request.query_params.get("category_id")
         search = self.request.query_params.get("search")
         is_default_param = self.request.query_params.get("is_default")
-        order_by_field = self.request.query_params.get("order_by", "created_at")  # default: created_at
-        order_dir = self.request.query_params.get("order_dir", "desc")  # default: descending
+        ordering = self.get_ordering()
 
         qs = SubCategory.objects.all()
 
@@ -158,9 +176,7 @@ class SubCategoryAPIView(generics.ListCreateAPIView):
                 qs = qs.filter(is_default=is_default_param.lower() == "true")
             if search:
                 qs = qs.filter(name__icontains=search)
-            return qs.distinct().order_by(
-                f"{'-' if order_dir.lower() == 'desc' else ''}{order_by_field}"
-            )
+            return qs.distinct().order_by(*ordering)
 
         # --- Local expert logic ---
         if hasattr(user, "is_local_expert") and user.is_local_expert:
@@ -179,9 +195,7 @@ class SubCategoryAPIView(generics.ListCreateAPIView):
             if search:
                 qs = qs.filter(name__icontains=search)
 
-            return qs.order_by(
-                f"{'-' if order_dir.lower() == 'desc' else ''}{order_by_field}"
-            )
+            return qs.order_by(*ordering)
 
         # --- Normal user / client logic ---
         if not category_id:
@@ -199,9 +213,7 @@ class SubCategoryAPIView(generics.ListCreateAPIView):
         if search:
             qs = qs.filter(name__icontains=search)
 
-        return qs.order_by(
-            f"{'-' if order_dir.lower() == 'desc' else ''}{order_by_field}"
-        )
+        return qs.order_by(*ordering)
     
     def create(self, request, *args, **kwargs):
         user = request.user
@@ -274,4 +286,67 @@ class SubCategoryDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 
             return Response({"message":"Subcategory Deleted Successfully","data":[],"status":True},status=204)
         else:
-            return Response({"message":"You do not have permission to delete this subcategory.","data":[],"status":False},status=403)
\ No newline at end of file
+            return Response({"message":"You do not have permission to delete this subcategory.","data":[],"status":False},status=403)
+
+class _CategoryImportAPIView(APIView):
+    """
+    Bulk upsert from an NDJSON body, or CSV when sent as text/csv. Rows are validated
+    and written in chunks within one transaction; invalid rows are reported by line without
+    stopping the import, while a database error saves none of it.
+    """
+    permission_classes = [IsAuthenticated]
+    import_rows = None
+
+    def post(self, request, *args, **kwargs):
+        user = request.user
+        if not (user.is_superuser or getattr(user, "is_local_expert", False)):
+            raise PermissionDenied("Only local experts can import categories.")
+        fmt = 'csv' if request.content_type.startswith('text/csv') else 'ndjson'
+        try:
+            result = self.import_rows(user, read_rows(request.stream, fmt))
+        except DatabaseError as e:
+            return Response({"message": f"Import failed, no rows were saved: {e}", "data": [], "status": False}, status=400)
+        return Response({"message": "Import finished", "data": result.as_dict(), "status": True}, status=200)
+
+
+class CategoryImportAPIView(_CategoryImportAPIView):
+    import_rows = staticmethod(import_categories)
+
+
+class SubCategoryImportAPIView(_CategoryImportAPIView):
+    import_rows = staticmethod(import_subcategories)
+
+
+class _CategoryExportAPIView(APIView):
+    """Streams the caller's rows (every row for superusers) as NDJSON or, with ?file_format=csv, CSV."""
+    permission_classes = [IsAuthenticated]
+    model = None
+    columns = None
+    filename = None
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get("file_format", "ndjson")
+        if fmt not in ("ndjson", "csv"):
+            return Response({"message": "file_format must be ndjson or csv", "status": False}, status=400)
+
+        qs = self.model.objects.all()
+        if not request.user.is_superuser:
+            qs = qs.filter(user=request.user)
+        response = StreamingHttpResponse(
+            stream_rows(qs.order_by('created_at', 'id'), self.columns, fmt),
+            content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{fmt}"'
+        return response
+
+
+class CategoryExportAPIView(_CategoryExportAPIView):
+    model = Category
+    columns = CATEGORY_EXPORT_COLUMNS
+    filename = "categories"
+
+
+class SubCategoryExportAPIView(_CategoryExportAPIView):
+    model = SubCategory
+    columns = SUBCATEGORY_EXPORT_COLUMNS
+    filename = "subcategories"
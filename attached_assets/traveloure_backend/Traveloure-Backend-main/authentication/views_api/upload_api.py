@@ -0,0 +1,84 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.core import signing
+from django.http import Http404
+from authentication.direct_upload import (
+    UPLOAD_TARGETS, PART_SALT, DirectUploadError, FileSystemDirectUploadBackend,
+    create_upload_session, complete_upload_session, get_direct_upload_backend,
+)
+
+
+class DirectUploadCreateSerializer(serializers.Serializer):
+    target = serializers.ChoiceField(choices=list(UPLOAD_TARGETS))
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    content_type = serializers.CharField(required=False, default='application/octet-stream')
+
+
+class DirectUploadPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1)
+    etag = serializers.CharField()
+
+
+class DirectUploadCompleteSerializer(serializers.Serializer):
+    upload_token = serializers.CharField()
+    parts = DirectUploadPartSerializer(many=True)
+
+
+class DirectUploadCreateAPIView(APIView):
+    """
+    Start a direct upload. The client PUTs each part to the returned URLs,
+    then posts the ETags to DirectUploadCompleteAPIView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = DirectUploadCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            data = create_upload_session(request, **serializer.validated_data)
+        except DirectUploadError as e:
+            return Response({"message": str(e), "status": False}, status=400)
+        return Response({"data": data, "status": True}, status=201)
+
+
+class DirectUploadCompleteAPIView(APIView):
+    """Finish a direct upload and return the file_token to send with the form."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = DirectUploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            data = complete_upload_session(request, **serializer.validated_data)
+        except DirectUploadError as e:
+            return Response({"message": str(e), "status": False}, status=400)
+        return Response({"data": data, "status": True}, status=200)
+
+
+class DirectUploadPartAPIView(APIView):
+    """
+    Part upload URL for the filesystem stand-in. Only answers in DEV; in other
+    environments parts go straight to the bucket.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def put(self, request, token):
+        backend = get_direct_upload_backend()
+        if not isinstance(backend, FileSystemDirectUploadBackend):
+            raise Http404
+        try:
+            part = signing.loads(token, salt=PART_SALT, max_age=settings.DIRECT_UPLOAD_URL_EXPIRY)
+        except signing.BadSignature:
+            return Response({"message": "Invalid or expired upload URL.", "status": False}, status=403)
+        try:
+            etag = backend.write_part(part['upload_id'], part['part_number'], iter(lambda: request.read(65536), b''))
+        except DirectUploadError as e:
+            return Response({"message": str(e), "status": False}, status=404)
+        response = Response(status=200)
+        response['ETag'] = etag
+        return response
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class FaqsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'faqs'
+
+    def ready(self):
+        from .models import FAQ
+        from .search import faq_deleted, faq_saved
+
+        post_save.connect(faq_saved, sender=FAQ, dispatch_uid='faq-search-save')
+        post_delete.connect(faq_deleted, sender=FAQ, dispatch_uid='faq-search-delete')
@@ -0,0 +1,232 @@
+import heapq
+import math
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.html import escape
+
+# Workers share the index through the default cache, which must therefore be one all of them
+# reach (Redis in production). LocMemCache is per process: each worker would only see its own edits.
+VERSION_KEY = 'faq-search:version'
+SNAPSHOT_KEY = 'faq-search:snapshot:{}'
+PUBLISH_LOCK_KEY = 'faq-search:publish-lock'
+# A worker dying while publishing holds the lock at most this long
+PUBLISH_LOCK_TIMEOUT = 30
+# Evicted snapshots are rebuilt from the table, so they do not need to live forever
+SNAPSHOT_TIMEOUT = 7 * 24 * 3600
+
+# BM25 parameters; question terms count twice so a hit in the question outranks one in the answer
+K1 = 1.2
+B = 0.75
+QUESTION_WEIGHT = 2
+SNIPPET_CHARS = 160
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in into is it my of on or "
+    "so that the their there this to was what when where which who why will with you your".split()
+)
+# Longest first, the first match wins
+SUFFIXES = ('ational', 'ization', 'fulness', 'ousness', 'iveness', 'ments', 'ement', 'ingly', 'ation',
+            'ness', 'ment', 'able', 'ible', 'ings', 'ions', 'ing', 'ies', 'ion', 'ful', 'ous', 'ive', 'ed', 'ly', 'es', 's')
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Light suffix-stripping stemmer. Good enough to match booking/booked/bookings."""
+    if word.endswith('ss'):
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if suffix == 'ies':
+                word += 'y'
+            elif suffix in ('ings', 'ing', 'ed') and word[-1] == word[-2] and word[-1] not in 'aeiou':
+                # cancelled -> cancel, shipping -> ship
+                word = word[:-1]
+            break
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class FAQIndex:
+    """Inverted index over FAQ questions and answers, scored with BM25."""
+
+    def __init__(self, docs=()):
+        self.docs = {}
+        self.lengths = {}
+        self.postings = defaultdict(dict)
+        self.total_length = 0
+        for doc in docs:
+            self.add(doc)
+
+    def copy(self):
+        index = FAQIndex()
+        index.docs = dict(self.docs)
+        index.lengths = dict(self.lengths)
+        index.postings = defaultdict(dict, {term: dict(postings) for term, postings in self.postings.items()})
+        index.total_length = self.total_length
+        return index
+
+    def add(self, doc):
+        doc_id = doc['id']
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        terms = Counter(tokenize(doc['answer']))
+        for term in tokenize(doc['question']):
+            terms[term] += QUESTION_WEIGHT
+        self.docs[doc_id] = doc
+        self.lengths[doc_id] = sum(terms.values())
+        self.total_length += self.lengths[doc_id]
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in set(tokenize(doc['question'])) | set(tokenize(doc['answer'])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query, limit=10):
+        terms = set(tokenize(query))
+        n = len(self.docs)
+        if not terms or not n:
+            return []
+        avg_length = self.total_length / n
+        scores = defaultdict(float)
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = K1 * (1 - B + B * self.lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        results = []
+        for doc_id, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1]):
+            doc = self.docs[doc_id]
+            results.append({
+                'id': doc_id,
+                'question': doc['question'],
+                'answer': doc['answer'],
+                'score': round(score, 4),
+                'question_highlight': highlight(doc['question'], terms, len(doc['question'])),
+                'answer_snippet': highlight(doc['answer'], terms, SNIPPET_CHARS),
+            })
+        return results
+
+
+def highlight(text, terms, width):
+    """Escaped window of text around the first matching word, with matches wrapped in <mark>."""
+    matches = [m for m in WORD_RE.finditer(text) if stem(m.group().lower()) in terms]
+    start = 0
+    if matches and len(text) > width:
+        start = max(0, min(matches[0].start() - width // 4, len(text) - width))
+    end = min(len(text), start + width)
+
+    parts, position = [], start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(escape(text[position:match.start()]))
+        parts.append(f"<mark>{escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(escape(text[position:end]))
+    return ('…' if start else '') + ''.join(parts) + ('…' if end < len(text) else '')
+
+
+def _doc(faq):
+    return {'id': str(faq.id), 'question': faq.question, 'answer': faq.answer}
+
+
+_lock = threading.Lock()
+_local = {'version': None, 'index': None}
+
+
+def _current_version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def _load(version):
+    """Index for the given version: the shared snapshot, or a rebuild from the table if it was evicted."""
+    docs = cache.get(SNAPSHOT_KEY.format(version))
+    if docs is None:
+        from .models import FAQ
+        docs = [_doc(faq) for faq in FAQ.objects.only('id', 'question', 'answer').iterator()]
+        cache.set(SNAPSHOT_KEY.format(version), docs, SNAPSHOT_TIMEOUT)
+    return FAQIndex(docs)
+
+
+def get_index():
+    """This worker's index, reloaded only when another worker published a newer version."""
+    version = _current_version()
+    if _local['version'] != version:
+        with _lock:
+            if _local['version'] != version:
+                _local['index'] = _load(version)
+                _local['version'] = version
+    return _local['index']
+
+
+def _acquire_publish_lock():
+    """Serialize publishes across workers, so none builds on a snapshot another is replacing."""
+    token = uuid.uuid4().hex
+    while not cache.add(PUBLISH_LOCK_KEY, token, PUBLISH_LOCK_TIMEOUT):
+        time.sleep(0.05)
+    return token
+
+
+def _release_publish_lock(token):
+    # Only release our own lock, it may have expired and been taken by another worker
+    if cache.get(PUBLISH_LOCK_KEY) == token:
+        cache.delete(PUBLISH_LOCK_KEY)
+
+
+def _publish(change):
+    with _lock:
+        token = _acquire_publish_lock()
+        try:
+            version = _current_version()
+            # Change a copy, searches in other threads keep reading the old index
+            index = _local['index'].copy() if _local['version'] == version else _load(version)
+            change(index)
+            try:
+                new_version = cache.incr(VERSION_KEY)
+            except ValueError:
+                new_version = time.time_ns()
+                cache.set(VERSION_KEY, new_version, None)
+            cache.set(SNAPSHOT_KEY.format(new_version), list(index.docs.values()), SNAPSHOT_TIMEOUT)
+            cache.delete(SNAPSHOT_KEY.format(version))
+            _local['index'], _local['version'] = index, new_version
+        finally:
+            _release_publish_lock(token)
+
+
+def faq_saved(sender, instance, **kwargs):
+    doc = _doc(instance)
+    transaction.on_commit(lambda: _publish(lambda index: index.add(doc)))
+
+
+def faq_deleted(sender, instance, **kwargs):
+    doc_id = str(instance.id)
+    transaction.on_commit(lambda: _publish(lambda index: index.remove(doc_id)))
+
+
+def search_faqs(query, limit=10):
+    return get_index().search(query, limit)
@@ -1,10 +1,13 @@
 from rest_framework import serializers
 from .models import FAQ
+from authentication.direct_upload import DirectUploadField
 
 class FAQSerializer(serializers.ModelSerializer):
+    attachment_token = DirectUploadField(target='faq_attachment', source='attachment')
+
     class Meta:
         model = FAQ
-        fields = ['id', 'question', 'answer', 'attachment', 'created_at']
+        fields = ['id', 'question', 'answer', 'attachment', 'attachment_token', 'created_at']
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
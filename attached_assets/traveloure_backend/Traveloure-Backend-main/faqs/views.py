@@ -4,6 +4,9 @@ from .serializers import FAQSerializer
 from rest_framework.viewsets import ModelViewSet
 from authentication.utils import CustomPagination
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .search import search_faqs
 
 class FAQPermission(BasePermission):
     """
@@ -30,4 +33,16 @@ class FAQViewSet(ModelViewSet):
     queryset = FAQ.objects.all().order_by('-created_at')
     serializer_class = FAQSerializer
     permission_classes = [FAQPermission]
-    pagination_class = CustomPagination
\ No newline at end of file
+    pagination_class = CustomPagination
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked search over questions and answers, served from the in-memory index."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"message": "Query parameter 'q' is required", "status": False}, status=400)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return Response({"message": "Fetched Successfully", "data": search_faqs(query, limit), "status": True}, status=200)
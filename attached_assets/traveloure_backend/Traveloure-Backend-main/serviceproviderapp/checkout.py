@@ -0,0 +1,142 @@
+import hashlib
+import logging
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ServiceCheckoutSession
+
+logger = logging.getLogger('travelDNA')
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+# Cap how long a worker can wait on Stripe. Retries re-send the same idempotency key,
+# so a retried create never opens a second session.
+stripe.default_http_client = stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT_SECONDS)
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+
+# Stop handing out a session shortly before Stripe expires it, so the buyer has time to pay.
+REUSE_MARGIN = timedelta(minutes=5)
+# Stripe refuses an expires_at less than 30 minutes ahead, so a session not created on Stripe
+# yet can only be retried until then.
+PENDING_MARGIN = timedelta(minutes=30)
+
+
+def _derived_idempotency_key(buyer, service, amount_in_cents):
+    """
+    Key used when the client sends no Idempotency-Key header. It includes how many sessions
+    were already opened for this buyer/service/amount, so concurrent clicks share a key while
+    a fresh session can still be opened once the previous one expires (or failed to be created
+    in time).
+    """
+    generation = ServiceCheckoutSession.objects.filter(
+        buyer=buyer, service=service, amount_in_cents=amount_in_cents
+    ).exclude(
+        # A session still being created keeps its key, so its retries reach the same row
+        stripe_session_id__isnull=True, expires_at__gt=timezone.now() + PENDING_MARGIN,
+    ).count()
+    raw = f"service-checkout:{buyer.id}:{service.id}:{amount_in_cents}:{generation}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _stripe_idempotency_key(buyer, key):
+    """Stripe scopes idempotency keys to the whole account, so client keys are made per buyer."""
+    return hashlib.sha256(f"{buyer.id}:{key}".encode()).hexdigest()
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The Idempotency-Key was already used for another service or amount."""
+
+
+class IdempotencyKeyUsed(Exception):
+    """The Idempotency-Key belongs to a session that was paid or has expired."""
+
+
+def _open_sessions():
+    return ServiceCheckoutSession.objects.filter(
+        stripe_session_id__isnull=False,
+        completed_at__isnull=True,
+        expires_at__gt=timezone.now() + REUSE_MARGIN,
+    )
+
+
+def _reusable(session):
+    margin = REUSE_MARGIN if session.stripe_session_id else PENDING_MARGIN
+    return not session.completed_at and session.expires_at > timezone.now() + margin
+
+
+def find_open_checkout_session(buyer, service, amount_in_cents, idempotency_key=None):
+    """
+    Return a reusable session for this buyer/service/amount, or None. A session opened under
+    the Idempotency-Key is only returned for the same service and amount while still open;
+    otherwise IdempotencyKeyMismatch or IdempotencyKeyUsed is raised. None too for a key whose
+    session is still being created on Stripe.
+    """
+    if idempotency_key:
+        session = ServiceCheckoutSession.objects.filter(buyer=buyer, idempotency_key=idempotency_key).first()
+        if session:
+            if session.service_id != service.id or session.amount_in_cents != amount_in_cents:
+                raise IdempotencyKeyMismatch()
+            if not _reusable(session):
+                raise IdempotencyKeyUsed()
+            return session if session.stripe_session_id else None
+
+    return _open_sessions().filter(
+        buyer=buyer,
+        service=service,
+        amount_in_cents=amount_in_cents,
+    ).order_by('-expires_at').first()
+
+
+def mark_completed(stripe_session_ids):
+    """Stop reusing the sessions Stripe reported as completed."""
+    ServiceCheckoutSession.objects.filter(
+        stripe_session_id__in=stripe_session_ids, completed_at__isnull=True
+    ).update(completed_at=timezone.now())
+
+
+def get_or_create_checkout_session(buyer, service, amount_in_cents, checkout_data, idempotency_key=None):
+    """
+    Reuse the buyer's open Checkout session for this service and amount, otherwise create one
+    on Stripe with an idempotency key and persist it. Raises stripe.error.StripeError, and
+    IdempotencyKeyMismatch / IdempotencyKeyUsed for a client key that cannot be reused.
+    """
+    session = find_open_checkout_session(buyer, service, amount_in_cents, idempotency_key)
+    if session:
+        return session
+
+    key = idempotency_key or _derived_idempotency_key(buyer, service, amount_in_cents)
+    # Stripe rejects a reused idempotency key sent with different parameters, so the first
+    # request under a key stores expires_at and every retry sends that same value.
+    pending, created = ServiceCheckoutSession.objects.get_or_create(
+        buyer=buyer,
+        idempotency_key=key,
+        defaults={
+            'service': service,
+            'amount_in_cents': amount_in_cents,
+            'expires_at': timezone.now() + timedelta(seconds=settings.STRIPE_CHECKOUT_SESSION_TTL),
+        },
+    )
+    if pending.service_id != service.id or pending.amount_in_cents != amount_in_cents:
+        raise IdempotencyKeyMismatch()
+    if not created and not _reusable(pending):
+        raise IdempotencyKeyUsed()
+    if pending.stripe_session_id:
+        return pending
+
+    stripe_session = stripe.checkout.Session.create(
+        **checkout_data,
+        expires_at=int(pending.expires_at.timestamp()),
+        idempotency_key=_stripe_idempotency_key(buyer, key),
+    )
+
+    pending.stripe_session_id = stripe_session.id
+    pending.checkout_url = stripe_session.url
+    # Concurrent requests under the key got the same session from Stripe and store the same values
+    ServiceCheckoutSession.objects.filter(id=pending.id).update(
+        stripe_session_id=pending.stripe_session_id,
+        checkout_url=pending.checkout_url,
+    )
+    logger.info(f"Created checkout session {stripe_session.id} for service {service.id}")
+    return pending
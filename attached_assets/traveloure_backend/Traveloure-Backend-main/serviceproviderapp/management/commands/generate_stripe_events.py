@@ -0,0 +1,76 @@
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Send signed fake Stripe webhook events to a local server for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/service/webhook/stripe/")
+        parser.add_argument("--count", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--user-id", required=True, help="User credited by the fake wallet recharges")
+        parser.add_argument("--duplicate-rate", type=float, default=0.2,
+                            help="Share of deliveries that resend an earlier event, like Stripe retries")
+
+    def handle(self, *args, **options):
+        events = []
+        for _ in range(options["count"]):
+            if events and random.random() < options["duplicate_rate"]:
+                events.append(random.choice(events))
+            else:
+                events.append(self.wallet_recharge_event(options["user_id"]))
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            statuses = list(pool.map(lambda event: self.send(options["url"], event), events))
+        elapsed = time.monotonic() - started
+
+        failed = sum(1 for code in statuses if code != 200)
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {len(events)} event(s) in {elapsed:.2f}s ({len(events) / elapsed:.0f}/s), {failed} failed"
+        ))
+
+    def wallet_recharge_event(self, user_id):
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        return {
+            "id": f"evt_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": "checkout.session.completed",
+            "created": int(time.time()),
+            "data": {
+                "object": {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "payment_status": "paid",
+                    "status": "complete",
+                    "amount_total": 1000,
+                    "metadata": {"type": "wallet_recharge", "user_id": user_id, "amount": "10"},
+                }
+            },
+        }
+
+    def send(self, url, event):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            settings.STRIPE_WEBHOOK_SECRET.encode(),
+            f"{timestamp}.{payload}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        response = requests.post(
+            url,
+            data=payload,
+            headers={"Content-Type": "application/json", "Stripe-Signature": f"t={timestamp},v1={signature}"},
+            timeout=10,
+        )
+        return response.status_code
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from serviceproviderapp.stripe_events import process_pending_events
+
+
+class Command(BaseCommand):
+    help = "Apply pending Stripe webhook events from the inbox in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the inbox is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the inbox and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                handled = process_pending_events(batch_size=options["batch_size"])
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Batch failed: {e}"))
+                handled = 0
+                if options["once"]:
+                    return
+            if handled:
+                self.stdout.write(f"Processed {handled} event(s)")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["sleep"])
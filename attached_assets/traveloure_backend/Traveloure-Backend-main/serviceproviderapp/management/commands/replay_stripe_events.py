@@ -0,0 +1,63 @@
+import json
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from serviceproviderapp.models import StripeEvent
+from serviceproviderapp.stripe_events import record_event
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+
+class Command(BaseCommand):
+    help = "Re-queue Stripe events from the inbox, or pull missed events from Stripe into it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event-id", action="append", default=[], help="Event id to replay (repeatable)")
+        parser.add_argument("--type", help="Only replay events of this type")
+        parser.add_argument("--since", help="Only replay events created at or after this ISO datetime")
+        parser.add_argument("--failed", action="store_true", help="Only replay events that recorded an error")
+        parser.add_argument("--fetch", action="store_true", help="Fetch events from the Stripe API before replaying")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO datetime")
+        # Checked before --fetch, so a missing filter never downloads Stripe's whole event history
+        if not any([options["event_id"], options["type"], since, options["failed"]]):
+            raise CommandError("Pass at least one of --event-id, --type, --since or --failed")
+
+        if options["fetch"]:
+            self.fetch_from_stripe(options, since)
+
+        events = StripeEvent.objects.all()
+        if options["event_id"]:
+            events = events.filter(event_id__in=options["event_id"])
+        if options["type"]:
+            events = events.filter(event_type=options["type"])
+        if since:
+            events = events.filter(stripe_created__gte=int(since.timestamp()))
+        if options["failed"]:
+            events = events.exclude(last_error='')
+
+        count = events.update(processed_at=None, attempts=0, last_error='')
+        self.stdout.write(self.style.SUCCESS(f"Re-queued {count} event(s)"))
+
+    def fetch_from_stripe(self, options, since):
+        params = {"limit": 100}
+        if options["type"]:
+            params["type"] = options["type"]
+        if since:
+            params["created"] = {"gte": int(since.timestamp())}
+
+        added = 0
+        if options["event_id"]:
+            events = (stripe.Event.retrieve(event_id) for event_id in options["event_id"])
+        else:
+            events = stripe.Event.list(**params).auto_paging_iter()
+        for event in events:
+            if record_event(json.loads(str(event))):
+                added += 1
+        self.stdout.write(f"Fetched {added} new event(s) from Stripe")
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:12
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serviceproviderapp', '0004_allservice_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceCheckoutSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('amount_in_cents', models.PositiveIntegerField()),
+                ('idempotency_key', models.CharField(max_length=255)),
+                ('stripe_session_id', models.CharField(max_length=255, unique=True)),
+                ('checkout_url', models.TextField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_checkout_sessions', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkout_sessions', to='serviceproviderapp.allservice')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['buyer', 'service', 'amount_in_cents', '-expires_at'], name='svc_checkout_open_idx')],
+                'unique_together': {('buyer', 'idempotency_key')},
+            },
+        ),
+    ]
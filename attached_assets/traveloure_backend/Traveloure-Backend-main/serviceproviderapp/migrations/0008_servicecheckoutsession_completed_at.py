@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serviceproviderapp', '0007_allservice_latitude_longitude_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecheckoutsession',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
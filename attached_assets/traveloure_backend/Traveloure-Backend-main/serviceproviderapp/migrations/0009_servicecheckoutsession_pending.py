@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serviceproviderapp', '0008_servicecheckoutsession_completed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='servicecheckoutsession',
+            name='stripe_session_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='servicecheckoutsession',
+            name='checkout_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
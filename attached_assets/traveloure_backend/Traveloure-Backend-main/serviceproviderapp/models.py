@@ -1,5 +1,7 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from authentication.models import User, get_dynamic_storage
+from ai_itinerary.geo import encode_geohash
 import uuid
 
 # Create your models here.
@@ -17,4 +19,64 @@ class AllService(models.Model):
     location = models.CharField(max_length=255, default="India", help_text="Service location (city, area, etc.)")
     availability = models.JSONField(default=list, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    form_status = models.CharField(max_length=50, default='pending', null=True, blank=True)
\ No newline at end of file
+    form_status = models.CharField(max_length=50, default='pending', null=True, blank=True)
+    # Optional map position; approved services with one are shown on the cluster map
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        has_point = self.latitude is not None and self.longitude is not None
+        self.geohash = encode_geohash(self.latitude, self.longitude) if has_point else ''
+        if kwargs.get('update_fields') is not None and {'latitude', 'longitude'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'geohash'}
+        super().save(*args, **kwargs)
+
+class ServiceCheckoutSession(models.Model):
+    '''
+    Stripe Checkout session opened by a buyer for a service. Reused while it is still open
+    so retries and double clicks don't create a new session on Stripe. Stored before Stripe is
+    called, so stripe_session_id stays NULL until the session exists there.
+    '''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='service_checkout_sessions')
+    service = models.ForeignKey(AllService, on_delete=models.CASCADE, related_name='checkout_sessions')
+    amount_in_cents = models.PositiveIntegerField()
+    idempotency_key = models.CharField(max_length=255)
+    stripe_session_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    checkout_url = models.TextField(blank=True, default='')
+    expires_at = models.DateTimeField()
+    # Set by the checkout.session.completed event; a paid session is never handed out again
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('buyer', 'idempotency_key')
+        indexes = [
+            models.Index(fields=['buyer', 'service', 'amount_in_cents', '-expires_at'], name='svc_checkout_open_idx'),
+        ]
+
+
+class StripeEvent(models.Model):
+    '''
+    Inbox of verified Stripe webhook events. The webhook only appends here; the
+    process_stripe_events worker applies them in batches.
+    '''
+    event_id = models.CharField(max_length=255, primary_key=True)
+    event_type = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=255, blank=True, default='')
+    payload = models.JSONField()
+    stripe_created = models.PositiveBigIntegerField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'stripe_created'], name='stripe_event_pending_idx'),
+            models.Index(fields=['object_id', 'stripe_created'], name='stripe_event_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
@@ -1,15 +1,22 @@
 from rest_framework import serializers
 from .models import AllService
 from ai_itinerary.serializers import UserSerializer
+from authentication.direct_upload import DirectUploadField
+from authentication.image_variants import variant_srcset
 
 
 class AllServiceSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     location = serializers.CharField(max_length=255, required=True, help_text="Service location is required")
+    service_file_token = DirectUploadField(target='service_file', source='service_file')
+    service_file_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = AllService
         fields = '__all__'
+
+    def get_service_file_variants(self, obj):
+        return variant_srcset(obj.service_file, self.context.get('request'))
     
     def validate_location(self, value):
         """Ensure location is not empty or just whitespace"""
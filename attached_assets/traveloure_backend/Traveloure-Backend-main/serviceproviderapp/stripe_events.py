@@ -0,0 +1,416 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+import stripe
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, BooleanField, Q, Value, When
+from django.utils import timezone
+
+from authentication.models import User
+from subscription.models import (
+    Wallet, WalletTransaction, TransactionType, PaymentStatus,
+    UserAndExpertContract, ContractTransaction, ServiceTransaction,
+)
+from .checkout import mark_completed
+from .models import AllService, StripeEvent
+
+logger = logging.getLogger('travelDNA')
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+# Events failing this many times are left in the inbox for replay_stripe_events
+MAX_ATTEMPTS = 5
+# A paid PaymentIntent keeps its latest charge, so a lookup is reused by later worker loops
+CHARGE_ID_KEY = 'stripe:latest-charge:{}'
+CHARGE_ID_CACHE_SECONDS = 24 * 3600
+
+
+def record_event(event):
+    """
+    Append a verified Stripe event to the inbox. Returns False when the event id
+    was already recorded (Stripe retries deliver the same id).
+    """
+    data_object = event['data']['object']
+    try:
+        with transaction.atomic():
+            StripeEvent.objects.create(
+                event_id=event['id'],
+                event_type=event['type'],
+                object_id=data_object.get('id') or '',
+                payload=event,
+                stripe_created=event['created'],
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def _claim_batch(batch_size):
+    """
+    Lock the oldest pending events, skipping rows other workers hold. Events whose
+    object still has an older pending event outside the batch are dropped, so each
+    object's events are always applied in order.
+    """
+    events = list(
+        StripeEvent.objects.select_for_update(skip_locked=True)
+        .filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+        .order_by('stripe_created', 'received_at')[:batch_size]
+    )
+    if not events:
+        return []
+
+    first_seen = {}
+    for event in events:
+        if event.object_id:
+            first_seen.setdefault(event.object_id, event.stripe_created)
+
+    older = Q()
+    for object_id, created in first_seen.items():
+        older |= Q(object_id=object_id, stripe_created__lt=created)
+    blocked = set()
+    if first_seen:
+        blocked = set(
+            StripeEvent.objects.filter(older, processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+            .exclude(event_id__in=[e.event_id for e in events])
+            .values_list('object_id', flat=True)
+        )
+    return [e for e in events if e.object_id not in blocked]
+
+
+class _EventBatch:
+    """
+    Collects the state changes of a batch of events and writes them with bulk queries.
+    charge_ids maps PaymentIntent ids to their latest charge, fetched before the batch was locked.
+    """
+
+    def __init__(self, charge_ids=None):
+        self.charge_ids = charge_ids or {}
+        self.missing_charges = []
+        self.onboarding = {}
+        self.wallet_credits = defaultdict(list)
+        self.service_payments = []
+        self.contract_payments = []
+        self.notifications = []
+        self.completed_sessions = []
+
+    def add(self, event):
+        data_object = event.payload['data']['object']
+        if event.event_type == 'account.updated':
+            # Later events for the same account overwrite earlier ones
+            self.onboarding[data_object['id']] = bool(
+                data_object.get('charges_enabled')
+                and data_object.get('payouts_enabled')
+                and data_object.get('details_submitted')
+            )
+            return None
+
+        if event.event_type != 'checkout.session.completed':
+            return None
+
+        self.completed_sessions.append(data_object['id'])
+        metadata = data_object.get('metadata') or {}
+        payment_type = metadata.get('type') or metadata.get('payment_type')
+        if payment_type == 'wallet_recharge':
+            amount = float(metadata.get('amount', 0))
+            if amount <= 0:
+                return "Wallet recharge without a positive amount"
+            self.wallet_credits[metadata.get('user_id')].append((amount, data_object['id']))
+        elif payment_type == 'service_payment':
+            self.service_payments.append(data_object)
+        elif payment_type == TransactionType.CONTRACT_TRANSACTION:
+            self.contract_payments.append(data_object)
+        return None
+
+    def flush(self):
+        if self.completed_sessions:
+            mark_completed(self.completed_sessions)
+        self._apply_onboarding()
+        self._apply_wallet_recharges()
+        self._apply_service_payments()
+        self._apply_contract_payments()
+        notifications = self.notifications
+        transaction.on_commit(lambda: _send_notifications(notifications))
+        if self.missing_charges:
+            missing_charges = self.missing_charges
+            transaction.on_commit(lambda: _fill_charge_ids(missing_charges))
+
+    def _apply_onboarding(self):
+        if not self.onboarding:
+            return
+        User.objects.filter(stripe_account_id__in=self.onboarding).update(
+            stripe_onboarding_complete=Case(
+                *[When(stripe_account_id=account_id, then=Value(complete)) for account_id, complete in self.onboarding.items()],
+                output_field=BooleanField(),
+            )
+        )
+
+    def _apply_wallet_recharges(self):
+        if not self.wallet_credits:
+            return
+        session_ids = [session_id for payments in self.wallet_credits.values() for _, session_id in payments]
+        already_applied = set(
+            WalletTransaction.objects.filter(stripe_payment_intent_id__in=session_ids)
+            .values_list('stripe_payment_intent_id', flat=True)
+        )
+        user_ids = set(User.objects.filter(id__in=self.wallet_credits).values_list('id', flat=True))
+        Wallet.objects.bulk_create(
+            [Wallet(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        wallet_ids = {
+            str(user_id): wallet_id
+            for user_id, wallet_id in Wallet.objects.filter(user_id__in=user_ids).values_list('user_id', 'id')
+        }
+
+        credits_by_wallet = defaultdict(int)
+        wallet_transactions = []
+        for user_id, payments in self.wallet_credits.items():
+            wallet_id = wallet_ids.get(str(user_id))
+            if wallet_id is None:
+                logger.error(f"Wallet recharge for unknown user {user_id}")
+                continue
+            for amount, session_id in payments:
+                if session_id in already_applied:
+                    continue
+                already_applied.add(session_id)
+                # 1$ = 2 credits, same as Wallet.add_credits
+                credits = int(amount * 2)
+                credits_by_wallet[wallet_id] += credits
+                wallet_transactions.append(WalletTransaction(
+                    wallet_id=wallet_id,
+                    transaction_type='CREDIT_RECHARGE',
+                    amount=Decimal(str(amount)),
+                    credits=credits,
+                    description=f"Credit recharge via Stripe: ${amount} = {credits} credits",
+                    stripe_payment_intent_id=session_id,
+                ))
+
+        if credits_by_wallet:
+            Wallet.objects.filter(id__in=credits_by_wallet).update(
+                credits=F('credits') + Case(
+                    *[When(id=wallet_id, then=Value(credits)) for wallet_id, credits in credits_by_wallet.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            WalletTransaction.objects.bulk_create(wallet_transactions)
+
+    def _apply_service_payments(self):
+        if not self.service_payments:
+            return
+        session_ids = [session['id'] for session in self.service_payments]
+        already_applied = set(
+            ServiceTransaction.objects.filter(payment_intent_id__in=session_ids)
+            .values_list('payment_intent_id', flat=True)
+        )
+        services = {
+            str(service.id): service
+            for service in AllService.objects.filter(
+                id__in=[s['metadata'].get('service_id') for s in self.service_payments]
+            )
+        }
+
+        service_transactions = []
+        for session in self.service_payments:
+            if session['id'] in already_applied:
+                continue
+            already_applied.add(session['id'])
+            metadata = session['metadata']
+            service = services.get(metadata.get('service_id'))
+            if not service:
+                logger.error(f"Service payment {session['id']} for unknown service {metadata.get('service_id')}")
+                continue
+            service_transactions.append(ServiceTransaction(
+                buyer_id=metadata.get('buyer_id'),
+                service=service,
+                seller_id=metadata.get('seller_id'),
+                amount=Decimal(metadata.get('service_amount') or '0'),
+                currency='usd',
+                payment_intent_id=session['id'],
+                status='succeeded' if session.get('payment_status') == 'paid' else 'pending',
+            ))
+        ServiceTransaction.objects.bulk_create(service_transactions)
+
+    def _charge_id(self, session):
+        payment_intent_id = session.get('payment_intent')
+        if payment_intent_id and payment_intent_id not in self.charge_ids:
+            # Claimed without being prefetched; looked up once the locks are released
+            self.missing_charges.append((session['id'], payment_intent_id))
+        return self.charge_ids.get(payment_intent_id)
+
+    def _apply_contract_payments(self):
+        if not self.contract_payments:
+            return
+        session_ids = [session['id'] for session in self.contract_payments]
+        already_applied = set(
+            ContractTransaction.objects.filter(transaction_id__in=session_ids)
+            .values_list('transaction_id', flat=True)
+        )
+        contracts = {
+            str(contract.id): contract
+            for contract in UserAndExpertContract.objects.filter(
+                id__in=[s['metadata'].get('contract_id') for s in self.contract_payments]
+            )
+        }
+
+        paid_contract_ids = []
+        contract_transactions = []
+        for session in self.contract_payments:
+            if session['id'] in already_applied:
+                continue
+            already_applied.add(session['id'])
+            metadata = session['metadata']
+            contract = contracts.get(metadata.get('contract_id'))
+            if not contract:
+                logger.error(f"Contract payment {session['id']} for unknown contract {metadata.get('contract_id')}")
+                continue
+
+            payment_succeeded = session.get('payment_status') == 'paid' and session.get('status') == 'complete'
+            if payment_succeeded:
+                paid_contract_ids.append(contract.id)
+
+            amount = (session.get('amount_total') or 0) / 100
+            contract_transactions.append(ContractTransaction(
+                contract_id=contract,
+                user_id_id=metadata.get('user_id'),
+                expert_id_id=metadata.get('expert_id'),
+                transaction_id=session['id'],
+                transaction_type=TransactionType.CONTRACT_TRANSACTION,
+                payment_status=PaymentStatus.SUCCEEDED if payment_succeeded else PaymentStatus.REQUIRES_CONFIRMATION,
+                is_succeeded=payment_succeeded,
+                stripe_charge_id=self._charge_id(session),
+                paid_to_expert=False,
+                amount=amount,
+            ))
+            payload = {
+                "contract_id": str(contract.id),
+                "title": contract.title,
+                "amount": amount,
+                "message": "Contract payment completed successfully",
+                "created_at": timezone.now().isoformat(),
+            }
+            for user_id in (metadata.get('user_id'), metadata.get('expert_id')):
+                if user_id:
+                    self.notifications.append((f"user_{user_id}", payload))
+
+        if paid_contract_ids:
+            UserAndExpertContract.objects.filter(id__in=paid_contract_ids).update(is_paid=True)
+        ContractTransaction.objects.bulk_create(contract_transactions)
+
+
+def _latest_charge_id(payment_intent_id):
+    if not payment_intent_id:
+        return None
+    try:
+        return stripe.PaymentIntent.retrieve(payment_intent_id).get("latest_charge")
+    except stripe.error.StripeError as e:
+        logger.warning(f"Could not retrieve PaymentIntent {payment_intent_id}: {e}")
+        return None
+
+
+def _fill_charge_ids(missing_charges):
+    for session_id, payment_intent_id in missing_charges:
+        charge_id = _latest_charge_id(payment_intent_id)
+        if charge_id:
+            ContractTransaction.objects.filter(transaction_id=session_id, stripe_charge_id__isnull=True).update(
+                stripe_charge_id=charge_id
+            )
+
+
+def _send_notifications(notifications):
+    channel_layer = get_channel_layer()
+    for group, payload in notifications:
+        async_to_sync(channel_layer.group_send)(group, {"type": "contract_payment_success", "payload": payload})
+
+
+def _prefetch_charge_ids(batch_size):
+    """
+    Latest charge ids of the contract payments among the next pending events. Stripe is called
+    here, before the batch is claimed, so no row lock is held across network calls. Only first
+    attempts are looked up, and each PaymentIntent once: retried events get theirs after commit.
+    """
+    pending = (
+        StripeEvent.objects.filter(
+            processed_at__isnull=True, attempts=0, event_type='checkout.session.completed'
+        )
+        .order_by('stripe_created', 'received_at')
+        .values_list('payload', flat=True)[:batch_size]
+    )
+    keys = {}
+    for payload in pending:
+        session = payload['data']['object']
+        metadata = session.get('metadata') or {}
+        payment_type = metadata.get('type') or metadata.get('payment_type')
+        payment_intent_id = session.get('payment_intent')
+        if payment_type == TransactionType.CONTRACT_TRANSACTION and payment_intent_id:
+            keys[CHARGE_ID_KEY.format(payment_intent_id)] = payment_intent_id
+
+    charge_ids = {keys[key]: charge_id for key, charge_id in cache.get_many(list(keys)).items()}
+    fetched = {}
+    for key, payment_intent_id in keys.items():
+        if payment_intent_id not in charge_ids:
+            charge_ids[payment_intent_id] = _latest_charge_id(payment_intent_id)
+            if charge_ids[payment_intent_id]:
+                fetched[key] = charge_ids[payment_intent_id]
+    if fetched:
+        cache.set_many(fetched, CHARGE_ID_CACHE_SECONDS)
+    return charge_ids
+
+
+def _apply(events, charge_ids):
+    batch = _EventBatch(charge_ids)
+    errors = {}
+    for event in events:
+        error = batch.add(event)
+        if error:
+            errors[event.event_id] = error
+    batch.flush()
+
+    now = timezone.now()
+    for event in events:
+        event.processed_at = now
+        event.attempts += 1
+        event.last_error = errors.get(event.event_id, '')
+    StripeEvent.objects.bulk_update(events, ['processed_at', 'attempts', 'last_error'])
+
+
+def process_pending_events(batch_size=500):
+    """
+    Apply one batch of pending inbox events. Returns the number of events handled.
+    When the batch as a whole fails, its events are applied one at a time, each in its own
+    savepoint, so only the events that fail themselves have their attempts counter bumped.
+    """
+    charge_ids = _prefetch_charge_ids(batch_size)
+    with transaction.atomic():
+        events = _claim_batch(batch_size)
+        if not events:
+            return 0
+        try:
+            with transaction.atomic():
+                _apply(events, charge_ids)
+            return len(events)
+        except Exception as e:
+            logger.warning(f"Stripe event batch failed, applying its {len(events)} events one by one: {e}")
+
+        failed_objects = set()
+        for event in events:
+            # A later event of an object whose earlier event failed waits for that one
+            if event.object_id and event.object_id in failed_objects:
+                continue
+            try:
+                with transaction.atomic():
+                    _apply([event], charge_ids)
+            except Exception as e:
+                logger.error(f"Stripe event {event.event_id} failed: {e}")
+                if event.object_id:
+                    failed_objects.add(event.object_id)
+                StripeEvent.objects.filter(event_id=event.event_id).update(
+                    attempts=F('attempts') + 1, last_error=str(e)
+                )
+    return len(events)
@@ -1,3 +1,183 @@
+from datetime import timedelta
+from unittest import mock
+
+import stripe
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from subscription.models import TransactionType
+
+from .checkout import mark_completed
+from .models import AllService, ServiceCheckoutSession, StripeEvent, User
+from .stripe_events import _prefetch_charge_ids, process_pending_events, record_event
+
+
+def _stripe_session(n, expires_at):
+    return mock.Mock(id=f"cs_test_{n}", url=f"https://checkout.stripe.com/c/cs_test_{n}", expires_at=expires_at)
+
+
+def _stripe_event(event_id, event_type, data_object, created):
+    return {'id': event_id, 'type': event_type, 'created': created, 'data': {'object': data_object}}
+
+
+def _account_updated(event_id, account_id, complete, created):
+    account = {'id': account_id, 'charges_enabled': complete, 'payouts_enabled': complete, 'details_submitted': complete}
+    return _stripe_event(event_id, 'account.updated', account, created)
+
+
+class PayForServiceCheckoutTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user(email='seller@example.com', username='seller')
+        self.service = AllService.objects.create(user=seller, service_name='Food tour', price='100')
+        self.buyer = User.objects.create_user(email='buyer@example.com', username='buyer')
+        self.url = reverse('pay-service', args=[self.service.id])
+
+        self.created = []
+
+        def create(**params):
+            self.created.append(params)
+            return _stripe_session(len(self.created), params['expires_at'])
+
+        patcher = mock.patch('stripe.checkout.Session.create', side_effect=create)
+        self.create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pay(self, buyer=None, key=None, service=None):
+        client = APIClient()
+        client.force_authenticate(buyer or self.buyer)
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        url = reverse('pay-service', args=[service.id]) if service else self.url
+        return client.post(url, **headers)
+
+    def test_retry_reuses_the_open_session(self):
+        first = self.pay(key='click-1')
+        second = self.pay(key='click-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.created), 1)
+
+    def test_requests_without_a_key_reuse_the_open_session(self):
+        first = self.pay()
+        second = self.pay()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.created), 1)
+
+    def test_buyers_sending_the_same_key_get_their_own_stripe_key(self):
+        other = User.objects.create_user(email='other@example.com', username='other')
+        self.assertEqual(self.pay(key='same').status_code, 200)
+        self.assertEqual(self.pay(buyer=other, key='same').status_code, 200)
+        keys = [params['idempotency_key'] for params in self.created]
+        self.assertEqual(len(set(keys)), 2)
+        self.assertNotIn('same', keys)
+
+    def test_retry_after_a_failure_sends_the_same_parameters(self):
+        self.create.side_effect = [stripe.error.APIConnectionError('connection reset'), _stripe_session(1, 0)]
+        # The retry lands in the next minute
+        start = timezone.now().replace(second=59)
+        with mock.patch('django.utils.timezone.now', return_value=start):
+            self.assertEqual(self.pay(key='click-1').status_code, 400)
+        with mock.patch('django.utils.timezone.now', return_value=start + timedelta(seconds=2)):
+            self.assertEqual(self.pay(key='click-1').status_code, 200)
+
+        first, second = (call.kwargs for call in self.create.call_args_list)
+        self.assertEqual(first['expires_at'], second['expires_at'])
+        self.assertEqual(first['idempotency_key'], second['idempotency_key'])
+
+    def test_key_reused_for_another_service_is_rejected(self):
+        other = AllService.objects.create(user=self.service.user, service_name='Boat trip', price='80')
+        self.pay(key='click-1')
+        response = self.pay(key='click-1', service=other)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.created), 1)
+
+    def test_key_of_a_paid_session_is_rejected(self):
+        self.pay(key='click-1')
+        mark_completed(['cs_test_1'])
+        response = self.pay(key='click-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(self.created), 1)
+
+    def test_paid_session_is_not_handed_out_again(self):
+        self.pay()
+        mark_completed(['cs_test_1'])
+        response = self.pay()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['checkout_url'], 'https://checkout.stripe.com/c/cs_test_2')
+        self.assertEqual(ServiceCheckoutSession.objects.filter(buyer=self.buyer).count(), 2)
+
+
+class StripeEventInboxTests(TestCase):
+    def setUp(self):
+        self.expert = User.objects.create_user(
+            email='expert@example.com', username='expert', stripe_account_id='acct_1'
+        )
+
+    def onboarding_complete(self):
+        self.expert.refresh_from_db()
+        return self.expert.stripe_onboarding_complete
+
+    def test_duplicate_event_ids_are_stored_once(self):
+        event = _account_updated('evt_1', 'acct_1', True, 100)
+        self.assertTrue(record_event(event))
+        self.assertFalse(record_event(event))
+        self.assertEqual(StripeEvent.objects.filter(event_id='evt_1').count(), 1)
+
+        self.assertEqual(process_pending_events(), 1)
+        self.assertFalse(record_event(event))
+        self.assertEqual(process_pending_events(), 0)
+
+    def test_events_of_an_object_apply_in_stripe_order(self):
+        # Delivered out of order: the later state must win
+        record_event(_account_updated('evt_2', 'acct_1', True, 200))
+        record_event(_account_updated('evt_1', 'acct_1', False, 100))
+        process_pending_events()
+        self.assertTrue(self.onboarding_complete())
+
+        record_event(_account_updated('evt_3', 'acct_1', False, 300))
+        process_pending_events(batch_size=1)
+        self.assertFalse(self.onboarding_complete())
+
+    def test_failing_event_is_isolated_from_the_batch(self):
+        bad_session = {'id': 'cs_bad', 'metadata': {'type': 'wallet_recharge', 'amount': 'ten'}}
+        record_event(_stripe_event('evt_bad', 'checkout.session.completed', bad_session, 100))
+        record_event(_account_updated('evt_ok', 'acct_1', True, 110))
+        record_event(_stripe_event('evt_later', 'checkout.session.expired', {'id': 'cs_bad'}, 120))
+
+        self.assertEqual(process_pending_events(), 3)
+
+        bad = StripeEvent.objects.get(event_id='evt_bad')
+        self.assertIsNone(bad.processed_at)
+        self.assertEqual(bad.attempts, 1)
+        self.assertTrue(bad.last_error)
+        ok = StripeEvent.objects.get(event_id='evt_ok')
+        self.assertIsNotNone(ok.processed_at)
+        self.assertEqual(ok.attempts, 1)
+        self.assertTrue(self.onboarding_complete())
+        # The later event of the failed session waits for it, without using up an attempt
+        later = StripeEvent.objects.get(event_id='evt_later')
+        self.assertIsNone(later.processed_at)
+        self.assertEqual(later.attempts, 0)
+
+    def test_charge_ids_are_fetched_once_and_not_for_retries(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        def contract_payment(event_id, payment_intent_id):
+            session = {
+                'id': f"cs_{event_id}",
+                'payment_intent': payment_intent_id,
+                'metadata': {'type': TransactionType.CONTRACT_TRANSACTION},
+            }
+            record_event(_stripe_event(event_id, 'checkout.session.completed', session, 100))
+
+        contract_payment('evt_1', 'pi_1')
+        contract_payment('evt_2', 'pi_2')
+        StripeEvent.objects.filter(event_id='evt_2').update(attempts=1)
 
-# Create your tests here.
+        with mock.patch('stripe.PaymentIntent.retrieve', return_value={'latest_charge': 'ch_1'}) as retrieve:
+            self.assertEqual(_prefetch_charge_ids(10), {'pi_1': 'ch_1'})
+            self.assertEqual(_prefetch_charge_ids(10), {'pi_1': 'ch_1'})
+        retrieve.assert_called_once_with('pi_1')
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import AllServiceListCreateView, AllServiceRetrieveUpdateDestroyView,ServiceStatusUpdateView,AllAvailableServiceView, PayForServiceView, ServiceDashboardView
+from .views import AllServiceListCreateView, AllServiceRetrieveUpdateDestroyView,ServiceStatusUpdateView,AllAvailableServiceView, PayForServiceView, ServiceDashboardView, stripe_event_inbox
 
 urlpatterns = [
     path('', AllAvailableServiceView.as_view(), name='all-services'),
@@ -9,4 +9,5 @@ urlpatterns = [
     path('dashboard/', ServiceDashboardView.as_view(), name='service-dashboard'),
 
     path('pay/<str:service_id>/', PayForServiceView.as_view(), name='pay-service'),
+    path('webhook/stripe/', stripe_event_inbox, name='stripe-event-inbox'),
 ]
@@ -7,6 +7,7 @@ from .permissions import ServiceCreatePermission
 from rest_framework.response import Response
 from django.db.models import Q
 from subscription.models import ServiceTransaction
+from authentication.image_variants import schedule_delete, schedule_variants
 
 
 class AllServiceListCreateView(generics.ListCreateAPIView):
@@ -37,7 +38,8 @@ class AllServiceListCreateView(generics.ListCreateAPIView):
         #         {"error": "User's Stripe account onboarding must be complete to create a service"},
         #         status=status.HTTP_400_BAD_REQUEST
         #     )
-        serializer.save(user=user)
+        service = serializer.save(user=user)
+        schedule_variants(service.service_file)
 
 class AllServiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = AllService.objects.all()
@@ -45,6 +47,14 @@ class AllServiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView)
     permission_classes = [IsAuthenticated, ServiceCreatePermission]
     lookup_field = 'id'
 
+    def perform_update(self, serializer):
+        old_file = serializer.instance.service_file
+        old_name = old_file.name
+        service = serializer.save()
+        if service.service_file.name != old_name:
+            schedule_delete(old_file)
+            schedule_variants(service.service_file)
+
 
 class ServiceStatusUpdateView(generics.GenericAPIView):
     serializer_class = ServiceStatusUpdateSerializer
@@ -120,6 +130,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.conf import settings
 from .models import AllService, User
+from .checkout import IdempotencyKeyMismatch, IdempotencyKeyUsed, get_or_create_checkout_session
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -190,11 +201,28 @@ class PayForServiceView(generics.CreateAPIView):
                     'application_fee_amount': platform_fee_in_cents,  # Platform retains 25% fee
                 }
             
-            checkout_session = stripe.checkout.Session.create(**checkout_data)
+            # Retries and double clicks get the buyer's open session back without calling Stripe
+            checkout_session = get_or_create_checkout_session(
+                buyer=request.user,
+                service=service,
+                amount_in_cents=amount_in_cents,
+                checkout_data=checkout_data,
+                idempotency_key=request.headers.get('Idempotency-Key'),
+            )
+        except IdempotencyKeyMismatch:
+            return Response(
+                {"error": "Idempotency-Key was already used for a different service or amount"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        except IdempotencyKeyUsed:
+            return Response(
+                {"error": "Idempotency-Key belongs to a checkout that was paid or has expired; send a new key"},
+                status=status.HTTP_409_CONFLICT,
+            )
         except stripe.error.StripeError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"checkout_url": checkout_session.url}, status=status.HTTP_200_OK)
+        return Response({"checkout_url": checkout_session.checkout_url}, status=status.HTTP_200_OK)
 
 
 class ServiceDashboardView(generics.GenericAPIView):
@@ -270,3 +298,29 @@ class ServiceDashboardView(generics.GenericAPIView):
         
         serializer = self.get_serializer(dashboard_data)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+import json
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from .stripe_events import record_event
+
+
+@csrf_exempt
+def stripe_event_inbox(request):
+    """
+    Stripe webhook endpoint. Only verifies the signature and stores the event;
+    the process_stripe_events worker applies it.
+    """
+    payload = request.body
+    sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
+
+    try:
+        stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
+    except ValueError:
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+    except stripe.error.SignatureVerificationError:
+        return JsonResponse({"error": "Invalid signature"}, status=400)
+
+    record_event(json.loads(payload))
+    return JsonResponse({"status": "success"}, status=200)
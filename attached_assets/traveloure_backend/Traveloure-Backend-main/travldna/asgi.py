@@ -16,13 +16,14 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from ai_itinerary.middleware import JWTAuthMiddleware
 from ai_itinerary.routing import websocket_urlpatterns
+from ai_itinerary.generation_consumer import websocket_urlpatterns as generation_websocket_urlpatterns
 
 # Import websocket patterns after Django is set up
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": JWTAuthMiddleware(
         URLRouter(
-            websocket_urlpatterns
+            websocket_urlpatterns + generation_websocket_urlpatterns
         )
     ),
 })
\ No newline at end of file
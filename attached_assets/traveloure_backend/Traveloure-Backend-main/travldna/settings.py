@@ -31,9 +31,30 @@ DEBUG = os.environ.get('DEBUG')
 
 ALLOWED_HOSTS = ['*']
 
-DATA_UPLOAD_MAX_MEMEORY_SIZE = 30485760
-
-FILE_UPLOAD_MAX_MEMEORY_SIZE = 30485760
+DATA_UPLOAD_MAX_MEMORY_SIZE = 30485760
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 30485760
+
+# Large files skip the app workers through the direct upload API (authentication/direct_upload.py)
+DIRECT_UPLOAD_MAX_SIZE = int(os.getenv('DIRECT_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))
+# S3 needs every part except the last to be at least 5 MB
+DIRECT_UPLOAD_PART_SIZE = int(os.getenv('DIRECT_UPLOAD_PART_SIZE', 16 * 1024 * 1024))
+DIRECT_UPLOAD_URL_EXPIRY = int(os.getenv('DIRECT_UPLOAD_URL_EXPIRY', 3600))
+DIRECT_UPLOAD_TOKEN_MAX_AGE = int(os.getenv('DIRECT_UPLOAD_TOKEN_MAX_AGE', 24 * 3600))
+
+# Thumbnails generated in the background for profile, cover and service images
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+# Caching proxy for third-party place, event and hotel images (ai_itinerary/image_proxy.py)
+IMAGE_PROXY_CACHE_DIR = os.getenv('IMAGE_PROXY_CACHE_DIR', os.path.join(BASE_DIR, 'image_cache'))
+IMAGE_PROXY_CACHE_MAX_BYTES = int(os.getenv('IMAGE_PROXY_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+IMAGE_PROXY_MAX_SOURCE_BYTES = int(os.getenv('IMAGE_PROXY_MAX_SOURCE_BYTES', 20 * 1024 * 1024))
+IMAGE_PROXY_WIDTHS = (160, 320, 640, 1280)
+IMAGE_PROXY_DEFAULT_WIDTH = 640
+IMAGE_PROXY_FETCH_TIMEOUT = int(os.getenv('IMAGE_PROXY_FETCH_TIMEOUT', 10))
+# Only tests pointing the proxy at a local stub origin should turn this on
+IMAGE_PROXY_ALLOW_PRIVATE_HOSTS = False
 
 # Application definition
 
@@ -75,11 +96,55 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'travldna.urls'
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
+# Redis lets the itinerary worker broadcast to websocket clients served by other processes
+if os.getenv("REDIS_URL"):
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [os.getenv("REDIS_URL")]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# Shared cache when REDIS_URL is set, otherwise a per-process memory cache.
+# "generations" holds LLM output; on Redis it relies on a volatile-lru/allkeys-lru maxmemory-policy for LRU eviction,
+# the memory cache evicts least recently used entries past GENERATION_CACHE_MAX_ENTRIES.
+GENERATION_CACHE_TTL = int(os.getenv("GENERATION_CACHE_TTL", 7 * 24 * 3600))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", 5000))
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        },
+        "generations": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+            "KEY_PREFIX": "generations",
+            "TIMEOUT": GENERATION_CACHE_TTL,
+        },
+    }
+else:
+    # Per-process caches: fine for a single worker only. The FAQ search index, the category tree
+    # and other shared versions are published through the default cache, so run Redis with more.
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "generations": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "generations",
+            "TIMEOUT": GENERATION_CACHE_TTL,
+            "OPTIONS": {"MAX_ENTRIES": GENERATION_CACHE_MAX_ENTRIES},
+        },
+    }
+
+CATEGORY_TREE_CACHE_TIMEOUT = int(os.getenv("CATEGORY_TREE_CACHE_TIMEOUT", 24 * 3600))
 
 TEMPLATES = [
     {
@@ -255,10 +320,41 @@ STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY", "your_stripe_public_key")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "your_stripe_webhook_secret")
 STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", f"{FRONTEND_URL}/payment/success/")
 STRIPE_FAILED_URL = os.getenv("STRIPE_FAILED_URL", f"{FRONTEND_URL}/payment/")
+STRIPE_TIMEOUT_SECONDS = int(os.getenv("STRIPE_TIMEOUT_SECONDS", "10"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+# Stripe requires Checkout sessions to stay open for at least 30 minutes
+STRIPE_CHECKOUT_SESSION_TTL = int(os.getenv("STRIPE_CHECKOUT_SESSION_TTL", "3600"))
 
 PLATFORM_FEE_PERCENT = os.getenv("PLATFORM_FEE_PERCENT", "0.25")
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Point at a local stand-in (manage.py fake_llm_server) in development and tests
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+OPENAI_ITINERARY_MODEL = os.getenv('OPENAI_ITINERARY_MODEL', 'gpt-4o-mini')
+OPENAI_TIMEOUT_SECONDS = int(os.getenv('OPENAI_TIMEOUT_SECONDS', 120))
+
+# Itinerary generation worker (manage.py run_itinerary_worker)
+ITINERARY_GENERATION_CONCURRENCY = int(os.getenv('ITINERARY_GENERATION_CONCURRENCY', 4))
+ITINERARY_GENERATION_PER_USER = int(os.getenv('ITINERARY_GENERATION_PER_USER', 1))
+# How long streamed generation events stay available for reconnecting clients
+ITINERARY_STREAM_TTL = int(os.getenv('ITINERARY_STREAM_TTL', 3600))
+# Edits are stored as JSON patches, with a full copy of the itinerary every this many versions
+ITINERARY_SNAPSHOT_INTERVAL = int(os.getenv('ITINERARY_SNAPSHOT_INTERVAL', 20))
+# Public share links serve a pre-rendered snapshot: browsers and CDNs may reuse it for ITINERARY_SHARE_MAX_AGE
+# (a year when the link names the snapshot's ETag), the app cache keeps it for ITINERARY_SHARE_CACHE_TTL
+ITINERARY_SHARE_MAX_AGE = int(os.getenv('ITINERARY_SHARE_MAX_AGE', 300))
+ITINERARY_SHARE_CACHE_TTL = int(os.getenv('ITINERARY_SHARE_CACHE_TTL', 24 * 3600))
+ITINERARY_SHARE_WORKERS = int(os.getenv('ITINERARY_SHARE_WORKERS', 2))
+
+# Tourist place searches are fresh for PLACE_SEARCH_TTL, then served while refreshed in the background
+# for PLACE_SEARCH_STALE_TTL more; manage.py evict_place_searches drops idle ones and caps the table
+PLACE_SEARCH_TTL = int(os.getenv('PLACE_SEARCH_TTL', 7 * 24 * 3600))
+PLACE_SEARCH_STALE_TTL = int(os.getenv('PLACE_SEARCH_STALE_TTL', 30 * 24 * 3600))
+PLACE_SEARCH_MAX_ENTRIES = int(os.getenv('PLACE_SEARCH_MAX_ENTRIES', 10000))
+PLACE_SEARCH_IDLE_DAYS = int(os.getenv('PLACE_SEARCH_IDLE_DAYS', 180))
+PLACE_SEARCH_REFRESH_WORKERS = int(os.getenv('PLACE_SEARCH_REFRESH_WORKERS', 2))
+# Live events are kept this long after they end; evict_place_searches prunes older ones
+LIVE_EVENT_RETENTION_DAYS = int(os.getenv('LIVE_EVENT_RETENTION_DAYS', 30))
 
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
 WEATHER_API_KEY2 = os.getenv('WEATHER_API_KEY2')
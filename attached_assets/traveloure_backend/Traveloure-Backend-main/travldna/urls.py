@@ -20,6 +20,23 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.shortcuts import render
 from subscription.views import PaymentSuccessView
+from ai_itinerary.image_proxy import image_proxy
+from ai_itinerary.place_search_cache import PlaceSearchCacheStatsAPIView
+from ai_itinerary.nearby_api import NearbyPlacesAPIView
+from ai_itinerary.map_cluster_api import MapClustersAPIView
+from ai_itinerary.itinerary_api import GeneratedItineraryDetailAPIView
+from ai_itinerary.route_api import TripRouteAPIView
+from ai_itinerary.day_plan_api import TripDayPlanAPIView
+from ai_itinerary.trip_selections_api import TripSelectionsAPIView
+from ai_itinerary.live_events_api import TripEventsAPIView
+from ai_itinerary.share_api import SharedItineraryAPIView, ShareItineraryAPIView
+from ai_itinerary.itinerary_versions_api import (
+    ExpertItineraryVersionDetailAPIView,
+    ExpertItineraryVersionsAPIView,
+    GeneratedItineraryVersionDetailAPIView,
+    GeneratedItineraryVersionsAPIView,
+)
+from ai_itinerary.generation_api import GenerateItineraryAPIView, GenerationCacheStatsAPIView, ItineraryJobStatusAPIView
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 import os
@@ -77,9 +94,27 @@ urlpatterns = [
     path('auth/', include('authentication.urls')),
     path('auth/', include('social_django.urls', namespace='social')),
     path('plan/', include('subscription.urls')),
+    path('ai/trips/<uuid:trip_id>/generate-itinerary/', GenerateItineraryAPIView.as_view(), name='generate-itinerary'),
+    path('ai/trips/<uuid:trip_id>/route/', TripRouteAPIView.as_view(), name='trip-route'),
+    path('ai/trips/<uuid:trip_id>/day-plan/', TripDayPlanAPIView.as_view(), name='trip-day-plan'),
+    path('ai/trips/<uuid:trip_id>/selections/', TripSelectionsAPIView.as_view(), name='trip-selections'),
+    path('ai/trips/<uuid:trip_id>/events/', TripEventsAPIView.as_view(), name='trip-events'),
+    path('ai/itinerary-jobs/<uuid:id>/', ItineraryJobStatusAPIView.as_view(), name='itinerary-job-status'),
+    path('ai/generation-cache/stats/', GenerationCacheStatsAPIView.as_view(), name='generation-cache-stats'),
+    path('ai/place-search-cache/stats/', PlaceSearchCacheStatsAPIView.as_view(), name='place-search-cache-stats'),
+    path('ai/places/nearby/', NearbyPlacesAPIView.as_view(), name='nearby-places'),
+    path('ai/map/clusters/', MapClustersAPIView.as_view(), name='map-clusters'),
+    path('ai/itineraries/<uuid:id>/', GeneratedItineraryDetailAPIView.as_view(), name='generated-itinerary-detail'),
+    path('ai/itineraries/<uuid:id>/share/', ShareItineraryAPIView.as_view(), name='share-itinerary'),
+    path('ai/shared-itineraries/<str:token>/', SharedItineraryAPIView.as_view(), name='shared-itinerary'),
+    path('ai/itineraries/<uuid:id>/versions/', GeneratedItineraryVersionsAPIView.as_view(), name='itinerary-versions'),
+    path('ai/itineraries/<uuid:id>/versions/<int:version>/', GeneratedItineraryVersionDetailAPIView.as_view(), name='itinerary-version-detail'),
+    path('ai/expert-itineraries/<uuid:id>/versions/', ExpertItineraryVersionsAPIView.as_view(), name='expert-itinerary-versions'),
+    path('ai/expert-itineraries/<uuid:id>/versions/<int:version>/', ExpertItineraryVersionDetailAPIView.as_view(), name='expert-itinerary-version-detail'),
     path('ai/', include('ai_itinerary.urls')),
     path('service/', include('serviceproviderapp.urls')),
     path('payment-success/', PaymentSuccessView.as_view(), name='payment-success'),
+    path('images/proxy/', image_proxy, name='image-proxy'),
     path('viator/', include('viatorbooking.urls')),
     path('faqs/', include('faqs.urls')),
 ]
@@ -1,9 +1,17 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.validators import MinValueValidator, MaxValueValidator
+from contextlib import contextmanager
 from django.db.models import JSONField
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.signals import class_prepared
+from django.utils import timezone
 import uuid
 from authentication.models import get_dynamic_storage
 from subscription.models import UserAndExpertContract
+from .geo import encode_geohash
+from .event_dates import event_key, parse_event_dates
+from .countries import normalize_search
 User = get_user_model()
 
 class Trip(models.Model):
@@ -56,6 +64,14 @@ class GeneratedItinerary(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, default='pending')
     error_message = models.TextField(blank=True)
+    # Token of the worker running the generation; it heartbeats updated_at under it
+    lease = models.CharField(max_length=32, blank=True, default='')
+    # Head of the ItineraryRevision chain that itinerary_data materializes
+    version = models.PositiveIntegerField(default=0)
+    # Set while the itinerary is shared publicly; share tokens carry it, so revoking or re-sharing voids old links
+    share_key = models.CharField(max_length=32, blank=True, default='')
+    # Changes with everything a shared snapshot shows; snapshots are stored and served per revision
+    share_revision = models.CharField(max_length=32, blank=True, default='')
 
     def __str__(self):
         return f"Itinerary for {self.trip.title}"
@@ -110,13 +126,56 @@ class ExpertUpdatedItinerary(models.Model):
     status = models.CharField(max_length=20, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expert_updated_itineraries')
+    version = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = ('trip', 'created_by')
 
+
+class ItineraryRevision(models.Model):
+    '''
+    One edit of a GeneratedItinerary or ExpertUpdatedItinerary as an RFC 6902 patch against the
+    previous version. Version 0 and every ITINERARY_SNAPSHOT_INTERVAL-th version also keep the
+    whole document, so rebuilding a version replays a bounded number of patches.
+    '''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
+    generated_itinerary = models.ForeignKey(GeneratedItinerary, on_delete=models.CASCADE, null=True, blank=True, related_name='revisions')
+    expert_itinerary = models.ForeignKey(ExpertUpdatedItinerary, on_delete=models.CASCADE, null=True, blank=True, related_name='revisions')
+    version = models.PositiveIntegerField()
+    patch = models.JSONField(null=True, blank=True)
+    snapshot = models.JSONField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['generated_itinerary', 'version'], name='revision_generated_version_uniq'),
+            models.UniqueConstraint(fields=['expert_itinerary', 'version'], name='revision_expert_version_uniq'),
+            models.CheckConstraint(
+                condition=models.Q(generated_itinerary__isnull=True) ^ models.Q(expert_itinerary__isnull=True),
+                name='revision_one_itinerary',
+            ),
+        ]
+
 class TouristPlacesSearches(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
     search = models.CharField(null=False,blank=False)
+    # Cache key, see ai_itinerary.countries.normalize_search
+    normalized_search = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    last_hit_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.search
+
+    def save(self, *args, **kwargs):
+        if not self.normalized_search:
+            # A search that normalizes to nothing gets a key of its own, as in migration 0020
+            self.normalized_search = normalize_search(self.search) or str(self.id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'normalized_search'}
+        super().save(*args, **kwargs)
 
 class TouristPlaceResults(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
@@ -128,14 +187,26 @@ class TouristPlaceResults(models.Model):
     activities = models.JSONField()
     festivals = models.JSONField()
     # events = models.JSONField(blank=True, null=True)
-    latitude = models.CharField(max_length=200,blank=True, null=True)
-    longitude = models.CharField(max_length=200,blank=True, null=True)
+    latitude = models.FloatField(blank=True, null=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(blank=True, null=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Derived from the coordinates on save, prefix lookups on it find the places in a cell
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True)
     category = models.CharField(max_length=200)
     best_months = models.CharField(max_length=100)
     image_url = models.JSONField(default=list)
 
     def __str__(self):
         return f"{self.place} in {self.city}, {self.country}"
+
+    def set_geohash(self):
+        has_point = self.latitude is not None and self.longitude is not None
+        self.geohash = encode_geohash(self.latitude, self.longitude) if has_point else ''
+
+    def save(self, *args, **kwargs):
+        self.set_geohash()
+        if kwargs.get('update_fields') is not None and {'latitude', 'longitude'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'geohash'}
+        super().save(*args, **kwargs)
     
 class TouristPreferences(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
@@ -192,14 +263,173 @@ class HelpGuideTrip(models.Model):
     
 class LiveEvent(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
-    search = models.ForeignKey(TouristPlacesSearches, on_delete=models.CASCADE)
+    # The search that last found the event; one found by several searches is stored once
+    search = models.ForeignKey(TouristPlacesSearches, on_delete=models.SET_NULL, null=True, blank=True)
     title = models.CharField(max_length=255)
+    # As the source wrote it; starts_at / ends_at are parsed from it
     start_date = models.CharField(max_length=100, null=True, blank=True)
     address = models.TextField(null=True, blank=True)
     link = models.URLField(null=True, blank=True)
     image_url = models.URLField(null=True, blank=True)
+    # The normalized_search of the search that found it, see ai_itinerary.countries.normalize_search
+    city = models.CharField(max_length=255, blank=True, default='')
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    event_key = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event_key'], name='live_event_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['city', 'starts_at'], name='live_event_city_start_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        event = super().from_db(db, field_names, values)
+        # What the stored starts_at / ends_at were parsed from, see save()
+        event._parsed_start_date = event.__dict__.get('start_date')
+        return event
+
+    def set_schedule(self, reference=None):
+        """Parse start_date and derive the key the same event has in every search."""
+        self.starts_at, self.ends_at = parse_event_dates(self.start_date, reference)
+        self._parsed_start_date = self.start_date
+        self.set_key()
+
+    def set_key(self):
+        if not self.city and self.search_id:
+            self.city = self.search.normalized_search
+        self.event_key = event_key(self.title, self.starts_at, self.start_date, self.city, self.address)
+
+    def save(self, *args, **kwargs):
+        # A date without a year was placed around the day it was found; parsing it again today
+        # could move it to another year (and so change its key)
+        if self.start_date != getattr(self, '_parsed_start_date', None) or not self.event_key:
+            self.set_schedule()
+        else:
+            self.set_key()
+        if kwargs.get('update_fields') is not None and {'title', 'start_date', 'address', 'search', 'city'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'city', 'starts_at', 'ends_at', 'event_key'}
+        if self._state.adding:
+            # An event some search of the city already stored is updated in place, like store_events does
+            existing = LiveEvent.objects.filter(event_key=self.event_key).values_list('id', flat=True).first()
+            if existing is not None:
+                self.id = existing
+                self._state.adding = False
+                kwargs.pop('force_insert', None)
+        super().save(*args, **kwargs)
+
+class CatalogEntry(models.Model):
+    """
+    One place, hotel or service as its provider describes it, shared by every trip that selected it.
+    Trip rows point here and keep only the values that differ; content_hash tells a row that still
+    matches its entry from one whose values drifted.
+    """
+    KIND_CHOICES = [
+        ('place', 'Place'),
+        ('hotel', 'Hotel'),
+        ('service', 'Service'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    provider_id = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'provider_id'], name='catalog_entry_provider_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.provider_id}"
+
+
+class CatalogValue(DeferredAttribute):
+    """
+    A copy field of a CatalogBacked model. While the field is listed in catalog_inherited its column
+    is NULL and reads give the catalog entry's value; assigning any value, None included, makes it
+    the row's own. Writes store the column as it is (see CatalogBacked.stored_values).
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        # Loading a deferred column goes through __set__ but is no assignment
+        with CatalogBacked.stored_values([instance]):
+            value = super().__get__(instance, cls)
+        if value is not None or instance.__dict__.get('_catalog_stored'):
+            return value
+        if self.field.attname in (instance.__dict__.get('catalog_inherited') or ()) and instance.catalog_id:
+            return instance.catalog.data.get(self.field.attname)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+        inherited = instance.__dict__.get('catalog_inherited')
+        if inherited and self.field.attname in inherited and not instance.__dict__.get('_catalog_stored'):
+            instance.catalog_inherited = [field for field in inherited if field != self.field.attname]
+
+
+class CatalogBackedManager(models.Manager):
+    def get_queryset(self):
+        # Inherited values are read from the entry, one join instead of a query per row
+        return super().get_queryset().select_related('catalog')
+
+
+class CatalogBacked:
+    """
+    Selections whose copy fields are left NULL when they match the catalog entry and listed in
+    catalog_inherited. The fields read back the entry's values (CatalogValue), so model readers
+    never see those NULLs; .values() and raw SQL do. Saving compacts the row against its entry.
+    """
+    catalog_kind = None
+    provider_field = None
+    catalog_fields = ()
+
+    @staticmethod
+    @contextmanager
+    def stored_values(rows):
+        """Rows whose copy fields read as stored, NULLs included, e.g. while they are written."""
+        rows = [row for row in rows if not row.__dict__.get('_catalog_stored')]
+        for row in rows:
+            row._catalog_stored = True
+        try:
+            yield rows
+        finally:
+            for row in rows:
+                row.__dict__.pop('_catalog_stored', None)
+
+    def save(self, *args, **kwargs):
+        # Imported here, ai_itinerary.catalog imports these models
+        from ai_itinerary.catalog import compact_selections
+
+        # A save limited to some fields would not store the cleared ones
+        if kwargs.get('update_fields') is None:
+            compact_selections([self])
+        with self.stored_values([self]):
+            super().save(*args, **kwargs)
+
+
+def _install_catalog_values(sender, **kwargs):
+    if issubclass(sender, CatalogBacked):
+        for name in sender.catalog_fields:
+            setattr(sender, name, CatalogValue(sender._meta.get_field(name)))
+
+
+class_prepared.connect(_install_catalog_values)
+
+
+class TripSelectedPlace(CatalogBacked, models.Model):
+    catalog_kind = 'place'
+    provider_field = 'place_id'
+    catalog_fields = ('description', 'address', 'rating', 'image_url', 'website_url', 'metadata')
 
-class TripSelectedPlace(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='trip_selected_places')
     place_id = models.CharField(max_length=255)
@@ -210,8 +440,22 @@ class TripSelectedPlace(models.Model):
     image_url = models.URLField(max_length=1000, blank=True,null=True)
     website_url = models.URLField(max_length=1000, blank=True,null=True)
     metadata = models.JSONField(default=dict, blank=True,null=True)
+    catalog = models.ForeignKey(CatalogEntry, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    # The catalog_fields left NULL because they hold the catalog entry's value
+    catalog_inherited = models.JSONField(default=list, blank=True)
+
+    objects = CatalogBackedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'place_id'], name='trip_selected_place_uniq'),
+        ]
+
+class TripSelectedHotel(CatalogBacked, models.Model):
+    catalog_kind = 'hotel'
+    provider_field = 'hotel_id'
+    catalog_fields = ('description', 'address', 'rating', 'price_range', 'image_url', 'website_url', 'metadata')
 
-class TripSelectedHotel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='trip_selected_hotels')
     hotel_id = models.CharField(max_length=255)
@@ -223,6 +467,16 @@ class TripSelectedHotel(models.Model):
     image_url = models.URLField(max_length=1000, blank=True,null=True)
     website_url = models.URLField(max_length=1000, blank=True,null=True)
     metadata = models.JSONField(default=dict, blank=True,null=True)
+    catalog = models.ForeignKey(CatalogEntry, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    # The catalog_fields left NULL because they hold the catalog entry's value
+    catalog_inherited = models.JSONField(default=list, blank=True)
+
+    objects = CatalogBackedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'hotel_id'], name='trip_selected_hotel_uniq'),
+        ]
 
 class TripSelectedService(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
@@ -236,6 +490,11 @@ class TripSelectedService(models.Model):
     website_url = models.URLField(max_length=1000, blank=True,null=True)
     metadata = models.JSONField(default=dict, blank=True,null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'service_id'], name='trip_selected_service_uniq'),
+        ]
+
 class TripOtherService(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='trip_other_services')
@@ -256,11 +515,17 @@ class TripSelectedFlight(models.Model):
     website_url = models.URLField(max_length=1000, blank=True,null=True)
     metadata = models.JSONField(default=dict, blank=True,null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'flight_id'], name='trip_selected_flight_uniq'),
+        ]
+
 
 
 class AffiliateTrip(models.Model): 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="affiliate_trip")
+    # Items with a provider id are stored as {"catalog_ref": <id>, ...values differing from its CatalogEntry}
     place_data = models.JSONField(default=list)
     hotel_data = models.JSONField(default=list)
     service_data = models.JSONField(default=list)
@@ -313,4 +578,33 @@ class UserAndExpertChat(models.Model):
     message = models.TextField(null=True, blank=True)
     attachment = models.FileField(upload_to='trip_expert_advice/',storage=get_dynamic_storage(), null=True)
     itinerary_submit = models.ForeignKey(SubmitItineraryFeedback, on_delete=models.CASCADE, related_name="itinerary_submit_chat", null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class MapCluster(models.Model):
+    """
+    Running count, coordinate sums and best-scored item of the places or services in one geohash cell,
+    kept up to date by ai_itinerary.map_clusters for every precision the map zooms through.
+    """
+    KIND_CHOICES = [
+        ('place', 'Place'),
+        ('service', 'Service'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False, blank=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    precision = models.PositiveSmallIntegerField()
+    cell = models.CharField(max_length=12)
+    count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+    top_item_id = models.UUIDField(null=True, blank=True)
+    top_item_name = models.CharField(max_length=255, blank=True, default='')
+    top_score = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'precision', 'cell'], name='map_cluster_cell_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.cell} ({self.count})"
@@ -3,7 +3,14 @@ from .models import *
 import re
 from .models import TripSelectedHotel, TripSelectedService, TripSelectedPlace
 from authentication.models import LocalExpertForm
-from django.db.models import Avg
+from authentication.direct_upload import DirectUploadField
+from .image_proxy import ProxiedImageMixin
+from .itinerary_versions import commit_document
+from .itinerary_projection import ProjectedItineraryField
+from .catalog import AFFILIATE_FIELDS, attach, expanded
+from .affiliate_links import engine as affiliate_links
+from .trip_selections import SELECTIONS
+from django.db.models import Avg, Manager, Prefetch, prefetch_related_objects
 
 # class PlaceSerializer(serializers.Serializer):
 #     id = serializers.CharField()
@@ -155,10 +162,12 @@ from django.db.models import Avg
 #         }
 
 class GeneratedItinerarySerializer(serializers.ModelSerializer):
+    itinerary_data = ProjectedItineraryField(required=False)
+
     class Meta:
         model = GeneratedItinerary
-        fields = ['id', 'trip', 'itinerary_data', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'trip', 'itinerary_data', 'version', 'created_at', 'updated_at']
+        read_only_fields = ['version', 'created_at', 'updated_at']
 
 
 class ReviewRatingSerializer(serializers.ModelSerializer):
@@ -182,19 +191,39 @@ class ReviewRatingSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("You can't review yourself.")
         return data
 
-class UpdateItinerarySerializer(serializers.ModelSerializer):
+class VersionedItineraryMixin:
+    """Saves itinerary_data as the next version of the itinerary, recorded as a patch against the last one."""
+
+    def update(self, instance, validated_data):
+        document = validated_data.pop('itinerary_data', None)
+        # Only the other fields are saved here: a full save would write back the itinerary_data and
+        # version read with the instance over a concurrent commit. commit_document writes those under its row lock.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            auto_now = [field.name for field in instance._meta.concrete_fields if getattr(field, 'auto_now', False)]
+            instance.save(update_fields=[*validated_data, *auto_now])
+        if document is not None:
+            request = self.context.get('request')
+            user = request.user if request and request.user.is_authenticated else None
+            instance = commit_document(type(instance), instance.id, document, user=user)
+        return instance
+
+
+class UpdateItinerarySerializer(VersionedItineraryMixin, serializers.ModelSerializer):
     class Meta:
         model = GeneratedItinerary
-        fields = ['itinerary_data', 'status', 'error_message']
+        fields = ['itinerary_data', 'status', 'error_message', 'version']
+        read_only_fields = ['version']
 
-class ExpertUpdatedItinerarySerializer(serializers.ModelSerializer):
+class ExpertUpdatedItinerarySerializer(VersionedItineraryMixin, serializers.ModelSerializer):
     class Meta:
         model = ExpertUpdatedItinerary
-        fields = ['id', 'trip', 'itinerary_data', 'message', 'status', 'created_at', 'created_by']
-        read_only_fields = ['trip', 'created_by', 'created_at']
+        fields = ['id', 'trip', 'itinerary_data', 'message', 'status', 'version', 'created_at', 'created_by']
+        read_only_fields = ['trip', 'version', 'created_by', 'created_at']
 
 
-class TouristPlacesResultSerializer(serializers.ModelSerializer):
+class TouristPlacesResultSerializer(ProxiedImageMixin, serializers.ModelSerializer):
     class Meta:
         model = TouristPlaceResults
         exclude = ['search']
@@ -229,6 +258,17 @@ class TouristHelpMeGuideEventSerializer(serializers.ModelSerializer):
         model = TouristHelpMeGuideEvents
         fields = "__all__"
 
+class TripWithServicesListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        trips = list(data.all() if isinstance(data, Manager) else data)
+        unprefetched = [trip for trip in trips if not hasattr(trip, 'affiliate_trips')]
+        if unprefetched:
+            prefetch_related_objects(unprefetched, *self.child.prefetches())
+        # The catalog entries every listed trip's affiliate data refers to, in one query
+        attach([affiliate for trip in trips for affiliate in trip.affiliate_trips[:1]])
+        return super().to_representation(trips)
+
+
 class TripWithServicesSerializer(serializers.ModelSerializer):
     hotels = serializers.SerializerMethodField()
     services = serializers.SerializerMethodField()
@@ -238,25 +278,45 @@ class TripWithServicesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Trip
         fields = ['id', 'title', 'destination', 'start_date', 'end_date', 'places', 'hotels', 'services']
+        list_serializer_class = TripWithServicesListSerializer
+
+    @staticmethod
+    def prefetches():
+        return [
+            Prefetch('affiliate_trip', queryset=AffiliateTrip.objects.order_by('pk'), to_attr='affiliate_trips'),
+        ]
+
+    @classmethod
+    def prefetch(cls, queryset):
+        """The trips with everything this serializer reads, in two queries however many trips there are."""
+        return queryset.prefetch_related(*cls.prefetches())
+
+    def to_representation(self, instance):
+        # Trips not loaded through prefetch() get the same lookups, for themselves only
+        if not hasattr(instance, 'affiliate_trips'):
+            prefetch_related_objects([instance], *self.prefetches())
+        return super().to_representation(instance)
 
     def get_affiliate_trip(self, obj):
-        if not hasattr(self, '_affiliate_trip_cache'):
-            self._affiliate_trip_cache = {}
-        if obj.id not in self._affiliate_trip_cache:
-            self._affiliate_trip_cache[obj.id] = AffiliateTrip.objects.filter(trip=obj).first()
-        return self._affiliate_trip_cache[obj.id]
+        return obj.affiliate_trips[0] if obj.affiliate_trips else None
 
     def get_places(self, obj):
         affiliate = self.get_affiliate_trip(obj)
-        return affiliate.place_data if affiliate else []
+        if affiliate:
+            return affiliate_links().rewrite_items('place', expanded(affiliate, 'place_data'), obj.destination)
+        return []
 
     def get_hotels(self, obj):
         affiliate = self.get_affiliate_trip(obj)
-        return affiliate.hotel_data if affiliate else []
+        if affiliate:
+            return affiliate_links().rewrite_items('hotel', expanded(affiliate, 'hotel_data'), obj.destination)
+        return []
 
     def get_services(self, obj):
         affiliate = self.get_affiliate_trip(obj)
-        return affiliate.service_data if affiliate else []
+        if affiliate:
+            return affiliate_links().rewrite_items('service', expanded(affiliate, 'service_data'), obj.destination)
+        return []
     # def get_places(self, obj):
     #     places = TripSelectedPlace.objects.filter(trip=obj)
     #     (f"DEBUG: Found {places.count()} places for trip {obj.id}")
@@ -296,30 +356,121 @@ class TripWithServicesSerializer(serializers.ModelSerializer):
     
 
 
-class TripSelectedPlaceSerializer(serializers.ModelSerializer):
+class AffiliateLinkMixin:
+    """
+    Serializer mixin adding the affiliate_link a selection's website_url rewrites to (None when no
+    affiliate platform applies). Rows already given one in a batch keep it.
+    """
+    affiliate_kind = None
+    affiliate_id_field = None
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if not hasattr(instance, 'affiliate_link'):
+            affiliate_links().rewrite_selections(self.affiliate_kind, [instance], self.affiliate_id_field)
+        data['affiliate_link'] = instance.affiliate_link
+        return data
+
+
+class TripSelectedPlaceSerializer(AffiliateLinkMixin, ProxiedImageMixin, serializers.ModelSerializer):
+    affiliate_kind = 'place'
+    affiliate_id_field = 'place_id'
+
     class Meta:
         model = TripSelectedPlace
-        fields = '__all__'
+        exclude = ['catalog_inherited']
+        read_only_fields = ['catalog']
+
 
+class TripSelectedHotelSerializer(AffiliateLinkMixin, ProxiedImageMixin, serializers.ModelSerializer):
+    affiliate_kind = 'hotel'
+    affiliate_id_field = 'hotel_id'
 
-class TripSelectedHotelSerializer(serializers.ModelSerializer):
     class Meta:
         model = TripSelectedHotel
-        fields = '__all__'
+        exclude = ['catalog_inherited']
+        read_only_fields = ['catalog']
+
 
+class TripSelectedServiceSerializer(AffiliateLinkMixin, serializers.ModelSerializer):
+    affiliate_kind = 'service'
+    affiliate_id_field = 'service_id'
 
-class TripSelectedServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = TripSelectedService
         fields = '__all__'
 
 
-class TripSelectedFlightSerializer(serializers.ModelSerializer):
+class TripSelectedFlightSerializer(AffiliateLinkMixin, serializers.ModelSerializer):
+    affiliate_kind = 'flight'
+    affiliate_id_field = 'flight_id'
+
     class Meta:
         model = TripSelectedFlight
         fields = '__all__'
 
 
+# Items of a bulk selection upsert; the trip comes from the URL
+class SelectedPlaceItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripSelectedPlace
+        exclude = ['id', 'trip', 'catalog', 'catalog_inherited']
+
+
+class SelectedHotelItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripSelectedHotel
+        exclude = ['id', 'trip', 'catalog', 'catalog_inherited']
+
+
+class SelectedServiceItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripSelectedService
+        exclude = ['id', 'trip']
+
+
+class SelectedFlightItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripSelectedFlight
+        exclude = ['id', 'trip']
+
+
+MAX_BULK_SELECTIONS = 200
+
+
+class TripSelectionsUpsertSerializer(serializers.Serializer):
+    places = SelectedPlaceItemSerializer(many=True, required=False, max_length=MAX_BULK_SELECTIONS)
+    hotels = SelectedHotelItemSerializer(many=True, required=False, max_length=MAX_BULK_SELECTIONS)
+    services = SelectedServiceItemSerializer(many=True, required=False, max_length=MAX_BULK_SELECTIONS)
+    flights = SelectedFlightItemSerializer(many=True, required=False, max_length=MAX_BULK_SELECTIONS)
+
+    def validate(self, attrs):
+        if not any(attrs.values()):
+            raise serializers.ValidationError("Send at least one of places, hotels, services or flights.")
+        for key, items in attrs.items():
+            _, external_id, _ = SELECTIONS[key]
+            # One statement cannot upsert the same row twice; the last item naming it wins
+            attrs[key] = list({item[external_id]: item for item in items}.values())
+        return attrs
+
+
+class TripSelectionsSerializer(serializers.ModelSerializer):
+    places = TripSelectedPlaceSerializer(source='trip_selected_places', many=True, read_only=True)
+    hotels = TripSelectedHotelSerializer(source='trip_selected_hotels', many=True, read_only=True)
+    services = TripSelectedServiceSerializer(source='trip_selected_services', many=True, read_only=True)
+    flights = TripSelectedFlightSerializer(source='trip_selected_flights', many=True, read_only=True)
+
+    class Meta:
+        model = Trip
+        fields = ['id', 'title', 'destination', 'start_date', 'end_date', 'places', 'hotels', 'services', 'flights']
+
+
+class LiveEventSerializer(ProxiedImageMixin, serializers.ModelSerializer):
+    class Meta:
+        model = LiveEvent
+        exclude = ['search', 'event_key']
+
+
 class ShareTripSerializer(serializers.ModelSerializer):
     trip_selected_places = TripSelectedPlaceSerializer(many=True, read_only=True)
     trip_selected_hotels = TripSelectedHotelSerializer(many=True, read_only=True)
@@ -342,10 +493,11 @@ class ShareTripSerializer(serializers.ModelSerializer):
 
 class ShareGeneratedItinerarySerializer(serializers.ModelSerializer):
     trip = ShareTripSerializer()
+    itinerary_data = ProjectedItineraryField(read_only=True)
 
     class Meta:
         model = GeneratedItinerary
-        fields = '__all__'
+        exclude = ['lease', 'share_revision']
 
 class AffiliatePlatformSerializer(serializers.ModelSerializer):
     class Meta:
@@ -363,10 +515,11 @@ class UserAndExpertChatSerializer(serializers.ModelSerializer):
     receiver = UserSerializer(read_only=True)
     contract = serializers.SerializerMethodField()
     itinerary_submit = serializers.SerializerMethodField(read_only=True)
+    attachment_token = DirectUploadField(target='chat_attachment', source='attachment')
 
     class Meta:
         model = UserAndExpertChat
-        fields = ["id", "sender", "receiver", "message", "attachment", "created_at","contract","itinerary_submit"]
+        fields = ["id", "sender", "receiver", "message", "attachment", "attachment_token", "created_at","contract","itinerary_submit"]
     
     def get_contract(self, obj):
         if obj.contract:
@@ -461,9 +614,10 @@ class LocalExpertListSerializer(serializers.ModelSerializer):
 class SubmitItineraryFeedbackSerializer(serializers.ModelSerializer):
     expert = UserSerializer(read_only=True)
     contract = serializers.SerializerMethodField()
+    attachment_token = DirectUploadField(target='itinerary_feedback_attachment', source='attachment')
     class Meta:
         model = SubmitItineraryFeedback
-        fields = ['id', 'expert', 'contract', 'attachment', 'title', 'description', 'location', 'status', 'created_at']
+        fields = ['id', 'expert', 'contract', 'attachment', 'attachment_token', 'title', 'description', 'location', 'status', 'created_at']
         read_only_fields = ['id', 'expert', 'created_at', 'status']
     
     def get_contract(self, obj):
@@ -484,7 +638,23 @@ class SubmitItineraryFeedbackSerializer(serializers.ModelSerializer):
         return None
     
 
+class AffiliateTripListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        affiliate_trips = list(data.all() if isinstance(data, Manager) else data)
+        attach(affiliate_trips)
+        return super().to_representation(affiliate_trips)
+
+
 class AffiliateTripSerializer(serializers.ModelSerializer):
+    """Affiliate lists with their catalog references resolved, as they were given."""
+
     class Meta:
         model = AffiliateTrip
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        list_serializer_class = AffiliateTripListSerializer
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field in AFFILIATE_FIELDS:
+            data[field] = expanded(instance, field)
+        return data
\ No newline at end of file